@@ -22,10 +22,11 @@ if __name__ == "__main__":
 	parser = argparse.ArgumentParser()
 	parser.add_argument('--single', action='store_true', help='Run the loop only once')
 	parser.add_argument('--disable-torch-multiprocessing', action='store_true', help='Disable multiprocessing')
+	parser.add_argument('--workers', type=int, default=2, help='Number of worker processes running tasks')
 	args = parser.parse_args()
 
 	if args.single:
-		main(disable_torch_multiprocessing=args.disable_torch_multiprocessing)
+		main(disable_torch_multiprocessing=args.disable_torch_multiprocessing, workers=args.workers)
 		exit()
 	else:
 		try:
@@ -42,7 +43,10 @@ if __name__ == "__main__":
 			stdout_process = open(os.path.join(LOG_DIR, "stdout_" + process + ".log"), 'w')
 			stderr_process = open(os.path.join(LOG_DIR, "stderr_" + process + ".log"), 'w')
 			#processes[process] = subprocess.Popen(['python', '-m', 'ML_Ops_Pipeline.main_git', '--disable-torch-multiprocessing'], stdout=stdout_process, stderr=stderr_process)
-			processes[process] = subprocess.Popen(['python', '-m', 'ML_Ops_Pipeline.main_git', '--disable-torch-multiprocessing'])
+			main_git_args = ['python', '-m', 'ML_Ops_Pipeline.main_git', '--workers', str(args.workers)]
+			if args.disable_torch_multiprocessing:
+				main_git_args.append('--disable-torch-multiprocessing')
+			processes[process] = subprocess.Popen(main_git_args)
 
 			# browsepy 0.0.0.0 8081 --directory data
 			process = 'browsepy'
@@ -2,11 +2,12 @@ import subprocess
 import os
 import importlib
 import traceback
-import glob
 
 import sys
 
-from .constants import REMOTE_PIPELINES_DIR, REMOTE_PIPELINES_TXT
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .constants import REMOTE_PIPELINES_DIR, REMOTE_PIPELINES_TXT, REMOTE_PIPELINES_DEPTH, GIT_SYNC_WORKERS
 
 import git
 
@@ -16,115 +17,164 @@ log = False
 if __name__=="__main__":
     log = True
 
-global all_inputs, all_inputs_modules
+global all_inputs, all_inputs_modules, all_inputs_commits
 all_inputs = {}
 all_inputs_modules = {}
-
-def get_all_inputs(debug=False):
-	global all_inputs, all_inputs_modules
-
-	os.makedirs(REMOTE_PIPELINES_DIR, exist_ok=True)
-	all_latest_commits = {}
-
+# Commit each entry of all_inputs was imported from
+all_inputs_commits = {}
+
+def pipeline_name_from_git(pipeline_git) -> str:
+	return pipeline_git.split('.git')[-2].split('/')[-1]
+
+def remote_head(repo) -> tuple:
+	"""
+	Returns (ref, sha) of the branch the checkout tracks on origin, using ls-remote only
+	"""
+	if repo.head.is_detached:
+		ref = "HEAD"
+	else:
+		ref = "refs/heads/" + repo.active_branch.name
+	ls_remote = repo.git.ls_remote('origin', ref)
+	if ls_remote == "":
+		return ref, None
+	return ref, ls_remote.split()[0]
+
+def sync_repo(pipeline_git, remote_pipelines_dir=REMOTE_PIPELINES_DIR, debug=False, depth=REMOTE_PIPELINES_DEPTH) -> tuple:
+	"""
+	Clones or updates one pipeline repo, returns (pipeline_name, latest_commit, changed)
+	The fetch and reset only happen when the remote ref moved away from the checkout
+	"""
+	pipeline_name = pipeline_name_from_git(pipeline_git)
+	pipeline_dir = os.path.join(remote_pipelines_dir, pipeline_name)
+	if not os.path.exists(pipeline_dir):
+		if log: print("clone", pipeline_dir)
+		if depth:
+			repo = git.Repo.clone_from(pipeline_git, pipeline_dir, depth=depth)
+		else:
+			repo = git.Repo.clone_from(pipeline_git, pipeline_dir)
+		return pipeline_name, repo.head.commit, True
+
+	repo = git.Repo(pipeline_dir)
+	assert not repo.bare
+	if debug:
+		return pipeline_name, repo.head.commit, False
+
+	old_commit = repo.head.commit
+	ref, remote_sha = remote_head(repo)
+	if remote_sha == old_commit.hexsha:
+		# Untracked modules left in the checkout would be imported into the manifest
+		if repo.is_dirty(untracked_files=True):
+			if log: print("reset", pipeline_dir)
+			repo.git.reset('--hard')
+			repo.git.clean('-xdf')
+		return pipeline_name, old_commit, False
+
+	if log: print("pull", pipeline_dir)
+	if depth:
+		repo.git.fetch('origin', ref, depth=depth)
+	else:
+		repo.git.fetch('origin', ref)
+	repo.git.reset('--hard', 'FETCH_HEAD')
+	repo.git.clean('-xdf')
+	latest_commit = repo.head.commit
+	print("Updated", pipeline_name, old_commit.hexsha, "->", latest_commit.hexsha)
+	return pipeline_name, latest_commit, latest_commit.hexsha != old_commit.hexsha
+
+def sync_repos(pipelines_git_list, remote_pipelines_dir=REMOTE_PIPELINES_DIR, debug=False, depth=REMOTE_PIPELINES_DEPTH) -> dict:
+	"""
+	Syncs every repo concurrently, returns {pipeline_name: (latest_commit, changed)}
+	A repo that fails to sync is left out and reported
+	"""
+	os.makedirs(remote_pipelines_dir, exist_ok=True)
+	synced = {}
+	if len(pipelines_git_list) == 0:
+		return synced
+	with ThreadPoolExecutor(max_workers=min(GIT_SYNC_WORKERS, len(pipelines_git_list))) as pool:
+		futures = {pool.submit(sync_repo, pipeline_git, remote_pipelines_dir, debug, depth): pipeline_git for pipeline_git in pipelines_git_list}
+		for future in as_completed(futures):
+			try:
+				pipeline_name, latest_commit, changed = future.result()
+				synced[pipeline_name] = (latest_commit, changed)
+			except Exception as e:
+				print("FAILED to sync", futures[future], e)
+				traceback.print_exc()
+	return synced
+
+def import_pipeline(p_name):
+	"""
+	Imports a pipeline package from REMOTE_PIPELINES_DIR from scratch
+	Stale copies of the package and its submodules are purged from sys.modules first
+	so an updated checkout is never mixed with modules imported from an older commit
+	"""
+	for module_name in list(sys.modules.keys()):
+		if module_name == p_name or module_name.startswith(p_name + "."):
+			del sys.modules[module_name]
+	from .pipeline_input import clear_source_hashes
+	clear_source_hashes(p_name)
+	# The checkout may have been created or changed after the path finders cached the directory
+	importlib.invalidate_caches()
+	return importlib.import_module(p_name)
+
+def load_pipeline(p_name, commit_id):
+	"""
+	Returns the exported_pipeline of p_name, importing it again only if commit_id changed
+	Returns None if the pipeline failed to import at this commit
+	"""
+	global all_inputs, all_inputs_modules, all_inputs_commits
+	if all_inputs_commits.get(p_name) == commit_id:
+		return all_inputs.get(p_name)
+	if log:
+		print("-"*10)
+		print("Loading:", p_name, commit_id)
+	all_inputs_commits[p_name] = commit_id
+	all_inputs.pop(p_name, None)
+	all_inputs_modules.pop(p_name, None)
+	try:
+		pipeline = import_pipeline(p_name)
+		all_inputs[p_name] = pipeline.exported_pipeline
+		all_inputs_modules[p_name] = pipeline
+	except Exception as e:
+		# Not retried until the next commit
+		print("FAILED to import", p_name, "at", commit_id, e)
+		traceback.print_exc()
+	return all_inputs.get(p_name)
+
+def read_remote_pipelines() -> list:
 	git_list_file = open(REMOTE_PIPELINES_TXT, 'r')
 	pipelines_git_list = []
 	for line in git_list_file.readlines():
-		pipeline_git = line.replace('\n', '')
-		pipelines_git_list.append(pipeline_git)
-
-	if log: print("pipelines_git_list", pipelines_git_list)
+		pipeline_git = line.strip()
+		if pipeline_git:
+			pipelines_git_list.append(pipeline_git)
+	git_list_file.close()
+	return pipelines_git_list
 
-	for pipeline_git in pipelines_git_list:
-		pipeline_name = pipeline_git.split('.git')[-2].split('/')[-1]
-		pipeline_dir = os.path.join(REMOTE_PIPELINES_DIR, pipeline_name)
-		if os.path.exists(pipeline_dir):
-			if log: print("pull", pipeline_dir)
-			repo = git.Repo(pipeline_dir)
-			if not debug:
-				repo.git.clean('-xdf')
-				repo.git.reset('--hard')
-			
-			# os.rmdir(pipeline_dir)
-			# repo = git.Repo.clone_from(pipeline_git, pipeline_dir)
-		else:
-			if log: print("clone", pipeline_dir)
-			repo = git.Repo.clone_from(pipeline_git, pipeline_dir)
-		
-		#origin = repo.remote
-		origin = repo.remotes.origin
-		assert origin.__class__ is git.remote.Remote
-		assert not repo.bare
-		assert repo.__class__ is git.Repo
-
-		if not debug:
-			origin.pull()
-
-
-		latest_commit = repo.head.commit #git_latest_commit(pipeline_dir)'
-		"""
-		latest_commit: 
-		 'author', 'author_tz_offset', 'authored_date', 'authored_datetime', 'binsha', 
-		 'committed_date', 'committed_datetime', 'committer', 'committer_tz_offset', 
-		 'conf_encoding', 'count', 'create_from_tree', 'data_stream', 'default_encoding', 
-		 'diff', 'encoding', 'env_author_date', 'env_committer_date', 'gpgsig', 'hexsha', 
-		 'iter_items', 'iter_parents', 'list_items', 'list_traverse', 'message', 'name_rev', 
-		 'new', 'new_from_sha', 'parents', 'replace', 'repo', 'size', 'stats', 'stream_data', 
-		 'summary', 'trailers', 'traverse', 'tree', 'type']
-		"""
-		for diff_added in latest_commit.diff('HEAD~1').iter_change_type('A'):
-			print(diff_added)
-
-		all_latest_commits[pipeline_name] = latest_commit
-		#all_latest_commits[pipeline_name] = latest_hash.decode('UTF-8')
+def get_all_inputs(debug=False):
+	"""
+	Returns {pipeline_name: {'pipeline': exported_pipeline, 'git_data': latest_commit}}
+	Pipelines are only imported again when their commit changes
+	"""
+	global all_inputs, all_inputs_modules, all_inputs_commits
 
-	git_list_file.close()
+	pipelines_git_list = read_remote_pipelines()
+	if log: print("pipelines_git_list", pipelines_git_list)
 
-	pipelines_list = list(map(lambda x: x.split("/")[-1],glob.glob(os.path.join(REMOTE_PIPELINES_DIR, '*'))))
-	#pipelines_list = list(map(lambda x: x.split("/")[-1],glob.glob('remote_pipelines/*')))
-	pipelines_list = list(filter(lambda x: x not in ["template", "__pycache__", "README.md"], pipelines_list))
+	synced = sync_repos(pipelines_git_list, debug=debug)
+	all_latest_commits = {pipeline_name: synced[pipeline_name][0] for pipeline_name in synced}
 
-	if log:
-		print(pipelines_list)
-		print("-"*10)
+	for p_name in all_latest_commits:
+		if p_name in ["template", "__pycache__", "README.md"]:
+			continue
+		load_pipeline(p_name, all_latest_commits[p_name].hexsha)
 
-	for p in pipelines_list:
-		if log:
-			print("-"*10)
-			print(p)
-		try:
-			p_name = p.split('/')[-1]
-			if p_name in all_inputs:
-				if log:
-					print("Reloading:", p_name)
-				# pipeline = importlib.reload(all_inputs_modules[p_name])
-				pipeline = all_inputs_modules[p_name]
-				del pipeline
-				pipeline = importlib.import_module(p_name)
-			else:
-				if log:
-					print("Loading:", p_name)
-				#REMOTE_PIPELINES_DIR_NAME = REMOTE_PIPELINES_DIR.split("/")[-1]
-				#pipeline = importlib.import_module(REMOTE_PIPELINES_DIR_NAME + "." + p_name)
-				pipeline = importlib.import_module(p_name)
-				
-			p_exported = pipeline.exported_pipeline
-			all_inputs[p_name] = p_exported
-			all_inputs_modules[p_name] = pipeline
-		except Exception as e:
-			if log:
-				print("FAILED: ", p, e)
-				traceback.print_exc()
-				
-			pass
-		finally:
-			if log:
-				print("-"*10)
-	
 	print(all_inputs)
 	print(all_latest_commits)
 
 	final_pipelines = {}
 	for pipeline_name in all_inputs:
+		if pipeline_name not in all_latest_commits:
+			# Not listed in remote_pipelines.txt or failed to sync
+			continue
 		final_pipelines[pipeline_name] = {
 			'pipeline': all_inputs[pipeline_name],
 			'git_data': all_latest_commits[pipeline_name]
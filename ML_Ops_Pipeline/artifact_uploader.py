@@ -0,0 +1,168 @@
+"""
+artifact_uploader
+
+Copies the artifact directories of the runs into the mlflow store, the
+linking into the run's artifacts happens on a background thread.
+Files are content addressed: each distinct file is copied once into
+ARTIFACT_BLOBS_DIR and hard linked into the artifacts of every run that logs
+it, so an unchanged predictions pickle or PNG costs a hash and a link.
+The blobs are stored before log_artifacts returns, so a stage rewriting the
+directory afterwards (the test visualizer clearing the visual_dir of the
+train one) does not change what the run logged.
+The queue is bounded, a stage logging faster than the copies go blocks in
+log_artifacts. The scheduler calls wait_for_uploads when it shuts its
+workers down.
+Artifact stores that are not local directories get a plain
+client.log_artifacts of the linked blobs, still off the stage's thread.
+"""
+
+import os
+import queue
+import shutil
+import hashlib
+import tempfile
+import threading
+import traceback
+from urllib.parse import urlparse, unquote
+
+from .constants import ARTIFACT_BLOBS_DIR, ARTIFACT_UPLOAD_QUEUE
+
+HASH_CHUNK = 1024**2
+
+def file_digest(path) -> str:
+	digest = hashlib.sha256()
+	with open(path, 'rb') as file_handle:
+		for chunk in iter(lambda: file_handle.read(HASH_CHUNK), b''):
+			digest.update(chunk)
+	return digest.hexdigest()
+
+def local_artifact_dir(client, run_id) -> str:
+	"""
+	Artifact directory of the run, None when the store is not on this filesystem
+	"""
+	artifact_uri = urlparse(client.get_run(run_id).info.artifact_uri)
+	if artifact_uri.scheme not in ('', 'file'):
+		return None
+	return unquote(artifact_uri.path)
+
+
+class artifact_uploader:
+
+	def __init__(self, blobs_dir=ARTIFACT_BLOBS_DIR, queue_size=ARTIFACT_UPLOAD_QUEUE) -> None:
+		"""
+		queue_size: directories waiting to be uploaded, 0 uploads in the calling thread
+		"""
+		self.blobs_dir = blobs_dir
+		self.queue_size = queue_size
+		self.queue = queue.Queue(maxsize=max(queue_size, 1))
+		self.thread = None
+		self.lock = threading.Lock()
+		# (path, inode, size, mtime) -> sha256, files logged again by later runs are not hashed again
+		self.digests = {}
+		self.stats = {'files': 0, 'copied': 0, 'copied_bytes': 0}
+
+	def log_artifacts(self, client, run_id, local_dir, artifact_path=None) -> None:
+		# Looked up by the caller, the file store is not safe to read while the run's metrics are being written
+		artifact_dir = local_artifact_dir(client, run_id)
+		files = self.snapshot(local_dir)
+		if self.queue_size <= 0:
+			self.upload(client, run_id, files, artifact_path, artifact_dir)
+			return
+		self.start()
+		self.queue.put((client, run_id, files, artifact_path, artifact_dir))
+
+	def snapshot(self, local_dir) -> list:
+		"""
+		[(blob path, path relative to local_dir), ...] of the files in local_dir as they are now
+		"""
+		files = []
+		for root, _, names in os.walk(local_dir):
+			for name in names:
+				path = os.path.join(root, name)
+				files.append((self.blob(path), os.path.relpath(path, local_dir)))
+		return files
+
+	def start(self) -> None:
+		with self.lock:
+			if self.thread is None or not self.thread.is_alive():
+				self.thread = threading.Thread(target=self.loop, name="artifact_uploader", daemon=True)
+				self.thread.start()
+
+	def loop(self) -> None:
+		while True:
+			upload_args = self.queue.get()
+			try:
+				self.upload(*upload_args)
+			except Exception:
+				# A lost artifact directory is reported, the run itself already finished
+				traceback.print_exc()
+			finally:
+				self.queue.task_done()
+
+	def wait(self) -> None:
+		self.queue.join()
+
+	def upload(self, client, run_id, files, artifact_path=None, artifact_dir=None) -> None:
+		if artifact_dir is None:
+			# The store reads a directory, rebuilt from the blobs
+			staging_dir = tempfile.mkdtemp(prefix="artifacts_")
+			try:
+				for blob_path, relative_path in files:
+					self.link(blob_path, os.path.join(staging_dir, relative_path))
+				client.log_artifacts(run_id, staging_dir, artifact_path)
+			finally:
+				shutil.rmtree(staging_dir, ignore_errors=True)
+			return
+		if artifact_path is not None:
+			artifact_dir = os.path.join(artifact_dir, artifact_path)
+		for blob_path, relative_path in files:
+			self.link(blob_path, os.path.join(artifact_dir, relative_path))
+
+	def blob(self, path) -> str:
+		"""
+		Path of the stored copy of the file, copied only if its contents are new
+		"""
+		stat = os.stat(path)
+		key = (path, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+		if key not in self.digests:
+			self.digests[key] = file_digest(path)
+		digest = self.digests[key]
+		blob_path = os.path.join(self.blobs_dir, digest[:2], digest)
+		if not os.path.exists(blob_path):
+			os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+			# Other workers may store the same blob, only a complete copy is renamed into place
+			tmp_path = blob_path + "." + str(os.getpid()) + ".tmp"
+			shutil.copyfile(path, tmp_path)
+			os.replace(tmp_path, blob_path)
+			self.stats['copied'] += 1
+			self.stats['copied_bytes'] += stat.st_size
+		return blob_path
+
+	def link(self, blob_path, artifact_path) -> None:
+		# Linked to the stored copy and not to the output, a stage rewriting its output later leaves the run as logged
+		os.makedirs(os.path.dirname(artifact_path), exist_ok=True)
+		if os.path.lexists(artifact_path):
+			os.remove(artifact_path)
+		try:
+			os.link(blob_path, artifact_path)
+		except OSError:
+			# e.g. the blobs and the mlflow store on different filesystems
+			shutil.copyfile(blob_path, artifact_path)
+		self.stats['files'] += 1
+
+
+global default_uploader
+default_uploader = None
+
+def get_uploader() -> artifact_uploader:
+	global default_uploader
+	if default_uploader is None:
+		default_uploader = artifact_uploader()
+	return default_uploader
+
+def wait_for_uploads() -> None:
+	"""
+	Blocks until the artifacts logged by this process are in the store
+	"""
+	if default_uploader is not None:
+		default_uploader.wait()
@@ -28,8 +28,46 @@ ENSEMBLE_VISUAL = os.path.join(PIPELINE_HOME, "data/{pipeline_name}/visuals/{ens
 
 HISTORY_PATH = os.path.join(PIPELINE_HOME, "history")
 
+DATASET_CACHE_DIR = os.path.join(PIPELINE_HOME, "cache/datasets/")
+DATASET_CACHE_SIZE = 4 # parsed datasets kept in memory per process
+DATASET_CACHE_DISK_SIZE = 32
+DATASET_BATCH_SIZE = 256 # items per batch of streaming dataset interpreters
+
+INFERENCE_BATCH_SIZE = 8 # items per predict_batch call
+INFERENCE_BATCH_MEMORY = None # bytes of input per predict_batch call, None to batch by count only
+
+IMAGE_LOADER_WORKERS = 4 # decoding threads per image_loader
+IMAGE_LOADER_PREFETCH = 8 # images decoded ahead of the prediction loop
+
+FRAME_CACHE = os.environ.get('FRAME_CACHE', '0') == '1' # opt in, set FRAME_CACHE=1
+FRAME_CACHE_DIR = os.path.join(PIPELINE_HOME, "cache/frames/")
+FRAME_CACHE_SHARD_SIZE = 1024**3 # bytes per memory mapped shard
+FRAME_CACHE_FINGERPRINT_AGE = 10 # seconds read_frame reuses a dataset fingerprint before walking the dataset again
+
+PREDICTIONS_IMAGES_PER_GROUP = 64 # images per Parquet row group of the stored predictions
+
+MODEL_POOL_SIZE = 4 # loaded models kept per worker process
+MODEL_POOL_MEMORY = 8 * 1024**3
+FROZEN_TRAIN_SAMPLE = 0 # train split items still predicted by frozen models, 0 skips their train split
+COMBINED_MODEL_TASKS = os.environ.get('COMBINED_MODEL_TASKS', '1') == '1' # train and analyze of a model in one task, COMBINED_MODEL_TASKS=0 to split them
+
+TRACKING_BACKEND = os.environ.get('TRACKING_BACKEND', 'mlflow') # mlflow, jsonl or null
+TRACKING_DIR = os.path.join(PIPELINE_HOME, "tracking/") # runs of the jsonl backend
+TRACKING_LOG_MODELS = os.environ.get('TRACKING_LOG_MODELS', '0') == '1' # opt in to serializing models into the runs
+ARTIFACT_BLOBS_DIR = os.path.join(PIPELINE_HOME, "artifact_blobs/") # content addressed artifact files, hard linked into the runs
+ARTIFACT_UPLOAD_QUEUE = 8 # artifact directories waiting for the background uploader, 0 uploads synchronously
+TRACING = os.environ.get('TRACING', '1') == '1' # Chrome traces of every run, TRACING=0 to turn them off
+TRACE_DIR = os.path.join(PIPELINE_HOME, "traces/")
+RESOURCE_TRACEMALLOC = os.environ.get('RESOURCE_TRACEMALLOC', '0') == '1' # allocation sites of every run, slows Python allocations down
+RESOURCE_TRACEMALLOC_TOP = 10
+PREDICTION_CACHE = os.environ.get('PREDICTION_CACHE', '1') == '1' # reuse predictions of unchanged items across dataset versions
+PREDICTION_CACHE_DB = os.path.join(PIPELINE_HOME, "prediction_cache.sqlite")
+PREDICTION_CACHE_SIZE = 16 * 1024**3
+
 REMOTE_PIPELINES_DIR = os.path.join(PIPELINE_HOME, "remote_pipelines")
 REMOTE_PIPELINES_TXT = os.path.join(PIPELINE_HOME, "remote_pipelines.txt")
+REMOTE_PIPELINES_DEPTH = None # clone depth of the pipeline repos, None for full history
+GIT_SYNC_WORKERS = 8
 
 import mlflow
 mlflow.set_tracking_uri("file://" + MLFLOW_DIR)
@@ -0,0 +1,55 @@
+"""
+dataset_batches
+
+Runs the train, evaluate and visualize stages over streaming dataset
+interpreters one batch at a time, so only a batch of the dataset is
+in memory instead of the whole of it. The predictions are not streamed:
+run_batches joins those of every batch, they are written and read back by
+the visualizers as one file.
+"""
+
+from .pipeline_input import concat_items
+from .tracing import span
+
+def has_batches(interpreter) -> bool:
+	return bool(getattr(interpreter, 'streaming', False))
+
+def open_batches(interpreter, dataset_dir):
+	# Streaming interpreters read their data in iter_batches, load() is skipped
+	with span("dataset_load", dataset_dir=dataset_dir):
+		return interpreter(dataset_dir, load=False)
+
+def open_dataset(interpreter, dataset_dir):
+	# What the train and analyze stages read from: the streaming interpreter, or the loaded dataset dict
+	if has_batches(interpreter):
+		return open_batches(interpreter, dataset_dir)
+	from .dataset_cache import get_dataset
+	return get_dataset(interpreter, dataset_dir)
+
+def batch_len(batch) -> int:
+	if batch['x'] is None:
+		return 0
+	return len(batch['x'])
+
+def run_batches(mod, method_name, interp, split, limit=None) -> tuple:
+	"""
+	Calls mod.train or mod.evaluate on every batch of split, or on the first batches holding limit items
+	Returns (results merged by mod.merge_results, predictions of all batches)
+	"""
+	method = getattr(mod, method_name)
+	results = []
+	predictions = []
+	sizes = []
+	for batch in interp.iter_batches(split, interp.batch_size):
+		if limit is not None and sum(sizes) >= limit:
+			break
+		with span(method_name, batch=len(sizes)):
+			batch_results, batch_predictions = method(batch['x'], batch['y'])
+		results.append(batch_results)
+		predictions.append(batch_predictions)
+		sizes.append(batch_len(batch))
+	print("Ran", method_name, "over", len(sizes), "batches,", sum(sizes), "items")
+	return mod.merge_results(results, sizes), concat_items(predictions)
+
+def visualize_batches(visualizer, interp, split, results, predictions, directory) -> None:
+	visualizer.visualize_batches(interp.iter_batches(split, interp.batch_size), results, predictions, directory)
@@ -0,0 +1,149 @@
+"""
+dataset_cache
+
+Parsed datasets shared by the train, analyze, visualize and ensemble stages.
+A dataset is identified by the source hash of its interpreter class and the
+fingerprint of the dataset directory, so editing either one misses the cache.
+Lookups go through an in-process LRU first, then through pickles under
+DATASET_CACHE_DIR which survive across worker processes and cycles.
+The returned dataset is shared between callers and must be treated as read only.
+"""
+
+import os
+import time
+import pickle
+import hashlib
+import traceback
+from collections import OrderedDict
+
+from .constants import DATASET_CACHE_DIR, DATASET_CACHE_SIZE, DATASET_CACHE_DISK_SIZE
+from .pipeline_input import source_hash
+from .tracing import span
+
+global dataset_fingerprints
+# dataset_dir -> (time computed, fingerprint)
+dataset_fingerprints = {}
+
+def dataset_fingerprint(dataset_dir, max_age=0) -> str:
+	"""
+	Content fingerprint of a dataset directory: relative path, size and mtime of every file
+	Nothing marks a dataset as complete or unchanged, so the files are walked again unless
+	the last fingerprint of dataset_dir is at most max_age seconds old
+	"""
+	global dataset_fingerprints
+	now = time.time()
+	if max_age > 0 and dataset_dir in dataset_fingerprints and now - dataset_fingerprints[dataset_dir][0] <= max_age:
+		return dataset_fingerprints[dataset_dir][1]
+
+	files_hash = hashlib.sha1()
+	for path, directories, files in os.walk(dataset_dir):
+		directories.sort()
+		for file in sorted(files):
+			file_path = os.path.join(path, file)
+			file_stat = os.stat(file_path)
+			files_hash.update(os.path.relpath(file_path, dataset_dir).encode("utf-8"))
+			files_hash.update((":" + str(file_stat.st_size) + ":" + str(file_stat.st_mtime_ns) + "\n").encode("utf-8"))
+	fingerprint = files_hash.hexdigest()
+	dataset_fingerprints[dataset_dir] = (now, fingerprint)
+	return fingerprint
+
+
+class dataset_cache:
+
+	def __init__(self, cache_dir=DATASET_CACHE_DIR, max_entries=DATASET_CACHE_SIZE, max_disk_entries=DATASET_CACHE_DISK_SIZE) -> None:
+		self.cache_dir = cache_dir
+		self.max_entries = max_entries
+		self.max_disk_entries = max_disk_entries
+		self.entries = OrderedDict()
+		self.hits = 0
+		self.disk_hits = 0
+		self.misses = 0
+
+	def key(self, interpreter, dataset_dir) -> str:
+		key_hash = hashlib.sha1()
+		key_hash.update(str(source_hash(interpreter)).encode("utf-8"))
+		key_hash.update(os.path.abspath(dataset_dir).encode("utf-8"))
+		key_hash.update(dataset_fingerprint(dataset_dir).encode("utf-8"))
+		return key_hash.hexdigest()
+
+	def get_dataset(self, interpreter, dataset_dir) -> dict:
+		key = self.key(interpreter, dataset_dir)
+		if key in self.entries:
+			self.hits += 1
+			self.entries.move_to_end(key)
+			return self.entries[key]
+
+		dat = self.load(key)
+		if dat is not None:
+			self.disk_hits += 1
+		else:
+			self.misses += 1
+			dat = interpreter(dataset_dir).get_dataset()
+			self.dump(key, dat)
+
+		self.entries[key] = dat
+		while len(self.entries) > self.max_entries:
+			self.entries.popitem(last=False)
+		return dat
+
+	def path(self, key) -> str:
+		return os.path.join(self.cache_dir, key + ".pkl")
+
+	def load(self, key):
+		cache_pkl = self.path(key)
+		if not os.path.exists(cache_pkl):
+			return None
+		try:
+			with open(cache_pkl, 'rb') as cache_handle:
+				dat = pickle.load(cache_handle)
+			os.utime(cache_pkl)
+			return dat
+		except Exception:
+			# Truncated or written by an incompatible version, rebuild it
+			traceback.print_exc()
+			os.remove(cache_pkl)
+			return None
+
+	def dump(self, key, dat) -> None:
+		os.makedirs(self.cache_dir, exist_ok=True)
+		cache_pkl = self.path(key)
+		tmp_pkl = cache_pkl + "." + str(os.getpid()) + ".tmp"
+		try:
+			with open(tmp_pkl, 'wb') as cache_handle:
+				pickle.dump(dat, cache_handle, protocol=pickle.HIGHEST_PROTOCOL)
+			# Concurrent workers may build the same entry, the rename keeps readers from seeing partial files
+			os.replace(tmp_pkl, cache_pkl)
+		except Exception as ex:
+			print("Dataset not cached on disk:", ex)
+			if os.path.exists(tmp_pkl):
+				os.remove(tmp_pkl)
+			return
+		self.prune()
+
+	def prune(self) -> None:
+		cache_files = [os.path.join(self.cache_dir, f) for f in os.listdir(self.cache_dir) if f.endswith(".pkl")]
+		if len(cache_files) <= self.max_disk_entries:
+			return
+		cache_files.sort(key=lambda f: os.path.getmtime(f))
+		for cache_pkl in cache_files[:len(cache_files) - self.max_disk_entries]:
+			try:
+				os.remove(cache_pkl)
+			except FileNotFoundError:
+				pass
+
+	def clear(self) -> None:
+		self.entries.clear()
+
+
+global default_cache
+default_cache = None
+
+def get_dataset(interpreter, dataset_dir) -> dict:
+	"""
+	Cached equivalent of interpreter(dataset_dir).get_dataset()
+	"""
+	global default_cache
+	if default_cache is None:
+		default_cache = dataset_cache()
+	with span("dataset_load", dataset_dir=dataset_dir):
+		return default_cache.get_dataset(interpreter, dataset_dir)
@@ -19,17 +19,20 @@ from datetime import datetime
 #import multiprocessing
 
 import json
-import mlflow
+from ..tracking import start_run
+from ..tracing import span
 
 from ..all_pipelines_git import get_all_inputs
 from ..pipeline_input import source_hash
 from ..constants import DATASET_DIR, ENSEMBLE_TESTING, MODEL_TESTING, MODEL_TRAINING, ENSEMBLE_TRAINING
 from ..history import local_history
+from ..predictions_store import write_predictions, read_predictions
+from ..dataset_cache import get_dataset
 from .ensemble_visualizer_loop import vizualize_ensemble
 
 import traceback
 
-def analyze_ensemble(pipeline_name, ensemble_name, interpreter_name, dataset_dir, model_classes, interpreters, task_id, ensemble_last_modified, task_id_source_hash, ensemble_last_source_hash, ensemble_classes, visualizers):
+def analyze_ensemble(pipeline_name, ensemble_name, interpreter_name, dataset_dir, model_classes, interpreters, task_id, ensemble_last_modified, task_id_source_hash, ensemble_last_source_hash, ensemble_classes, visualizers, model_commit_ids=None):
 	print("-"*10)
 	print("ensemble_name:\t",ensemble_name)
 	print("interpreter_name:\t",interpreter_name)
@@ -42,75 +45,71 @@ def analyze_ensemble(pipeline_name, ensemble_name, interpreter_name, dataset_dir
 	)
 	os.makedirs(testing_dir, exist_ok=True)
 	
-	expt = mlflow.get_experiment_by_name(pipeline_name)
-	if not expt:
-		mlflow.create_experiment(pipeline_name)
-		expt = mlflow.get_experiment_by_name(pipeline_name)
 
 	tb = "OK"
-	with mlflow.start_run(description=testing_dir, run_name='test_'+ensemble_name, experiment_id=expt.experiment_id):
+	status = False
+	with start_run(pipeline_name, 'test_'+ensemble_name, description=testing_dir, resources_json=os.path.join(testing_dir, "resources.json")) as run:
 		try:
-			mlflow.set_tag("COMMIT", ensemble_last_modified)
+			run.set_tag("COMMIT", ensemble_last_modified)
 			model_predictions = {}
 			for model_name in model_classes:
 
+				# Model outputs may have been reused from an earlier commit
+				model_commit_id = ensemble_last_modified
+				if model_commit_ids and model_name in model_commit_ids:
+					model_commit_id = model_commit_ids[model_name]
 				model_testing_dir = MODEL_TESTING.format(
 					pipeline_name=pipeline_name,
 					interpreter_name=interpreter_name,
 					model_name=model_name,
-					commit_id=ensemble_last_modified
+					commit_id=model_commit_id
 				)
 				os.makedirs(model_testing_dir, exist_ok=True)
 				results_pkl = os.path.join(model_testing_dir, "results.pkl")
-				predictions_pkl = os.path.join(model_testing_dir, "predictions.pkl")
+				predictions_dir = model_testing_dir
 					
 				results_handle = open(results_pkl, 'rb')
 				results = pickle.load(results_handle)
 				results_handle.close()
-				predictions_handle = open(predictions_pkl, 'rb')
-				predictions = pickle.load(predictions_handle)
-				predictions_handle.close()
+				predictions = read_predictions(predictions_dir)
 						
 				model_predictions[model_name] = predictions
 
-			dat = interpreters[interpreter_name](dataset_dir).get_dataset()
+			dat = get_dataset(interpreters[interpreter_name], dataset_dir)
 			mod = ensemble_classes[ensemble_name](testing_dir)
 			#mod.predict(dat['test'])
 			#results, predictions = mod.evaluate(dat['test']['x'], dat['test']['y'])
 			#results, predictions = mod.evaluate(model_predictions, dat['test']['y'])
-			results, predictions = mod.evaluate(dat['test']['x'], dat['test']['y'], model_predictions=model_predictions)
+			with span("evaluate"):
+				results, predictions = mod.evaluate(dat['test']['x'], dat['test']['y'], model_predictions=model_predictions)
 			#print(results)
 
 			results_pkl = os.path.join(testing_dir, "results.pkl")
-			predictions_pkl = os.path.join(testing_dir, "predictions.pkl")
-			predictions_csv = os.path.join(testing_dir, "predictions.csv")
 			ensemble_pkl = os.path.join(testing_dir, "ensemble.pkl")
 
-			results_handle = open(results_pkl, 'wb')
-			pickle.dump(results, results_handle, protocol=pickle.HIGHEST_PROTOCOL)
-			results_handle.close()
+			with span("pickle_dump", path=results_pkl):
+				results_handle = open(results_pkl, 'wb')
+				pickle.dump(results, results_handle, protocol=pickle.HIGHEST_PROTOCOL)
+				results_handle.close()
 
-			predictions_handle = open(predictions_pkl, 'wb')
-			pickle.dump(predictions, predictions_handle, protocol=pickle.HIGHEST_PROTOCOL)
-			predictions_handle.close()
+			write_predictions(testing_dir, predictions)
 
-			ensemble_handle = open(ensemble_pkl, 'wb')
-			pickle.dump(mod, ensemble_handle, protocol=pickle.HIGHEST_PROTOCOL)
-			ensemble_handle.close()
+			with span("pickle_dump", path=ensemble_pkl):
+				ensemble_handle = open(ensemble_pkl, 'wb')
+				pickle.dump(mod, ensemble_handle, protocol=pickle.HIGHEST_PROTOCOL)
+				ensemble_handle.close()
 
-			predictions.to_csv(predictions_csv)
 
-			for key in results:
-				mlflow.log_metric(key, results[key])
+			run.log_metrics(results)
 			#mlflow.log_dict(predictions)
 
 			for visualizer_name in visualizers:
 				#stat, task_id, model_last_modified, visual_dir = vizualize_ensemble(pipeline_name, model_name, interpreter_name, dataset_dir, task_id, model_last_modified, visualizers, visualizer_name, dat, 'test')
 				stat, task_id, ensemble_last_modified_alt, visual_dir = vizualize_ensemble(pipeline_name, ensemble_name, interpreter_name, dataset_dir, task_id, ensemble_last_modified, visualizers, visualizer_name, dat, 'test')
-				mlflow.log_artifacts(visual_dir)
+				run.log_artifacts(visual_dir)
 
-			mlflow.set_tag("LOG_STATUS", "SUCCESS")
-			return (True, task_id, ensemble_last_modified, task_id_source_hash, ensemble_last_source_hash)
+			run.set_tag("LOG_STATUS", "SUCCESS")
+			status = True
 		except KeyboardInterrupt:
 			print("Interrupt recieved at ensemble_analysis")
 			print("-"*10)
@@ -121,14 +120,14 @@ def analyze_ensemble(pipeline_name, ensemble_name, interpreter_name, dataset_dir
 		except Exception as ex:
 			print(ex)
 			tb = traceback.format_exc()
-			mlflow.set_tag("LOG_STATUS", "FAILED")
+			run.set_tag("LOG_STATUS", "FAILED")
 		finally:
 			print(tb)
 			err_txt = os.path.join(testing_dir, "err.txt")
 			err_file = open(err_txt, "w")
 			err_file.write(tb)
 			err_file.close()
-			return (False, task_id, ensemble_last_modified, task_id_source_hash, ensemble_last_source_hash)
+			return (status, task_id, ensemble_last_modified, task_id_source_hash, ensemble_last_source_hash)
 
 def main():
 	loc_hist = local_history(__file__)
@@ -19,6 +19,7 @@ from ..all_pipelines_git import get_all_inputs
 from ..pipeline_input import source_hash
 from ..constants import DATASET_DIR, ENSEMBLE_TESTING, ENSEMBLE_TRAINING, ENSEMBLE_VISUAL, folder_last_modified
 from ..history import local_history
+from ..predictions_store import read_predictions
 
 def visualize_ensemble(pipeline_name, ensemble_name, interpreter_name, dataset_dir, task_id, ensemble_last_modified, visualizers, visualizer_name, dat, mode):
 	print("-"*10)
@@ -44,10 +45,10 @@ def visualize_ensemble(pipeline_name, ensemble_name, interpreter_name, dataset_d
 
 		if mode=='train':
 			results_pkl = os.path.join(training_dir, "results.pkl")
-			predictions_pkl = os.path.join(training_dir, "predictions.pkl")
+			predictions_dir = training_dir
 		elif mode=='test':
 			results_pkl = os.path.join(testing_dir, "results.pkl")
-			predictions_pkl = os.path.join(testing_dir, "predictions.pkl")
+			predictions_dir = testing_dir
 		else:
 			raise Exception("Mode must be test or train")
 
@@ -55,9 +56,7 @@ def visualize_ensemble(pipeline_name, ensemble_name, interpreter_name, dataset_d
 		results = pickle.load(results_handle)
 		results_handle.close()
 
-		predictions_handle = open(predictions_pkl, 'rb')
-		predictions = pickle.load(predictions_handle)
-		predictions_handle.close()
+		predictions = read_predictions(predictions_dir, columns=getattr(visualizers[visualizer_name], 'prediction_columns', None))
 
 		visual_dir = ENSEMBLE_VISUAL.format(
 			pipeline_name=pipeline_name, interpreter_name=interpreter_name, ensemble_name=ensemble_name, visualizer_name=visualizer_name,
@@ -166,15 +165,13 @@ def main():
 					visualizers = all_inputs[pipeline_name].get_pipeline_visualizer()
 					for visualizer_name in task_list[pipeline_name][interpreter_name][dataset_dir][ensemble_name].keys():
 						results_pkl = os.path.join(testing_dir, "results.pkl")
-						predictions_pkl = os.path.join(testing_dir, "predictions.pkl")
+						predictions_dir = testing_dir
 
 						results_handle = open(results_pkl, 'rb')
 						results = pickle.load(results_handle)
 						results_handle.close()
 
-						predictions_handle = open(predictions_pkl, 'rb')
-						predictions = pickle.load(predictions_handle)
-						predictions_handle.close()
+						predictions = read_predictions(predictions_dir)
 
 						visual_dir = ENSEMBLE_VISUAL.format(pipeline_name=pipeline_name, interpreter_name=interpreter_name, ensemble_name=ensemble_name, visualizer_name=visualizer_name)
 						os.makedirs(visual_dir, exist_ok=True)
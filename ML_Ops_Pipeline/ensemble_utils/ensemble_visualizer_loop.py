@@ -19,6 +19,8 @@ from ..all_pipelines_git import get_all_inputs
 from ..pipeline_input import source_hash
 from ..constants import DATASET_DIR, ENSEMBLE_TESTING, ENSEMBLE_TRAINING, ENSEMBLE_VISUAL, folder_last_modified
 from ..history import local_history
+from ..predictions_store import read_predictions
+from ..tracing import span
 
 def vizualize_ensemble(pipeline_name, ensemble_name, interpreter_name, dataset_dir, task_id, ensemble_last_modified, visualizers, visualizer_name, dat, mode):
 	print("-"*10)
@@ -44,19 +46,17 @@ def vizualize_ensemble(pipeline_name, ensemble_name, interpreter_name, dataset_d
 
 	if mode=='train':
 		results_pkl = os.path.join(training_dir, "results.pkl")
-		predictions_pkl = os.path.join(training_dir, "predictions.pkl")
+		predictions_dir = training_dir
 	elif mode=='test':
 		results_pkl = os.path.join(testing_dir, "results.pkl")
-		predictions_pkl = os.path.join(testing_dir, "predictions.pkl")
+		predictions_dir = testing_dir
 	else:
 		raise Exception("Mode must be test or train")
 	results_handle = open(results_pkl, 'rb')
 	results = pickle.load(results_handle)
 	results_handle.close()
 
-	predictions_handle = open(predictions_pkl, 'rb')
-	predictions = pickle.load(predictions_handle)
-	predictions_handle.close()
+	predictions = read_predictions(predictions_dir, columns=getattr(visualizers[visualizer_name], 'prediction_columns', None))
 
 	visual_dir = ENSEMBLE_VISUAL.format(
 		pipeline_name=pipeline_name, interpreter_name=interpreter_name, ensemble_name=ensemble_name, visualizer_name=visualizer_name,
@@ -73,7 +73,8 @@ def vizualize_ensemble(pipeline_name, ensemble_name, interpreter_name, dataset_d
 	print("interpreter_name:\t",interpreter_name)
 	print("dataset_dir:\t",dataset_dir)
 	print("visual_dir:\t",visual_dir)
-	visualizers[visualizer_name]().visualize(dat[mode]['x'], dat[mode]['y'], results, predictions, visual_dir)
+	with span("visualize", visualizer=visualizer_name, mode=mode):
+		visualizers[visualizer_name]().visualize(dat[mode]['x'], dat[mode]['y'], results, predictions, visual_dir)
 
 	return (True, task_id, ensemble_last_modified, visual_dir)
 
@@ -158,15 +159,13 @@ def main():
 					visualizers = all_inputs[pipeline_name].get_pipeline_visualizer()
 					for visualizer_name in task_list[pipeline_name][interpreter_name][dataset_dir][ensemble_name].keys():
 						results_pkl = os.path.join(testing_dir, "results.pkl")
-						predictions_pkl = os.path.join(testing_dir, "predictions.pkl")
+						predictions_dir = testing_dir
 
 						results_handle = open(results_pkl, 'rb')
 						results = pickle.load(results_handle)
 						results_handle.close()
 
-						predictions_handle = open(predictions_pkl, 'rb')
-						predictions = pickle.load(predictions_handle)
-						predictions_handle.close()
+						predictions = read_predictions(predictions_dir)
 
 						visual_dir = ENSEMBLE_VISUAL.format(pipeline_name=pipeline_name, interpreter_name=interpreter_name, ensemble_name=ensemble_name, visualizer_name=visualizer_name)
 						os.makedirs(visual_dir, exist_ok=True)
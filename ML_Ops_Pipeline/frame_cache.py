@@ -0,0 +1,199 @@
+"""
+frame_cache
+
+Opt in (FRAME_CACHE=1) store of decoded dataset images. The first read from a
+dataset decodes all of its images once into fixed size uint8 shards under
+FRAME_CACHE_DIR, with an index of the shard, offset and shape of every image.
+Later reads, from any stage or process, are memory mapped views of the shards
+served from the page cache without decoding or copying. The store is keyed on
+the dataset fingerprint, so a changed dataset gets a new store and the old
+one is removed.
+
+read_frame is a drop in replacement for cv2.imread. The shards are mapped
+copy on write, so callers may draw on the frames they get back.
+"""
+
+import os
+import sys
+import json
+import shutil
+import hashlib
+import fcntl
+
+import numpy as np
+import cv2
+
+from .constants import DATA_BASE_DIR, FRAME_CACHE, FRAME_CACHE_DIR, FRAME_CACHE_SHARD_SIZE, FRAME_CACHE_FINGERPRINT_AGE
+from .dataset_cache import dataset_fingerprint
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.ppm', '.bmp')
+
+def dataset_root(image_path) -> str:
+	"""
+	DATA_BASE_DIR/<pipeline_name>/datasets/<interpreter_name>/<version> containing image_path, None outside of the datasets
+	Every ingested version is a dataset of its own, see data_ingestion
+	"""
+	relative_path = os.path.relpath(os.path.abspath(image_path), os.path.abspath(DATA_BASE_DIR))
+	parts = relative_path.split(os.sep)
+	if len(parts) < 5 or parts[0] == ".." or parts[1] != "datasets":
+		return None
+	return os.path.join(os.path.abspath(DATA_BASE_DIR), *parts[:4])
+
+
+class frame_cache:
+
+	def __init__(self, dataset_dir, cache_dir=FRAME_CACHE_DIR, shard_size=FRAME_CACHE_SHARD_SIZE) -> None:
+		self.dataset_dir = os.path.abspath(dataset_dir)
+		self.cache_dir = cache_dir
+		self.shard_size = shard_size
+		self.fingerprint = dataset_fingerprint(self.dataset_dir)
+		key_hash = hashlib.sha1()
+		key_hash.update(self.dataset_dir.encode("utf-8"))
+		key_hash.update(self.fingerprint.encode("utf-8"))
+		self.key = key_hash.hexdigest()
+		self.path = os.path.join(cache_dir, self.key)
+		self.index = None
+		self.shards = {}
+
+	def index_json(self, path=None) -> str:
+		return os.path.join(path or self.path, "index.json")
+
+	def shard_bin(self, shard, path=None) -> str:
+		return os.path.join(path or self.path, "shard_" + str(shard).zfill(5) + ".bin")
+
+	def image_paths(self) -> list:
+		image_paths = []
+		for path, directories, files in os.walk(self.dataset_dir):
+			directories.sort()
+			for file in sorted(files):
+				if file.lower().endswith(IMAGE_EXTENSIONS):
+					image_paths.append(os.path.join(path, file))
+		return image_paths
+
+	def build(self) -> None:
+		"""
+		Decodes every image of the dataset into the shards, once across processes
+		"""
+		os.makedirs(self.cache_dir, exist_ok=True)
+		with open(os.path.join(self.cache_dir, self.key + ".lock"), 'w') as lock_handle:
+			fcntl.flock(lock_handle, fcntl.LOCK_EX)
+			if os.path.exists(self.index_json()):
+				return
+			from .image_loader import image_loader
+			tmp_path = self.path + "." + str(os.getpid()) + ".tmp"
+			shutil.rmtree(tmp_path, ignore_errors=True)
+			os.makedirs(tmp_path)
+			index = {}
+			shard, offset, shard_handle = 0, 0, None
+			print("Building frame cache of", self.dataset_dir)
+			try:
+				for image_path, image in image_loader(self.image_paths(), read=decode_frame):
+					if image.size == 0:
+						continue
+					if shard_handle is None or (offset > 0 and offset + image.nbytes > self.shard_size):
+						if shard_handle is not None:
+							shard_handle.close()
+							shard += 1
+						shard_handle = open(self.shard_bin(shard, tmp_path), 'wb')
+						offset = 0
+					shard_handle.write(np.ascontiguousarray(image, dtype=np.uint8).tobytes())
+					index[os.path.relpath(image_path, self.dataset_dir)] = [shard, offset, list(image.shape)]
+					offset += image.nbytes
+			finally:
+				if shard_handle is not None:
+					shard_handle.close()
+			with open(self.index_json(tmp_path), 'w') as index_handle:
+				json.dump({'dataset_dir': self.dataset_dir, 'fingerprint': self.fingerprint, 'frames': index}, index_handle)
+			os.replace(tmp_path, self.path)
+			print("Cached", len(index), "frames in", shard + 1 if index else 0, "shards")
+		self.prune()
+
+	def prune(self) -> None:
+		# Stores of older versions of the same dataset
+		for key in os.listdir(self.cache_dir):
+			other_path = os.path.join(self.cache_dir, key)
+			if key == self.key or not os.path.isfile(self.index_json(other_path)):
+				continue
+			try:
+				with open(self.index_json(other_path)) as index_handle:
+					other_dataset_dir = json.load(index_handle)['dataset_dir']
+			except (OSError, ValueError, KeyError):
+				continue
+			if other_dataset_dir == self.dataset_dir:
+				print("Removing stale frame cache", other_path)
+				shutil.rmtree(other_path, ignore_errors=True)
+				if os.path.exists(other_path + ".lock"):
+					os.remove(other_path + ".lock")
+
+	def open(self) -> None:
+		if self.index is not None:
+			return
+		if not os.path.exists(self.index_json()):
+			self.build()
+		with open(self.index_json()) as index_handle:
+			self.index = json.load(index_handle)['frames']
+
+	def shard(self, shard) -> np.memmap:
+		if shard not in self.shards:
+			self.shards[shard] = np.memmap(self.shard_bin(shard), dtype=np.uint8, mode='c')
+		return self.shards[shard]
+
+	def get(self, image_path) -> np.ndarray:
+		"""
+		Memory mapped frame of image_path, None if it is not in the dataset
+		"""
+		self.open()
+		entry = self.index.get(os.path.relpath(os.path.abspath(image_path), self.dataset_dir))
+		if entry is None:
+			return None
+		shard, offset, shape = entry
+		size = int(np.prod(shape))
+		return self.shard(shard)[offset:offset+size].reshape(shape)
+
+	def __len__(self):
+		self.open()
+		return len(self.index)
+
+
+def decode_frame(image_path) -> np.ndarray:
+	# Unreadable images are left out of the cache, read_frame falls back to cv2.imread for them
+	image = cv2.imread(image_path)
+	if image is None:
+		return np.empty(0, dtype=np.uint8)
+	return image
+
+global frame_caches
+# dataset_dir -> frame_cache of its current fingerprint
+frame_caches = {}
+
+def get_frame_cache(dataset_dir) -> frame_cache:
+	global frame_caches
+	dataset_dir = os.path.abspath(dataset_dir)
+	cache = frame_caches.get(dataset_dir)
+	# Called for every frame, the dataset is walked at most every FRAME_CACHE_FINGERPRINT_AGE seconds
+	if cache is None or cache.fingerprint != dataset_fingerprint(dataset_dir, max_age=FRAME_CACHE_FINGERPRINT_AGE):
+		cache = frame_cache(dataset_dir)
+		frame_caches[dataset_dir] = cache
+	return cache
+
+def read_frame(image_path):
+	"""
+	cv2.imread(image_path), served from the frame cache when FRAME_CACHE is enabled
+	"""
+	if not FRAME_CACHE:
+		return cv2.imread(image_path)
+	dataset_dir = dataset_root(image_path)
+	if dataset_dir is None:
+		return cv2.imread(image_path)
+	frame = get_frame_cache(dataset_dir).get(image_path)
+	if frame is None:
+		return cv2.imread(image_path)
+	return frame
+
+
+if __name__ == "__main__":
+	# Prebuild: python -m ML_Ops_Pipeline.frame_cache <dataset_dir> ...
+	for dataset_dir in sys.argv[1:]:
+		cache = frame_cache(dataset_dir)
+		cache.build()
+		print(dataset_dir, len(cache), "frames")
@@ -1,63 +1,252 @@
+"""
+history
+
+Persistent key value stores and the task state journal, kept in a single
+SQLite database under HISTORY_PATH. The database runs in WAL mode so the
+scheduler and its worker processes can read and write it concurrently.
+Histories written by older versions as <name>.pkl are imported on first use.
+"""
+
 import os
+import time
 import pickle
+import sqlite3
+from contextlib import contextmanager
 from datetime import datetime
 from .constants import HISTORY_PATH
 
+HISTORY_DB = os.path.join(HISTORY_PATH, "history.db")
+
+QUEUED = "QUEUED"
+RUNNING = "RUNNING"
+DONE = "DONE"
+FAILED = "FAILED"
+SKIPPED = "SKIPPED"
+
+global connections
+connections = {}
+
+def connect(db_path=HISTORY_DB) -> sqlite3.Connection:
+	"""
+	One connection per database and process, connections do not survive a fork
+	"""
+	global connections
+	key = (db_path, os.getpid())
+	if key not in connections:
+		os.makedirs(os.path.dirname(db_path), exist_ok=True)
+		connection = sqlite3.connect(db_path, timeout=60, isolation_level=None)
+		connection.execute("PRAGMA journal_mode=WAL")
+		connection.execute("PRAGMA synchronous=NORMAL")
+		connection.execute("CREATE TABLE IF NOT EXISTS history (name TEXT NOT NULL, key TEXT NOT NULL, value BLOB, PRIMARY KEY (name, key))")
+		connection.execute("CREATE TABLE IF NOT EXISTS task_state (task_id TEXT PRIMARY KEY, state TEXT NOT NULL, pid INTEGER, updated REAL)")
+		connection.execute("CREATE INDEX IF NOT EXISTS task_state_state ON task_state (state)")
+		connections[key] = connection
+	return connections[key]
+
+def chunks(items, size=500):
+	# SQLite limits the number of bound parameters per statement
+	items = list(items)
+	for i in range(0, len(items), size):
+		yield items[i:i+size]
+
+
 class local_history(dict):
 
-	def __init__(self, name) -> None:
+	def __init__(self, name, db_path=HISTORY_DB) -> None:
 		self.name = name.split("/")[-1]
 		os.makedirs(HISTORY_PATH, exist_ok=True)
+		self.db_path = db_path
 		self.local_history_pkl = os.path.join(HISTORY_PATH, self.name + ".pkl")
-		self.load()
-
+		self.batch_depth = 0
+		self.migrate()
+
+	@property
+	def connection(self) -> sqlite3.Connection:
+		return connect(self.db_path)
+
+	def migrate(self) -> None:
+		if not os.path.exists(self.local_history_pkl):
+			return
+		local_history_handle = open(self.local_history_pkl, 'rb')
+		old_history = pickle.load(local_history_handle)
+		local_history_handle.close()
+		print("Migrating", self.local_history_pkl, "to", self.db_path)
+		with self.batch():
+			for key in old_history:
+				if not self.has_key(key):
+					self[key] = old_history[key]
+		os.replace(self.local_history_pkl, self.local_history_pkl + ".migrated")
+
+	@contextmanager
+	def batch(self):
+		"""
+		Groups every write inside the with block into a single transaction
+		"""
+		if self.batch_depth == 0:
+			self.connection.execute("BEGIN IMMEDIATE")
+		self.batch_depth += 1
+		try:
+			yield self
+		except BaseException:
+			self.batch_depth -= 1
+			if self.batch_depth == 0:
+				self.connection.execute("ROLLBACK")
+			raise
+		self.batch_depth -= 1
+		if self.batch_depth == 0:
+			self.connection.execute("COMMIT")
 
 	def load(self) -> object:
-		if os.path.exists(self.local_history_pkl):
-			local_history_handle = open(self.local_history_pkl, 'rb')
-			self.dict = pickle.load(local_history_handle)
-			local_history_handle.close()
-		else:
-			self.dict = {}
+		# Reads always go to the database, kept for compatibility
+		pass
 
 	def store(self) -> object:
-		local_history_handle = open(self.local_history_pkl, 'wb')
-		pickle.dump(self.dict, local_history_handle, protocol=pickle.HIGHEST_PROTOCOL)
-		local_history_handle.close()
+		# Writes are committed as they happen, kept for compatibility
+		pass
 
 	def __setitem__(self, key, item):
-		self.dict[key] = item
-		self.store()
+		assert type(key) == str, "History keys must be strings: " + repr(key)
+		self.connection.execute(
+			"INSERT OR REPLACE INTO history (name, key, value) VALUES (?, ?, ?)",
+			(self.name, key, pickle.dumps(item, protocol=pickle.HIGHEST_PROTOCOL))
+		)
 
 	def __getitem__(self, key):
-		self.load()
-		if not self.has_key(key):
-			self.__setitem__(key, datetime.fromtimestamp(0))
-		return self.dict[key]
+		# Missing keys read as the epoch without being written
+		return self.get(key, datetime.fromtimestamp(0))
+
+	def __contains__(self, key):
+		return self.has_key(key)
+
+	def __iter__(self):
+		return iter(self.keys())
 
 	def __repr__(self):
-		return repr(self.dict)
+		return repr(self.copy())
 
 	def __len__(self):
-		return len(self.dict)
+		return self.connection.execute("SELECT COUNT(*) FROM history WHERE name=?", (self.name,)).fetchone()[0]
 
 	def __delitem__(self, key):
-		del self.dict[key]
+		cursor = self.connection.execute("DELETE FROM history WHERE name=? AND key=?", (self.name, key))
+		if cursor.rowcount == 0:
+			raise KeyError(key)
 
 	def clear(self):
-		return self.dict.clear()
+		self.connection.execute("DELETE FROM history WHERE name=?", (self.name,))
 
 	def copy(self):
-		return self.dict.copy()
+		return dict(self.items())
 
 	def has_key(self, k):
-		return k in self.dict
+		return self.connection.execute("SELECT 1 FROM history WHERE name=? AND key=?", (self.name, k)).fetchone() is not None
+
+	def get(self, key, default=None):
+		row = self.connection.execute("SELECT value FROM history WHERE name=? AND key=?", (self.name, key)).fetchone()
+		if row is None:
+			return default
+		return pickle.loads(row[0])
+
+	def get_many(self, keys) -> dict:
+		"""
+		Returns {key: value} for the keys that exist, in as few queries as possible
+		"""
+		values = {}
+		for keys_chunk in chunks(keys):
+			rows = self.connection.execute(
+				"SELECT key, value FROM history WHERE name=? AND key IN (" + ",".join("?"*len(keys_chunk)) + ")",
+				[self.name] + keys_chunk
+			)
+			for key, value in rows:
+				values[key] = pickle.loads(value)
+		return values
 
 	def update(self, *args, **kwargs):
-		return self.dict.update(*args, **kwargs)
+		with self.batch():
+			for key, item in dict(*args, **kwargs).items():
+				self[key] = item
 
 	def keys(self):
-		return self.dict.keys()
+		return [row[0] for row in self.connection.execute("SELECT key FROM history WHERE name=?", (self.name,))]
 
 	def values(self):
-		return self.dict.values()
+		return [pickle.loads(row[0]) for row in self.connection.execute("SELECT value FROM history WHERE name=?", (self.name,))]
+
+	def items(self):
+		return [(key, pickle.loads(value)) for key, value in self.connection.execute("SELECT key, value FROM history WHERE name=?", (self.name,))]
+
+
+def pid_alive(pid) -> bool:
+	try:
+		os.kill(pid, 0)
+	except ProcessLookupError:
+		return False
+	except PermissionError:
+		pass
+	return True
+
+class task_journal:
+	"""
+	Durable record of QUEUED -> RUNNING -> DONE | FAILED (or SKIPPED) for every task
+	so a crashed or killed run can be told apart from one that finished
+	"""
+
+	def __init__(self, db_path=HISTORY_DB) -> None:
+		self.db_path = db_path
+
+	@property
+	def connection(self) -> sqlite3.Connection:
+		return connect(self.db_path)
+
+	def set_state(self, task_ids, state) -> None:
+		if type(task_ids) == str:
+			task_ids = [task_ids]
+		now = time.time()
+		connection = self.connection
+		connection.execute("BEGIN IMMEDIATE")
+		try:
+			connection.executemany(
+				"INSERT OR REPLACE INTO task_state (task_id, state, pid, updated) VALUES (?, ?, ?, ?)",
+				[(task_id, state, os.getpid(), now) for task_id in task_ids]
+			)
+		except BaseException:
+			connection.execute("ROLLBACK")
+			raise
+		connection.execute("COMMIT")
+
+	def state(self, task_id) -> str:
+		row = self.connection.execute("SELECT state FROM task_state WHERE task_id=?", (task_id,)).fetchone()
+		if row is None:
+			return None
+		return row[0]
+
+	def states(self, state=None) -> dict:
+		if state is None:
+			rows = self.connection.execute("SELECT task_id, state FROM task_state")
+		else:
+			rows = self.connection.execute("SELECT task_id, state FROM task_state WHERE state=?", (state,))
+		return {task_id: task_state for task_id, task_state in rows}
+
+	def abort(self, task_ids) -> list:
+		"""
+		Marks the task_ids still QUEUED or RUNNING as FAILED, for a run that ended without finishing them
+		Returns the aborted task_ids
+		"""
+		states = self.states()
+		aborted = [task_id for task_id in task_ids if states.get(task_id) in (QUEUED, RUNNING)]
+		if aborted:
+			print("Aborted", len(aborted), "unfinished tasks")
+			self.set_state(aborted, FAILED)
+		return aborted
+
+	def recover(self) -> list:
+		"""
+		Marks tasks left QUEUED or RUNNING by a process that no longer exists as FAILED
+		Returns the recovered task_ids
+		"""
+		rows = self.connection.execute("SELECT task_id, pid FROM task_state WHERE state IN (?, ?)", (QUEUED, RUNNING)).fetchall()
+		interrupted = [task_id for task_id, pid in rows if not pid_alive(pid)]
+		if interrupted:
+			print("Recovered", len(interrupted), "interrupted tasks")
+			self.set_state(interrupted, FAILED)
+		return interrupted
@@ -0,0 +1,138 @@
+"""
+image_loader
+
+Decodes images on a thread pool ahead of the prediction loop consuming them,
+so reading from (network) disks overlaps with inference instead of alternating
+with it. OpenCV releases the GIL while decoding, so threads are enough.
+
+	for image_path, image in image_loader(image_paths):
+		...
+
+Images come back in the order of the paths. batches() stacks them into a
+preallocated array reused from batch to batch, and image_shape() reads the
+size of an image from its header without decoding it. inference.batched_predict
+goes through batches() for models that name the image of each item, see
+pipeline_model.item_image.
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from .constants import IMAGE_LOADER_WORKERS, IMAGE_LOADER_PREFETCH
+from .frame_cache import read_frame
+
+def image_shape(image_path) -> tuple:
+	"""
+	(height, width, channels) of the image as cv2.imread would decode it, read from the header
+	"""
+	with Image.open(image_path) as image:
+		width, height = image.size
+		channels = len(image.getbands())
+	if channels == 1:
+		return (height, width)
+	# imread drops alpha and decodes colour images as 3 channel BGR
+	return (height, width, 3)
+
+
+class image_loader:
+
+	def __init__(self, paths, read=read_frame, workers=IMAGE_LOADER_WORKERS, prefetch=IMAGE_LOADER_PREFETCH) -> None:
+		assert prefetch > 0, "prefetch must be positive"
+		self.paths = list(paths)
+		self.read = read
+		self.workers = workers
+		self.prefetch = prefetch
+		self.shapes = {}
+		self.batch_buffers = [None, None]
+
+	def __len__(self):
+		return len(self.paths)
+
+	def load(self, image_path):
+		image = self.read(image_path)
+		assert image is not None, "Could not read image " + str(image_path)
+		if isinstance(image, np.ndarray):
+			self.shapes[image_path] = image.shape
+		return image
+
+	def shape(self, image_path) -> tuple:
+		if image_path not in self.shapes:
+			self.shapes[image_path] = image_shape(image_path)
+		return self.shapes[image_path]
+
+	def iter_loaded(self, load):
+		# Runs load over self.paths, at most self.prefetch ahead of the consumer
+		with ThreadPoolExecutor(max_workers=self.workers) as executor:
+			pending = deque()
+			paths = iter(enumerate(self.paths))
+			try:
+				for i, image_path in paths:
+					pending.append((image_path, executor.submit(load, i, image_path)))
+					if len(pending) >= self.prefetch:
+						break
+				while pending:
+					image_path, future = pending.popleft()
+					for i, next_path in paths:
+						pending.append((next_path, executor.submit(load, i, next_path)))
+						break
+					yield image_path, future.result()
+			finally:
+				# The consumer stopped early
+				for image_path, future in pending:
+					future.cancel()
+
+	def __iter__(self):
+		return self.iter_loaded(lambda i, image_path: self.load(image_path))
+
+	def images(self) -> list:
+		return [image for image_path, image in self]
+
+	def buffer(self, slot, shape) -> np.ndarray:
+		if self.batch_buffers[slot] is None or self.batch_buffers[slot].shape != shape:
+			self.batch_buffers[slot] = np.empty(shape, dtype=np.uint8)
+		return self.batch_buffers[slot]
+
+	def batches(self, batch_size):
+		"""
+		Yields (paths, images) with the images of a batch stacked into one (n, height, width, ...) array
+		batch_size is a number of images or [(start, stop), ...] over the paths, as from inference.batch_bounds
+		The next batch is decoded while the current one is used, into the other of two
+		preallocated arrays, so a batch is only valid until the next one is requested
+		Batches of images with different shapes are yielded as lists instead
+		Shapes come from image_shape, images read with another shape turn their batch into a list
+		"""
+		if isinstance(batch_size, int):
+			bounds = [(start, min(start + batch_size, len(self.paths))) for start in range(0, len(self.paths), batch_size)]
+		else:
+			bounds = list(batch_size)
+		largest = max([stop - start for start, stop in bounds], default=0)
+		with ThreadPoolExecutor(max_workers=self.workers) as executor:
+			def submit(k):
+				batch_paths = self.paths[bounds[k][0]:bounds[k][1]]
+				shapes = set(self.shape(image_path) for image_path in batch_paths)
+				if len(shapes) != 1:
+					return batch_paths, None, [executor.submit(self.load, image_path) for image_path in batch_paths]
+				batch = self.buffer(k % 2, (largest,) + shapes.pop())[:len(batch_paths)]
+				def load_into(i, image_path):
+					# The image itself when it does not fit the batch
+					image = self.load(image_path)
+					if not isinstance(image, np.ndarray) or image.shape != batch.shape[1:]:
+						return image
+					batch[i] = image
+					return None
+				return batch_paths, batch, [executor.submit(load_into, i, image_path) for i, image_path in enumerate(batch_paths)]
+
+			pending = submit(0) if len(bounds) else None
+			for k in range(len(bounds)):
+				batch_paths, batch, futures = pending
+				pending = submit(k+1) if k+1 < len(bounds) else None
+				images = [future.result() for future in futures]
+				if batch is None:
+					yield batch_paths, images
+				elif all(image is None for image in images):
+					yield batch_paths, batch
+				else:
+					yield batch_paths, [batch[i] if image is None else image for i, image in enumerate(images)]
@@ -0,0 +1,152 @@
+"""
+inference
+
+Batched inference driver for pipeline_model.predict. Models that implement
+predict_batch(x_batch) get x split into consecutive batches, bounded by
+item count (inference_batch_size) and optionally by an input memory budget
+(inference_batch_memory), and the per batch predictions joined back in order.
+Models that name the image of each item (item_image) get the images of a
+batch decoded by image_loader while the previous batch is predicted.
+"""
+
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+from .pipeline_input import slice_items, concat_items, take_items
+from .image_loader import image_loader
+from .prediction_cache import get_prediction_cache, caches_predictions, item_key, model_key
+from .tracing import span
+
+def item_memory(item) -> int:
+	"""
+	Rough input size of one item in bytes, image paths count as their file size
+	"""
+	if isinstance(item, np.ndarray):
+		return item.nbytes
+	if isinstance(item, str):
+		if os.path.isfile(item):
+			return os.path.getsize(item)
+		return len(item)
+	if isinstance(item, pd.Series):
+		return sum(item_memory(value) for value in item.values)
+	if isinstance(item, (list, tuple)):
+		return sum(item_memory(value) for value in item)
+	return sys.getsizeof(item)
+
+def iter_items(x):
+	if isinstance(x, pd.DataFrame):
+		for index, row in x.iterrows():
+			yield row
+	else:
+		for item in x:
+			yield item
+
+def batch_bounds(x, batch_size, batch_memory=None, item_memory=item_memory) -> list:
+	"""
+	[(start, stop), ...] covering x in order, every batch has at most batch_size items
+	and at most batch_memory bytes unless a single item is larger than that
+	"""
+	assert batch_size is None or batch_size > 0, "batch_size must be positive"
+	n = len(x)
+	if batch_size is None:
+		batch_size = max(n, 1)
+	if batch_memory is None:
+		return [(start, min(start + batch_size, n)) for start in range(0, n, batch_size)]
+
+	bounds = []
+	start = 0
+	memory = 0
+	for i, item in enumerate(iter_items(x)):
+		size = item_memory(item)
+		if i > start and (i - start >= batch_size or memory + size > batch_memory):
+			bounds.append((start, i))
+			start = i
+			memory = 0
+		memory += size
+	if start < n:
+		bounds.append((start, n))
+	return bounds
+
+def join_predictions(predictions: list):
+	if len(predictions) and all(isinstance(batch_predictions, pd.DataFrame) for batch_predictions in predictions):
+		return pd.concat(predictions, ignore_index=True)
+	return concat_items(predictions)
+
+def predict_batches(mod, x, bounds):
+	"""
+	Yields mod.predict_batch of every (start, stop) of bounds over x in order
+	Images of models with item_image are decoded one batch ahead of the one predicted
+	"""
+	if not mod.has_item_image():
+		for start, stop in bounds:
+			yield mod.predict_batch(slice_items(x, start, stop))
+		return
+	image_paths = [mod.item_image(item) for item in iter_items(x)]
+	loader = image_loader(image_paths, read=mod.read_image)
+	for (start, stop), (batch_paths, images) in zip(bounds, loader.batches(bounds)):
+		# images is reused two batches later, predict_batch must not keep it
+		yield mod.predict_batch(slice_items(x, start, stop), images)
+
+def batched_predict(mod, x, batch_size=None, batch_memory=None, cache=None):
+	"""
+	Runs mod.predict_batch over consecutive batches of x, returns the joined predictions
+	batch_size and batch_memory default to the model's inference_batch_size and inference_batch_memory
+	cache defaults to the prediction_cache of this process when the model caches its predictions, see caches_predictions, False skips it
+	"""
+	if batch_size is None:
+		batch_size = mod.inference_batch_size
+	if batch_memory is None:
+		batch_memory = mod.inference_batch_memory
+	if len(x) == 0:
+		return mod.predict_batch(x)
+	if cache is None and caches_predictions(mod):
+		cache = get_prediction_cache()
+	if cache:
+		return cached_predict(mod, x, batch_size, batch_memory, cache)
+	with span("predict", items=len(x)):
+		bounds = batch_bounds(x, batch_size, batch_memory, mod.item_memory)
+		return join_predictions(list(predict_batches(mod, x, bounds)))
+
+def cached_predict(mod, x, batch_size, batch_memory, cache):
+	"""
+	batched_predict of the items of x that cache has no prediction of this model for
+	"""
+	items = list(iter_items(x))
+	with span("prediction_cache_lookup", items=len(items)):
+		keys = [item_key(item) for item in items]
+		model = model_key(mod)
+		cached = cache.get_many(model, [key for key in keys if key is not None])
+	item_predictions = [None] * len(items)
+	missing = []
+	for i, key in enumerate(keys):
+		if key in cached:
+			item_predictions[i] = mod.reuse_prediction(items[i], cached[key])
+		else:
+			missing.append(i)
+	print("Prediction cache:", len(items) - len(missing), "of", len(items), "items cached")
+	if len(missing) == 0:
+		return join_predictions(item_predictions)
+
+	x_missing = x if len(missing) == len(items) else take_items(x, missing)
+	bounds = batch_bounds(x_missing, batch_size, batch_memory, mod.item_memory)
+	with span("predict", items=len(missing)):
+		batches = predict_batches(mod, x_missing, bounds)
+		for (start, stop), batch_predictions in zip(bounds, batches):
+			x_batch = slice_items(x_missing, start, stop)
+			split = mod.split_predictions(x_batch, batch_predictions)
+			if split is None:
+				# Not one entry per item, nothing of this model can be cached
+				if len(missing) < len(items):
+					batches.close()
+					return batched_predict(mod, x, batch_size, batch_memory, cache=False)
+				return join_predictions([batch_predictions] + list(batches))
+			assert len(split) == stop - start, "split_predictions returned " + str(len(split)) + " entries for " + str(stop - start) + " items"
+			entries = []
+			for i, prediction in zip(missing[start:stop], split):
+				item_predictions[i] = prediction
+				if keys[i] is not None:
+					entries.append((keys[i], prediction))
+			cache.put_many(model, entries)
+	return join_predictions(item_predictions)
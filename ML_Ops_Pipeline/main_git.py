@@ -14,163 +14,153 @@ from datetime import datetime
 #import multiprocessing
 
 import json
-import mlflow
 
-from .all_pipelines_git import get_all_inputs
-from .pipeline_input import source_hash
-from .constants import DATASET_DIR, ENSEMBLE_TRAINING, MODEL_TRAINING, MLFLOW_DIR
-from .history import local_history
+from .pipeline_manifest import get_all_manifests
+from .constants import ENSEMBLE_TRAINING, ENSEMBLE_TESTING, MODEL_TRAINING, MODEL_TESTING, MLFLOW_DIR, COMBINED_MODEL_TASKS
+from .history import local_history, task_journal, QUEUED, RUNNING, DONE, FAILED, SKIPPED
+from .planner import task_planner
+from .tracking import get_tracker
+from .artifact_uploader import wait_for_uploads
+from .tracing import span, start_trace, stop_trace, trace_path
 
 import traceback
 
 from .model_utils.model_training import train_model
 from .model_utils.model_analysis import analyze_model
+from .model_utils.model_train_and_analyze import train_test_model
 
 from .ensemble_utils.ensemble_training import train_ensemble
 from .ensemble_utils.ensemble_analysis import analyze_ensemble
-# from model_visualizer_loop import vi
-
-def main(disable_torch_multiprocessing=False):
-	loc_hist = local_history(__file__)
-	task_list = {}
-	all_inputs = get_all_inputs()
-
-	for pipeline_name in all_inputs:
-		all_dataset_dir = DATASET_DIR.format(pipeline_name=pipeline_name)
-		interpreters = all_inputs[pipeline_name]['pipeline'].get_pipeline_dataset_interpreter()
-		for interpreter_name in interpreters:
-			interpreter_dataset_dir = os.path.join(all_dataset_dir, interpreter_name)
-			interpreter_datasets = glob.glob(os.path.join(interpreter_dataset_dir,"*"))
-			for dataset_dir in interpreter_datasets:
-				
-				model_classes = all_inputs[pipeline_name]['pipeline'].get_pipeline_model()
-				for model_name in model_classes:
-					
-					model_file_path = inspect.getfile(model_classes[model_name])
-					#model_last_modified = str(datetime.fromtimestamp(os.path.getmtime(model_file_path)))
-					model_last_source_hash = str(source_hash(model_classes[model_name]))
-					git_data = all_inputs[pipeline_name]['git_data']
-					model_last_modified = git_data.hexsha
-					task_id = model_name + ":"+ interpreter_name + ":" + dataset_dir
-					task_id_source_hash = task_id + ":model_last_source_hash" 
-					
-					if loc_hist[task_id] != model_last_modified and loc_hist[task_id_source_hash]!=model_last_source_hash:
-						task_list.setdefault(pipeline_name, {})
-						task_list[pipeline_name].setdefault(interpreter_name, {})
-						task_list[pipeline_name][interpreter_name].setdefault(dataset_dir, {})
-						task_list[pipeline_name][interpreter_name][dataset_dir].setdefault('model', {})
-						task_list[pipeline_name][interpreter_name][dataset_dir]['model'].setdefault(model_name, (task_id, model_last_modified, task_id_source_hash, model_last_source_hash))
-
-				ensemble_classes = all_inputs[pipeline_name]['pipeline'].get_pipeline_ensemble()
-				for ensemble_name in ensemble_classes:
-					
-					ensemble_file_path = inspect.getfile(ensemble_classes[ensemble_name])
-					#ensemble_last_modified = str(datetime.fromtimestamp(os.path.getmtime(ensemble_file_path)))
-					ensemble_last_source_hash = str(source_hash(ensemble_classes[ensemble_name]))
-					git_data = all_inputs[pipeline_name]['git_data']
-					ensemble_last_modified = git_data.hexsha
-					task_id = ensemble_name + ":"+ interpreter_name + ":" + dataset_dir
-					task_id_source_hash = task_id + ":ensemble_last_source_hash" 
-					
-					if loc_hist[task_id] != ensemble_last_modified and loc_hist[task_id_source_hash]!=ensemble_last_source_hash:
-					#if True:
-						task_list.setdefault(pipeline_name, {})
-						task_list[pipeline_name].setdefault(interpreter_name, {})
-						task_list[pipeline_name][interpreter_name].setdefault(dataset_dir, {})
-						task_list[pipeline_name][interpreter_name][dataset_dir].setdefault('ensemble', {})
-						task_list[pipeline_name][interpreter_name][dataset_dir]['ensemble'].setdefault(ensemble_name, (task_id, ensemble_last_modified, task_id_source_hash, ensemble_last_source_hash))
-
-	if task_list == {}:
+from .model_utils.model_visualizer_loop import visualize_model_task
+from .scheduler import task_graph
+
+def stage_call(task, pipeline) -> tuple:
+	"""
+	(stage function, args) running the planned task with the classes of pipeline
+	"""
+	interpreters = pipeline.get_pipeline_dataset_interpreter()
+	model_classes = pipeline.get_pipeline_model()
+	visualizers = pipeline.get_pipeline_visualizer()
+	task_id = task.artifact_key()
+
+	if task.stage in ('train', 'analyze'):
+		model_dir = (MODEL_TRAINING if task.stage=='train' else MODEL_TESTING).format(
+			pipeline_name=task.pipeline_name,
+			interpreter_name=task.interpreter_name,
+			model_name=task.name,
+			commit_id=task.commit_id
+		)
+		os.makedirs(model_dir, exist_ok=True)
+		stage_func = train_model if task.stage=='train' else analyze_model
+		# Visualizers are scheduled as their own nodes
+		return stage_func, (task.pipeline_name, task.name, task.interpreter_name, task.dataset_dir, model_classes, interpreters, task_id, task.commit_id, task_id + ":digest", task.digest, {})
+
+	if task.stage == 'visualize':
+		return visualize_model_task, (task.pipeline_name, task.name, task.interpreter_name, task.dataset_dir, interpreters, task_id, task.commit_id, visualizers, task.visualizer_name, task.mode)
+
+	ensemble_classes = pipeline.get_pipeline_ensemble()
+	ensemble_dir = (ENSEMBLE_TRAINING if task.stage=='ensemble_train' else ENSEMBLE_TESTING).format(
+		pipeline_name=task.pipeline_name,
+		interpreter_name=task.interpreter_name,
+		ensemble_name=task.name,
+		commit_id=task.commit_id
+	)
+	os.makedirs(ensemble_dir, exist_ok=True)
+	stage_func = train_ensemble if task.stage=='ensemble_train' else analyze_ensemble
+	return stage_func, (task.pipeline_name, task.name, task.interpreter_name, task.dataset_dir, model_classes, interpreters, task_id, task.commit_id, task_id + ":digest", task.digest, ensemble_classes, visualizers, task.model_commit_ids)
+
+def run_tasks(disable_torch_multiprocessing=False, workers=2, combine_train_test=COMBINED_MODEL_TASKS):
+	manifest = local_history("artifact_manifest")
+	journal = task_journal()
+	journal.recover()
+	planner = task_planner(manifest)
+	# Pipelines are only imported by the workers running their tasks
+	all_inputs = get_all_manifests()
+	with span("plan"):
+		planned = planner.plan(all_inputs)
+
+	task_list = [task for task in planned.values() if task.stale and not task.blocked]
+	if task_list == []:
 		print("Waiting for new tasks...")
 		return
 
 	print("-"*10)
-	print("Task list:\n", json.dumps(task_list, sort_keys=True, indent=4))
+	print("Task list:")
+	for task in task_list:
+		print("\t", task.artifact_key(), "->", task.commit_id)
+	print("Up to date:", len([task for task in planned.values() if not task.stale]))
 	print("-"*10)
 
-	pool_args = []
-	pool_args_ensemble = []
-
-	for pipeline_name in task_list:
-		all_dataset_dir = DATASET_DIR.format(pipeline_name=pipeline_name)
-		interpreters = all_inputs[pipeline_name]['pipeline'].get_pipeline_dataset_interpreter()
-		for interpreter_name in task_list[pipeline_name].keys():
-			interpreter_dataset_dir = os.path.join(all_dataset_dir, interpreter_name)
-			interpreter_datasets = task_list[pipeline_name][interpreter_name].keys()
-			for dataset_dir in interpreter_datasets:
-				models_ensembles = task_list[pipeline_name][interpreter_name][dataset_dir]
-				models_ensembles.setdefault('model', {})
-				models_ensembles.setdefault('ensemble', {})
-
-				#dat = interpreters[interpreter_name](dataset_dir).get_dataset()
-				model_classes = all_inputs[pipeline_name]['pipeline'].get_pipeline_model()
-				for model_name in models_ensembles['model'].keys():
-					task_id, model_last_modified, task_id_source_hash, model_last_source_hash = models_ensembles['model'][model_name]
-					training_dir = MODEL_TRAINING.format(
-						pipeline_name=pipeline_name,
-						interpreter_name=interpreter_name,
-						model_name=model_name,
-						commit_id=model_last_modified
-					)
-					os.makedirs(training_dir, exist_ok=True)
-					visualizers = all_inputs[pipeline_name]['pipeline'].get_pipeline_visualizer()
-					if loc_hist[task_id] != model_last_modified:
-						pool_args.append((pipeline_name, model_name, interpreter_name, dataset_dir, model_classes, interpreters, task_id, model_last_modified, task_id_source_hash, model_last_source_hash, visualizers))
-				
-				ensemble_classes = all_inputs[pipeline_name]['pipeline'].get_pipeline_ensemble()
-				print(models_ensembles['ensemble'])
-				for ensemble_name in models_ensembles['ensemble'].keys():
-					#task_id, ensemble_last_modified, task_id_source_hash, ensemble_last_source_hash = models_ensembles['ensemble'][ensemble_name]
-					task_id, ensemble_last_modified, task_id_source_hash, ensemble_last_source_hash = models_ensembles['ensemble'][ensemble_name]
-					task_id += ":" + ensemble_name
-					ensemble_training_dir = ENSEMBLE_TRAINING.format(
-						pipeline_name=pipeline_name,
-						interpreter_name=interpreter_name,
-						ensemble_name=ensemble_name,
-						commit_id=ensemble_last_modified
-					)
-					os.makedirs(ensemble_training_dir, exist_ok=True)
-					#if loc_hist[task_id] != ensemble_last_modified:
-					pool_args_ensemble.append((pipeline_name, ensemble_name, interpreter_name, dataset_dir, model_classes, interpreters, task_id, ensemble_last_modified, task_id_source_hash, ensemble_last_source_hash, ensemble_classes))
-
-	print(pool_args_ensemble)
+	graph = task_graph()
+
+	def record_start(node):
+		journal.set_state(planned[node.node_id].artifact_key(), RUNNING)
+
+	def record_manifest(node, result):
+		status = result is not None and result[0]
+		planner.record(planned[node.node_id], status)
+		journal.set_state(planned[node.node_id].artifact_key(), DONE if status else FAILED)
+
 	if disable_torch_multiprocessing:
-		for (pipeline_name, model_name, interpreter_name, dataset_dir, model_classes, interpreters, task_id, model_last_modified, task_id_source_hash, model_last_source_hash, visualizers) in pool_args:
-			status, task_id1, model_last_modified, task_id_source_hash1, model_last_source_hash = train_model(pipeline_name, model_name, interpreter_name, dataset_dir, model_classes, interpreters, task_id, model_last_modified, task_id_source_hash, model_last_source_hash, visualizers)
-			loc_hist[task_id1] = model_last_modified
-			loc_hist[task_id_source_hash1] = model_last_source_hash
-
-			if status:
-				status, task_id2, model_last_modified, task_id_source_hash2, model_last_source_hash = analyze_model(pipeline_name, model_name, interpreter_name, dataset_dir, model_classes, interpreters, task_id, model_last_modified, task_id_source_hash, model_last_source_hash, visualizers)
-				loc_hist[task_id2] = model_last_modified
-				loc_hist[task_id_source_hash2] = model_last_source_hash
-
-		for (pipeline_name, ensemble_name, interpreter_name, dataset_dir, model_classes, interpreters, task_id, ensemble_last_modified, task_id_source_hash, ensemble_last_source_hash, ensemble_classes) in pool_args_ensemble:
-			visualizers = all_inputs[pipeline_name]['pipeline'].get_pipeline_visualizer()
-			status, task_id1, ensemble_last_modified, task_id_source_hash1, ensemble_last_source_hash = train_ensemble(pipeline_name, ensemble_name, interpreter_name, dataset_dir, model_classes, interpreters, task_id, ensemble_last_modified, task_id_source_hash, ensemble_last_source_hash, ensemble_classes, visualizers)
-			loc_hist[task_id1] = ensemble_last_modified
-			loc_hist[task_id_source_hash1] = ensemble_last_source_hash
-			if status:
-				status, task_id2, ensemble_last_modified, task_id_source_hash2, ensemble_last_source_hash = analyze_ensemble(pipeline_name, ensemble_name, interpreter_name, dataset_dir, model_classes, interpreters, task_id, ensemble_last_modified, task_id_source_hash, ensemble_last_source_hash, ensemble_classes, visualizers)
-				loc_hist[task_id2] = ensemble_last_modified
-				loc_hist[task_id_source_hash2] = ensemble_last_source_hash
-	else:
-		#with torch.multiprocessing.Pool(torch.multiprocessing.cpu_count()) as p:
-		with torch.multiprocessing.Pool(2) as p:
-			res1 = p.starmap(train_model, pool_args)
-			res2 = p.starmap(analyze_model, pool_args)
-
-			for status, task_id, model_last_modified in res1:
-				loc_hist[task_id] = model_last_modified
-			for status, task_id, model_last_modified in res2:
-				loc_hist[task_id] = model_last_modified
-
-			res1 = p.starmap(train_model, pool_args_ensemble)
-			res2 = p.starmap(analyze_model, pool_args_ensemble)
-			for status, task_id, model_last_modified in res1:
-				loc_hist[task_id] = model_last_modified
-			for status, task_id, model_last_modified in res2:
-				loc_hist[task_id] = model_last_modified
+		workers = 0
+
+	for task in task_list:
+		pipeline = all_inputs[task.pipeline_name]['pipeline']
+		if workers <= 0:
+			# Tasks run in this process, so they need the real classes
+			pipeline = pipeline.load()
+		deps = [dep for dep in task.deps if planned[dep].stale]
+		stage_func, stage_args = stage_call(task, pipeline)
+
+		if task.stage in ('train', 'analyze'):
+			# Keep a model on the worker that already has it loaded
+			graph.add_task(task.node_id, stage_func, stage_args, deps=deps, on_start=record_start, on_done=record_manifest, affinity=(task.pipeline_name, task.name))
+
+		elif task.stage == 'visualize':
+			after = []
+			if task.mode == 'test':
+				# Both modes write to the same visual_dir, so they must not overlap
+				visualize_train_id = task.node_id[:-1] + ('train',)
+				if visualize_train_id in planned and planned[visualize_train_id].stale and not planned[visualize_train_id].blocked:
+					after.append(visualize_train_id)
+			graph.add_task(task.node_id, stage_func, stage_args, deps=deps, after=after, on_start=record_start, on_done=record_manifest)
+
+		else:
+			graph.add_task(task.node_id, stage_func, stage_args, deps=deps, on_start=record_start, on_done=record_manifest)
+
+	if combine_train_test:
+		# Train and analyze of a model that both have to run share one load of the model and dataset
+		for task in task_list:
+			analyze_id = ('analyze',) + task.node_id[1:]
+			if task.stage == 'train' and analyze_id in graph:
+				graph.add_group(('train_test',) + task.node_id[1:], train_test_model, (graph.nodes[task.node_id].args, graph.nodes[analyze_id].args), members=[task.node_id, analyze_id], affinity=(task.pipeline_name, task.name))
+
+	# Create experiments up front so that workers don't race to create them
+	tracker = get_tracker()
+	for pipeline_name in set(task.pipeline_name for task in task_list):
+		tracker.experiment_id(pipeline_name)
+
+	print("Running", len(graph), "tasks on", workers, "workers")
+	task_ids = [task.artifact_key() for task in task_list]
+	journal.set_state(task_ids, QUEUED)
+	try:
+		with span("schedule", tasks=len(graph), workers=workers):
+			states = graph.run(workers=workers, mp_context=torch.multiprocessing.get_context('spawn'), on_shutdown=wait_for_uploads)
+		journal.set_state([planned[node_id].artifact_key() for node_id in states if states[node_id]==SKIPPED], SKIPPED)
+	finally:
+		# This process outlives the tick, recover() would never see an aborted tick's tasks as interrupted
+		journal.abort(task_ids)
+	print("Task summary:", graph.summary())
+
+def main(disable_torch_multiprocessing=False, workers=2, combine_train_test=COMBINED_MODEL_TASKS):
+	recording = start_trace("main_git")
+	try:
+		run_tasks(disable_torch_multiprocessing, workers, combine_train_test)
+	finally:
+		stop_trace(recording)
+	# Cycles that found nothing to run are not kept
+	if recording is not None and "schedule" in recording.durations():
+		print("Trace:", recording.write(trace_path("main", datetime.now().strftime("%Y%m%d_%H%M%S"))))
 		
 		
 
@@ -182,15 +172,18 @@ if __name__ == "__main__":
 	parser = argparse.ArgumentParser()
 	parser.add_argument('--single', action='store_true', help='Run the loop only once')
 	parser.add_argument('--disable-torch-multiprocessing', action='store_true', help='Disable multiprocessing')
+	parser.add_argument('--workers', type=int, default=2, help='Number of worker processes running tasks')
+	parser.add_argument('--separate-train-test', action='store_true', help='Run train and analyze of a model as separate tasks')
 	args = parser.parse_args()
+	combine_train_test = COMBINED_MODEL_TASKS and not args.separate_train_test
 
 	if args.single:
-		main(disable_torch_multiprocessing=args.disable_torch_multiprocessing)
+		main(disable_torch_multiprocessing=args.disable_torch_multiprocessing, workers=args.workers, combine_train_test=combine_train_test)
 		exit()
 		
 	while True:
 		try:
-			main(disable_torch_multiprocessing=args.disable_torch_multiprocessing)
+			main(disable_torch_multiprocessing=args.disable_torch_multiprocessing, workers=args.workers, combine_train_test=combine_train_test)
 			time.sleep(5)
 		except Exception as e:
 			traceback.print_exc()
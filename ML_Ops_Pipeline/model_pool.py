@@ -0,0 +1,120 @@
+"""
+model_pool
+
+Keeps loaded pipeline_model instances alive inside a worker process so that
+train and analyze of the same model, and the same model over several datasets,
+only pay for load() once. Only frozen models and models loading a weights file
+are pooled unless they set pooled, the others learn in train() and get a fresh
+instance per task. Instances are keyed by the source hash of the model
+class and the weights file it points to, and the least recently used ones are
+evicted once the pool grows past its memory budget.
+"""
+
+import gc
+import os
+import time
+from collections import OrderedDict
+
+from .constants import MODEL_POOL_SIZE, MODEL_POOL_MEMORY
+from .pipeline_input import source_hash
+from .tracing import span
+
+def process_rss() -> int:
+	# Resident set size of this process in bytes, 0 where /proc is not available
+	try:
+		with open("/proc/self/statm") as statm:
+			return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+	except (OSError, ValueError, IndexError):
+		return 0
+
+def weights_key(model_class) -> str:
+	weights = getattr(model_class, 'weights', None)
+	if weights is None:
+		return ""
+	if os.path.exists(weights):
+		weights_stat = os.stat(weights)
+		return weights + ":" + str(weights_stat.st_size) + ":" + str(weights_stat.st_mtime_ns)
+	return str(weights)
+
+
+def is_pooled(model_class) -> bool:
+	pooled = getattr(model_class, 'pooled', None)
+	if pooled is None:
+		return bool(getattr(model_class, 'frozen', False) or getattr(model_class, 'weights', None) is not None)
+	return bool(pooled)
+
+
+class pooled_model:
+
+	def __init__(self, model, size) -> None:
+		self.model = model
+		self.size = size
+		self.uses = 0
+		self.last_used = time.time()
+
+
+class model_pool:
+
+	def __init__(self, max_entries=MODEL_POOL_SIZE, max_memory=MODEL_POOL_MEMORY) -> None:
+		self.max_entries = max_entries
+		self.max_memory = max_memory
+		self.entries = OrderedDict()
+		self.hits = 0
+		self.misses = 0
+
+	def key(self, model_class) -> tuple:
+		return (model_class.__module__ + "." + model_class.__qualname__, str(source_hash(model_class)), weights_key(model_class))
+
+	def get_model(self, model_class, training_dir):
+		"""
+		Equivalent of model_class(training_dir) that reuses a previously loaded instance
+		"""
+		if not is_pooled(model_class):
+			return model_class(training_dir)
+
+		key = self.key(model_class)
+		if key in self.entries:
+			self.hits += 1
+			self.entries.move_to_end(key)
+			entry = self.entries[key]
+			entry.uses += 1
+			entry.last_used = time.time()
+			entry.model.training_dir = training_dir
+			print("Reusing loaded model", key[0], "(" + str(entry.uses) + " uses)")
+			return entry.model
+
+		self.misses += 1
+		rss_before = process_rss()
+		model = model_class(training_dir)
+		size = max(process_rss() - rss_before, 0)
+		self.entries[key] = pooled_model(model, size)
+		self.evict()
+		return model
+
+	def memory(self) -> int:
+		return sum(entry.size for entry in self.entries.values())
+
+	def evict(self) -> None:
+		evicted = False
+		# The most recently loaded model always stays, even if it is larger than the budget
+		while len(self.entries) > 1 and (len(self.entries) > self.max_entries or self.memory() > self.max_memory):
+			key, entry = self.entries.popitem(last=False)
+			print("Evicting model", key[0], "from the pool,", entry.size, "bytes")
+			evicted = True
+		if evicted:
+			gc.collect()
+
+	def clear(self) -> None:
+		self.entries.clear()
+		gc.collect()
+
+
+global default_pool
+default_pool = None
+
+def get_model(model_class, training_dir):
+	global default_pool
+	if default_pool is None:
+		default_pool = model_pool()
+	with span("model_load", model=getattr(model_class, '__name__', str(model_class))):
+		return default_pool.get_model(model_class, training_dir)
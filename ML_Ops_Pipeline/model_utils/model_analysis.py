@@ -16,18 +16,23 @@ from datetime import datetime
 #import multiprocessing
 
 import json
-import mlflow
+from ..tracking import start_run
+from ..tracing import span
 
 from ..all_pipelines_git import get_all_inputs
 from ..pipeline_input import source_hash
 from ..constants import DATASET_DIR, MODEL_TESTING, ENSEMBLE_TRAINING, MODEL_TRAINING
 from ..history import local_history
+from ..predictions_store import write_predictions
+from ..model_pool import get_model
+from ..dataset_batches import has_batches, open_dataset, run_batches
 
 import traceback
 
 from .model_visualizer_loop import visualize_model
 
-def analyze_model(pipeline_name, model_name, interpreter_name, dataset_dir, model_classes, interpreters, task_id, model_last_modified, task_id_source_hash, model_last_source_hash, visualizers):
+def analyze_model(pipeline_name, model_name, interpreter_name, dataset_dir, model_classes, interpreters, task_id, model_last_modified, task_id_source_hash, model_last_source_hash, visualizers, mod=None, dat=None):
+	# mod and dat are passed in by train_test_model, which loads them once for both stages
 	print("-"*10)
 	print("model_name:\t",model_name)
 	print("interpreter_name:\t",interpreter_name)
@@ -40,50 +45,50 @@ def analyze_model(pipeline_name, model_name, interpreter_name, dataset_dir, mode
 	)
 	os.makedirs(testing_dir, exist_ok=True)
 	tb = "OK"
+	status = False
 
-	expt = mlflow.get_experiment_by_name(pipeline_name)
-	if not expt:
-		mlflow.create_experiment(pipeline_name)
-		expt = mlflow.get_experiment_by_name(pipeline_name)
 
-	with mlflow.start_run(description=testing_dir, run_name='test_'+model_name, experiment_id=expt.experiment_id):
+	with start_run(pipeline_name, 'test_'+model_name, description=testing_dir, resources_json=os.path.join(testing_dir, "resources.json")) as run:
 		try:
-			mlflow.set_tag("COMMIT", model_last_modified)
-			dat = interpreters[interpreter_name](dataset_dir).get_dataset()
-			mod = model_classes[model_name](testing_dir)
+			run.set_tag("COMMIT", model_last_modified)
+			if mod is None:
+				mod = get_model(model_classes[model_name], testing_dir)
+			else:
+				mod.training_dir = testing_dir
 			#mod.predict(dat['test'])
-			results, predictions = mod.evaluate(dat['test']['x'], dat['test']['y'])
+			if dat is None:
+				dat = open_dataset(interpreters[interpreter_name], dataset_dir)
+			if has_batches(interpreters[interpreter_name]):
+				results, predictions = run_batches(mod, 'evaluate', dat, 'test')
+			else:
+				with span("evaluate"):
+					results, predictions = mod.evaluate(dat['test']['x'], dat['test']['y'])
 			#print(results)
 
 			results_pkl = os.path.join(testing_dir, "results.pkl")
-			predictions_pkl = os.path.join(testing_dir, "predictions.pkl")
-			predictions_csv = os.path.join(testing_dir, "predictions.csv")
 			model_pkl = os.path.join(testing_dir, "model.pkl")
 
-			results_handle = open(results_pkl, 'wb')
-			pickle.dump(results, results_handle, protocol=pickle.HIGHEST_PROTOCOL)
-			results_handle.close()
+			with span("pickle_dump", path=results_pkl):
+				results_handle = open(results_pkl, 'wb')
+				pickle.dump(results, results_handle, protocol=pickle.HIGHEST_PROTOCOL)
+				results_handle.close()
 
-			predictions_handle = open(predictions_pkl, 'wb')
-			pickle.dump(predictions, predictions_handle, protocol=pickle.HIGHEST_PROTOCOL)
-			predictions_handle.close()
+			write_predictions(testing_dir, predictions)
 
 			model_handle = open(model_pkl, 'wb')
 			# pickle.dump(mod, model_handle, protocol=pickle.HIGHEST_PROTOCOL)
 			model_handle.close()
 
-			predictions.to_csv(predictions_csv)
 
-			for key in results:
-				mlflow.log_metric(key, results[key])
+			run.log_metrics(results)
 			#mlflow.log_dict(predictions)
 
 			for visualizer_name in visualizers:
 				stat, task_id, model_last_modified, visual_dir = visualize_model(pipeline_name, model_name, interpreter_name, dataset_dir, task_id, model_last_modified, visualizers, visualizer_name, dat, 'test')
-				mlflow.log_artifacts(visual_dir)
+				run.log_artifacts(visual_dir)
 
-			mlflow.set_tag("LOG_STATUS", "SUCCESS")
-			return (True, task_id, model_last_modified, task_id_source_hash, model_last_source_hash)
+			run.set_tag("LOG_STATUS", "SUCCESS")
+			status = True
 		except KeyboardInterrupt:
 			print("Interrupt recieved at model_analysis")
 			print("-"*10)
@@ -94,15 +99,15 @@ def analyze_model(pipeline_name, model_name, interpreter_name, dataset_dir, mode
 		except Exception as ex:
 			print(ex)
 			tb = traceback.format_exc()
-			mlflow.set_tag("LOG_STATUS", "FAILED")
+			run.set_tag("LOG_STATUS", "FAILED")
 		finally:
 			print(tb)
 			err_txt = os.path.join(testing_dir, "status.txt")
 			err_file = open(err_txt, "w")
 			err_file.write(tb)
 			err_file.close()
-			mlflow.log_artifacts(testing_dir)
-			return (False, task_id, model_last_modified, task_id_source_hash, model_last_source_hash)
+			run.log_artifacts(testing_dir)
+			return (status, task_id, model_last_modified, task_id_source_hash, model_last_source_hash)
 
 def main():
 	loc_hist = local_history(__file__)
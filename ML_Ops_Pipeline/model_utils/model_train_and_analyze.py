@@ -0,0 +1,54 @@
+"""
+model_train_and_analyze
+
+Train and analyze of one model on one dataset as a single task: the model and
+the dataset are loaded once and both stages still write their own outputs,
+tracked run and status.
+"""
+
+import os
+import traceback
+
+from ..constants import MODEL_TRAINING
+from ..model_pool import get_model
+from ..pipeline_manifest import frozen_train_sample
+from ..dataset_batches import open_dataset
+from ..tracing import start_trace, stop_trace, trace_path
+
+from .model_training import train_model
+from .model_analysis import analyze_model
+
+def train_test_model(train_args, analyze_args) -> tuple:
+	"""
+	train_model(*train_args) and analyze_model(*analyze_args) sharing the loaded model and dataset
+	Returns the results of both, analyze is left out (None) when a model that learns failed to train
+	"""
+	pipeline_name, model_name, interpreter_name, dataset_dir, model_classes, interpreters, task_id, model_last_modified = train_args[:8]
+	training_dir = MODEL_TRAINING.format(
+		pipeline_name=pipeline_name,
+		interpreter_name=interpreter_name,
+		model_name=model_name,
+		commit_id=model_last_modified
+	)
+	os.makedirs(training_dir, exist_ok=True)
+	# The shared loads happen outside of both runs, the task gets a trace of its own
+	recording = start_trace('train_test_' + model_name)
+	try:
+		mod, dat = None, None
+		try:
+			mod = get_model(model_classes[model_name], training_dir)
+			dat = open_dataset(interpreters[interpreter_name], dataset_dir)
+		except KeyboardInterrupt:
+			raise
+		except Exception:
+			# Whatever failed to load is loaded again by each stage, which records the failure in its own run
+			traceback.print_exc()
+		train_result = train_model(*train_args, mod=mod, dat=dat)
+		analyze_result = None
+		if (train_result is not None and train_result[0]) or frozen_train_sample(model_classes[model_name]) is not None:
+			analyze_result = analyze_model(*analyze_args, mod=mod, dat=dat)
+	finally:
+		stop_trace(recording)
+	if recording is not None:
+		recording.write(trace_path(pipeline_name, 'train_test_' + model_name + "." + model_last_modified))
+	return train_result, analyze_result
@@ -15,18 +15,24 @@ from datetime import datetime
 #import multiprocessing
 
 import json
-import mlflow
+from ..tracking import start_run
+from ..tracing import span
 
 from ..all_pipelines_git import get_all_inputs
-from ..pipeline_input import source_hash
+from ..pipeline_input import source_hash, sample_split
+from ..pipeline_manifest import frozen_train_sample
 from ..constants import DATASET_DIR, MODEL_TRAINING, ENSEMBLE_TRAINING, MODEL_TESTING
 from ..history import local_history
+from ..predictions_store import write_predictions
+from ..model_pool import get_model
+from ..dataset_batches import has_batches, open_dataset, run_batches
 
 import traceback
 
 from .model_visualizer_loop import visualize_model
 
-def train_model(pipeline_name, model_name, interpreter_name, dataset_dir, model_classes, interpreters, task_id, model_last_modified, task_id_source_hash, model_last_source_hash, visualizers):
+def train_model(pipeline_name, model_name, interpreter_name, dataset_dir, model_classes, interpreters, task_id, model_last_modified, task_id_source_hash, model_last_source_hash, visualizers, mod=None, dat=None):
+	# mod and dat are passed in by train_test_model, which loads them once for both stages
 	print("-"*10)
 	print("model_name:\t",model_name)
 	print("interpreter_name:\t",interpreter_name)
@@ -38,53 +44,59 @@ def train_model(pipeline_name, model_name, interpreter_name, dataset_dir, model_
 		commit_id=model_last_modified
 	)
 	os.makedirs(training_dir, exist_ok=True)
-	expt = mlflow.get_experiment_by_name(pipeline_name)
-	if not expt:
-		mlflow.create_experiment(pipeline_name)
-		expt = mlflow.get_experiment_by_name(pipeline_name)
 	tb = "OK"
+	status = False
 
-	with mlflow.start_run(description=training_dir, run_name='train_'+model_name, experiment_id=expt.experiment_id) as run:
+	with start_run(pipeline_name, 'train_'+model_name, description=training_dir, resources_json=os.path.join(training_dir, "resources.json")) as run:
 		try:
-			mlflow.set_tag("COMMIT", model_last_modified)
+			run.set_tag("COMMIT", model_last_modified)
 
-			dat = interpreters[interpreter_name](dataset_dir).get_dataset()
-			mod = model_classes[model_name](training_dir)
+			if mod is None:
+				mod = get_model(model_classes[model_name], training_dir)
+			else:
+				mod.training_dir = training_dir
 			#mod.predict(dat['train'])
-			results, predictions = mod.train(dat['train']['x'], dat['train']['y'])
+			if dat is None:
+				dat = open_dataset(interpreters[interpreter_name], dataset_dir)
+			# Frozen models only go over a sample of the train split
+			train_sample = frozen_train_sample(model_classes[model_name])
+			if has_batches(interpreters[interpreter_name]):
+				results, predictions = run_batches(mod, 'train', dat, 'train', limit=train_sample)
+			else:
+				x, y = dat['train']['x'], dat['train']['y']
+				if train_sample:
+					x, y = sample_split(x, y, train_sample)
+				with span("train"):
+					results, predictions = mod.train(x, y)
 			#print(results)
 
 			results_pkl = os.path.join(training_dir, "results.pkl")
-			predictions_pkl = os.path.join(training_dir, "predictions.pkl")
-			predictions_csv = os.path.join(training_dir, "predictions.csv")
 			model_pkl = os.path.join(training_dir, "model.pkl")
 
-			results_handle = open(results_pkl, 'wb')
-			pickle.dump(results, results_handle, protocol=pickle.HIGHEST_PROTOCOL)
-			results_handle.close()
+			with span("pickle_dump", path=results_pkl):
+				results_handle = open(results_pkl, 'wb')
+				pickle.dump(results, results_handle, protocol=pickle.HIGHEST_PROTOCOL)
+				results_handle.close()
 
-			predictions_handle = open(predictions_pkl, 'wb')
-			pickle.dump(predictions, predictions_handle, protocol=pickle.HIGHEST_PROTOCOL)
-			predictions_handle.close()
+			write_predictions(training_dir, predictions)
 
 			model_handle = open(model_pkl, 'wb')
 			# pickle.dump(mod, model_handle, protocol=pickle.HIGHEST_PROTOCOL)
 			model_handle.close()
 
-			predictions.to_csv(predictions_csv)
 
 			for key in results:
 				#assert type(results[key]) in [str, int, float], "results[" + key + "]: " + str(results[key]) + " -> " + str(type(results[key]))
 				print(key, results[key])
-				mlflow.log_metric(key, results[key])
+			run.log_metrics(results)
 			#mlflow.log_dict(predictions)
 
 			for visualizer_name in visualizers:
 				stat, task_id, model_last_modified, visual_dir = visualize_model(pipeline_name, model_name, interpreter_name, dataset_dir, task_id, model_last_modified, visualizers, visualizer_name, dat, 'train')
-				mlflow.log_artifacts(visual_dir)
+				run.log_artifacts(visual_dir)
 
-			mlflow.set_tag("LOG_STATUS", "SUCCESS")
-			return (True, task_id, model_last_modified, task_id_source_hash, model_last_source_hash)
+			run.set_tag("LOG_STATUS", "SUCCESS")
+			status = True
 		except KeyboardInterrupt:
 			print("Interrupt recieved at model_training")
 			print("-"*10)
@@ -95,15 +107,15 @@ def train_model(pipeline_name, model_name, interpreter_name, dataset_dir, model_
 		except Exception as ex:
 			print(ex)
 			tb = traceback.format_exc()
-			mlflow.set_tag("LOG_STATUS", "FAILED")
+			run.set_tag("LOG_STATUS", "FAILED")
 		finally:
 			print(tb)
 			err_txt = os.path.join(training_dir, "status.txt")
 			err_file = open(err_txt, "w")
 			err_file.write(tb)
 			err_file.close()
-			mlflow.log_artifacts(training_dir)
-			return (False, task_id, model_last_modified, task_id_source_hash, model_last_source_hash)
+			run.log_artifacts(training_dir)
+			return (status, task_id, model_last_modified, task_id_source_hash, model_last_source_hash)
 
 def main():
 	loc_hist = local_history(__file__)
@@ -10,6 +10,7 @@ import glob
 
 from all_pipelines import get_all_inputs
 from constants import DATASET_DIR, MODEL_TESTING, DATA_BASE_DIR, MODEL_BASE, MODEL_VISUAL
+from predictions_store import predictions_exist, read_predictions
 from pipeline_input import pipeline_input
 
 def vizualize_model(p_input: pipeline_input, interpreter_name: str, dataset_name: str, model_name: str, visualizer_name: str):
@@ -47,9 +48,9 @@ def vizualize_model(p_input: pipeline_input, interpreter_name: str, dataset_name
 
 
 	results_pkl = os.path.join(testing_dir, "results.pkl")
-	predictions_pkl = os.path.join(testing_dir, "predictions.pkl")
+	predictions_dir = testing_dir
 
-	if not os.path.exists(results_pkl) or not os.path.exists(predictions_pkl):
+	if not os.path.exists(results_pkl) or not predictions_exist(predictions_dir):
 		print("Analysis data for the given combination has not been generated yet")
 		exit()
 
@@ -65,9 +66,7 @@ def vizualize_model(p_input: pipeline_input, interpreter_name: str, dataset_name
 	results = pickle.load(results_handle)
 	results_handle.close()
 
-	predictions_handle = open(predictions_pkl, 'rb')
-	predictions = pickle.load(predictions_handle)
-	predictions_handle.close()
+	predictions = read_predictions(predictions_dir)
 
 	visual_dir = MODEL_VISUAL.format(pipeline_name=pipeline_name, interpreter_name=interpreter_name, model_name=model_name)
 	os.makedirs(visual_dir, exist_ok=True)
@@ -12,13 +12,18 @@ import traceback
 
 import json
 from typing import final
+from ..tracking import start_run
+from ..tracing import span
 
 from sklearn import pipeline
 
 from ..all_pipelines_git import get_all_inputs
-from ..pipeline_input import source_hash
+from ..pipeline_input import source_hash, pipeline_dataset_interpreter
 from ..constants import DATASET_DIR, MODEL_TESTING, MODEL_TRAINING, MODEL_VISUAL, folder_last_modified
 from ..history import local_history
+from ..predictions_store import read_predictions
+from ..dataset_cache import get_dataset
+from ..dataset_batches import has_batches, open_batches, visualize_batches
 
 def visualize_model(pipeline_name, model_name, interpreter_name, dataset_dir, task_id, model_last_modified, visualizers, visualizer_name, dat, mode):
 	print("-"*10)
@@ -43,19 +48,17 @@ def visualize_model(pipeline_name, model_name, interpreter_name, dataset_dir, ta
 
 	if mode=='train':
 		results_pkl = os.path.join(training_dir, "results.pkl")
-		predictions_pkl = os.path.join(training_dir, "predictions.pkl")
+		predictions_dir = training_dir
 	elif mode=='test':
 		results_pkl = os.path.join(testing_dir, "results.pkl")
-		predictions_pkl = os.path.join(testing_dir, "predictions.pkl")
+		predictions_dir = testing_dir
 	else:
 		raise Exception("Mode must be test or train")
 
 	results_handle = open(results_pkl, 'rb')
 	results = pickle.load(results_handle)
 	results_handle.close()
-	predictions_handle = open(predictions_pkl, 'rb')
-	predictions = pickle.load(predictions_handle)
-	predictions_handle.close()
+	predictions = read_predictions(predictions_dir, columns=getattr(visualizers[visualizer_name], 'prediction_columns', None))
 
 	visual_dir = MODEL_VISUAL.format(
 		pipeline_name=pipeline_name, interpreter_name=interpreter_name, model_name=model_name, visualizer_name=visualizer_name,
@@ -74,10 +77,39 @@ def visualize_model(pipeline_name, model_name, interpreter_name, dataset_dir, ta
 	print("dataset_dir:\t",dataset_dir)
 	print("visual_dir:\t",visual_dir)
 
-	visualizers[visualizer_name]().visualize(dat[mode]['x'], dat[mode]['y'], results, predictions, visual_dir)
+	with span("visualize", visualizer=visualizer_name, mode=mode):
+		if isinstance(dat, pipeline_dataset_interpreter):
+			# Streaming interpreter opened by open_batches
+			visualize_batches(visualizers[visualizer_name](), dat, mode, results, predictions, visual_dir)
+		else:
+			visualizers[visualizer_name]().visualize(dat[mode]['x'], dat[mode]['y'], results, predictions, visual_dir)
 
 	return (True, task_id, model_last_modified, visual_dir)
-	
+
+def visualize_model_task(pipeline_name, model_name, interpreter_name, dataset_dir, interpreters, task_id, model_last_modified, visualizers, visualizer_name, mode):
+	# Standalone scheduler stage: loads the dataset and runs one visualizer in its own run
+	status = False
+	visual_dir = None
+	with start_run(pipeline_name, 'visualize_'+mode+'_'+model_name+'_'+visualizer_name) as run:
+		try:
+			run.set_tag("COMMIT", model_last_modified)
+			if has_batches(interpreters[interpreter_name]):
+				dat = open_batches(interpreters[interpreter_name], dataset_dir)
+			else:
+				dat = get_dataset(interpreters[interpreter_name], dataset_dir)
+			stat, task_id, model_last_modified, visual_dir = visualize_model(pipeline_name, model_name, interpreter_name, dataset_dir, task_id, model_last_modified, visualizers, visualizer_name, dat, mode)
+			run.log_artifacts(visual_dir)
+			run.set_tag("LOG_STATUS", "SUCCESS")
+			status = True
+		except KeyboardInterrupt:
+			print("Interrupt recieved at model_visualizer_loop")
+			raise KeyboardInterrupt
+		except Exception as ex:
+			print(ex)
+			traceback.print_exc()
+			run.set_tag("LOG_STATUS", "FAILED")
+	return (status, task_id, model_last_modified, visual_dir)
+
 def main():
 	loc_hist = local_history(__file__)
 	task_list = {}
@@ -141,7 +173,7 @@ def main():
 			interpreter_datasets = task_list[pipeline_name][interpreter_name].keys()
 			for dataset_dir in interpreter_datasets:
 				
-				dat = interpreters[interpreter_name](dataset_dir).get_dataset()
+				dat = get_dataset(interpreters[interpreter_name], dataset_dir)
 				model_classes = all_inputs[pipeline_name].get_pipeline_model()
 				for model_name in task_list[pipeline_name][interpreter_name][dataset_dir].keys():
 					print("-"*10)
@@ -159,15 +191,13 @@ def main():
 					visualizers = all_inputs[pipeline_name].get_pipeline_visualizer()
 					for visualizer_name in task_list[pipeline_name][interpreter_name][dataset_dir][model_name].keys():
 						results_pkl = os.path.join(testing_dir, "results.pkl")
-						predictions_pkl = os.path.join(testing_dir, "predictions.pkl")
+						predictions_dir = testing_dir
 
 						results_handle = open(results_pkl, 'rb')
 						results = pickle.load(results_handle)
 						results_handle.close()
 
-						predictions_handle = open(predictions_pkl, 'rb')
-						predictions = pickle.load(predictions_handle)
-						predictions_handle.close()
+						predictions = read_predictions(predictions_dir)
 
 						visual_dir = MODEL_VISUAL.format(pipeline_name=pipeline_name, interpreter_name=interpreter_name, model_name=model_name, visualizer_name=visualizer_name)
 						os.makedirs(visual_dir, exist_ok=True)
@@ -3,6 +3,7 @@ import inspect
 import hashlib
 
 import os
+import sys
 import glob
 import base64
 import pickle
@@ -12,20 +13,56 @@ import pandas as pd
 
 import mlflow
 import tensorflow as tf
-from .constants import DATASET_DIR, MODEL_TRAINING, MODEL_TESTING, MODEL_VISUAL, MODEL_BASE_NAME
+from . import tracking
+from .constants import DATASET_DIR, MODEL_TRAINING, MODEL_TESTING, MODEL_VISUAL, MODEL_BASE_NAME, DATASET_BATCH_SIZE, INFERENCE_BATCH_SIZE, INFERENCE_BATCH_MEMORY, FROZEN_TRAIN_SAMPLE
+
+global source_hashes
+# (module, qualname, module mtimes of the MRO) -> source_hash
+source_hashes = {}
+
+def source_files_key(type_class) -> tuple:
+	key = [type_class.__module__, type_class.__qualname__]
+	for super_class in type_class.__mro__:
+		module = sys.modules.get(super_class.__module__)
+		module_file = getattr(module, '__file__', None)
+		if module_file is None:
+			key.append(None)
+		else:
+			try:
+				key.append(os.stat(module_file).st_mtime_ns)
+			except OSError:
+				key.append(None)
+	return tuple(key)
+
+def clear_source_hashes(module_name=None) -> None:
+	"""
+	Forgets the memoized hashes of module_name and its submodules, or all of them
+	"""
+	global source_hashes
+	if module_name is None:
+		source_hashes.clear()
+		return
+	for key in list(source_hashes.keys()):
+		if key[0] == module_name or key[0].startswith(module_name + "."):
+			del source_hashes[key]
 
 def source_hash(self) -> int:
 	if self == object:
 		return 0
 	elif type(self) == type:
 		type_class = self
+		key = source_files_key(type_class)
+		if key in source_hashes:
+			return source_hashes[key]
 
 		type_source = inspect.getsource(type_class)
 		for super_class in type_class.__mro__:
 			if super_class!=type_class:
 				#print(type_class, "\t->\t", super_class)
 				type_source += str(super_class) + ":" + str(source_hash(super_class)) + "\n"
-		return int(hashlib.sha1(type_source.encode("utf-8")).hexdigest(), 16) 
+		type_hash = int(hashlib.sha1(type_source.encode("utf-8")).hexdigest(), 16)
+		source_hashes[key] = type_hash
+		return type_hash
 	else:
 		type_class = type(self)
 		
@@ -36,19 +73,64 @@ def source_hash(self) -> int:
 		return int(hashlib.sha1(type_source.encode("utf-8")).hexdigest(), 16) 
 		
 
+def slice_items(items, start, stop):
+	if isinstance(items, (pd.DataFrame, pd.Series)):
+		return items.iloc[start:stop]
+	return items[start:stop]
+
+def take_items(items, indices):
+	if isinstance(items, (pd.DataFrame, pd.Series)):
+		return items.iloc[indices]
+	if isinstance(items, np.ndarray):
+		return items[indices]
+	return [items[i] for i in indices]
+
+def sample_split(x, y, sample) -> tuple:
+	"""
+	sample evenly spaced items of x and y
+	y is kept whole when it is not one label per item of x (e.g. the boxes of obj_det)
+	"""
+	if sample >= len(x):
+		return x, y
+	indices = np.unique(np.linspace(0, len(x) - 1, sample).round().astype(int))
+	if y is not None and len(y) == len(x):
+		y = take_items(y, indices)
+	return take_items(x, indices), y
+
+def concat_items(items_list):
+	"""
+	Joins the per batch x, y or predictions back into one
+	"""
+	if len(items_list) == 0:
+		return None
+	if isinstance(items_list[0], (pd.DataFrame, pd.Series)):
+		return pd.concat(items_list)
+	if isinstance(items_list[0], np.ndarray):
+		return np.concatenate(items_list)
+	if isinstance(items_list[0], list):
+		return [item for items in items_list for item in items]
+	if hasattr(type(items_list[0]), 'concat'):
+		# Pipeline defined containers join themselves
+		return type(items_list[0]).concat(items_list)
+	return items_list[-1]
+
 class pipeline_classes:
 
 	pipeline_mlflow = mlflow
+	# Run of the stage being executed, see tracking.py
+	pipeline_tracking = tracking
 
 	def set_status(self, stat):
-		self.pipeline_mlflow.set_tag("LOG_STATUS", stat)
+		self.pipeline_tracking.set_tag("LOG_STATUS", stat)
 
 	def __hash__(self) -> int:
 		return source_hash(self)
 
 class pipeline_dataset_interpreter(pipeline_classes):
-	# TODO: Impractical to have entire dataset to be loaded into memory
-	# look into alterative architectures which load things into memory chunk by chunk
+	# Interpreters of datasets too large for memory set streaming = True and override
+	# iter_batches and split_len, the framework then skips load() and reads batches
+	streaming = False
+	batch_size = DATASET_BATCH_SIZE
 	dataset = {
 		'test': {
 			'x':   None,
@@ -72,9 +154,43 @@ class pipeline_dataset_interpreter(pipeline_classes):
 		# Load the dataset into self.dataset
 		pass
 
+	def iter_batches(self, split, batch_size):
+		# Yields {'x': ..., 'y': ...} with at most batch_size items of split ('train' or 'test')
+		# This default slices the loaded dataset, x and y are only sliced if they are aligned
+		x = self.dataset[split]['x']
+		y = self.dataset[split]['y']
+		if x is None or y is None or len(x) != len(y):
+			yield {'x': x, 'y': y}
+			return
+		for start in range(0, len(x), batch_size):
+			yield {'x': slice_items(x, start, start+batch_size), 'y': slice_items(y, start, start+batch_size)}
+
+	def split_len(self, split) -> int:
+		# Number of items of split
+		x = self.dataset[split]['x']
+		if x is None:
+			return 0
+		return len(x)
+
+	def __len__(self):
+		return sum(self.split_len(split) for split in ('train', 'test'))
+
 
 class pipeline_model(pipeline_classes):
 	model = None     
+	# Loaded instances are reused across tasks by model_pool, keyed on the source hash and weights
+	# None pools frozen models and models loading a weights file only, an instance that learns in train() must not be handed to the next dataset
+	pooled = None
+	weights = None
+	# Pretrained models that do not learn from the train split, their train stage only runs on train_sample items
+	frozen = False
+	train_sample = FROZEN_TRAIN_SAMPLE
+	# Batches handed to predict_batch, see inference.batched_predict
+	inference_batch_size = INFERENCE_BATCH_SIZE
+	inference_batch_memory = INFERENCE_BATCH_MEMORY
+	# Per item predictions of predict_batch are reused for items with the same contents, see prediction_cache
+	# None caches frozen models and models loading a weights file when PREDICTION_CACHE is set, what a model learns in train() is not part of the key
+	cache_predictions = None
 	def __init__(self, training_dir, load=True) -> None:
 		self.training_dir = training_dir
 		if load:
@@ -90,14 +206,75 @@ class pipeline_model(pipeline_classes):
 	def predict(self, x: np.array) -> np.array:
 		# Runs prediction on list of values x of length n
 		# Returns a list of values of length n
+		if self.has_predict_batch():
+			from .inference import batched_predict
+			return batched_predict(self, x)
 		pass
 
+	def predict_batch(self, x_batch, images=None):
+		# Optional, runs prediction on a consecutive slice of x in a single call
+		# Returns the predictions of the slice, joined in order by predict
+		# images are the decoded item_image of the items when the model names them, None when called without
+		raise NotImplementedError
+
+	def has_predict_batch(self) -> bool:
+		return type(self).predict_batch is not pipeline_model.predict_batch
+
+	def item_image(self, item):
+		# Optional, the image path predict_batch decodes for one item of x
+		# batched_predict then decodes the images of the next batch while this one is predicted
+		raise NotImplementedError
+
+	def has_item_image(self) -> bool:
+		return type(self).item_image is not pipeline_model.item_image
+
+	def read_image(self, image_path):
+		# Decodes the item_image of an item, cv2.imread by default
+		from .frame_cache import read_frame
+		return read_frame(image_path)
+
+	def split_predictions(self, x_batch, predictions):
+		# Optional, the predictions of predict_batch(x_batch) as one entry per item of x_batch, joined again by predict
+		# None keeps them out of the prediction cache
+		if hasattr(predictions, 'split_items'):
+			# Pipeline defined containers split themselves
+			from .inference import iter_items
+			return predictions.split_items(list(iter_items(x_batch)))
+		if isinstance(predictions, (list, np.ndarray)) and len(predictions) == len(x_batch):
+			return [slice_items(predictions, i, i + 1) for i in range(len(predictions))]
+		return None
+
+	def reuse_prediction(self, item, prediction):
+		# Optional, adapts a cached prediction to item, which may be the same image under another path
+		if hasattr(prediction, 'with_item'):
+			return prediction.with_item(item)
+		return prediction
+
+	def item_memory(self, item) -> int:
+		# Input size of one item of x in bytes, used for inference_batch_memory
+		from .inference import item_memory
+		return item_memory(item)
+
 	def evaluate(self, x, y) -> np.array:
 		pass
 
 	def train(self, x, y) -> np.array:
 		pass
 
+	def merge_results(self, results: list, sizes: list):
+		# Combines the results of train/evaluate run over batches of a streaming dataset
+		# Numeric metrics are averaged weighted by batch size, override for other metrics
+		total = sum(sizes)
+		def weighted_mean(values):
+			if total == 0 or not all(isinstance(value, (int, float, np.number)) for value in values):
+				return values[-1]
+			return sum(value * size for value, size in zip(values, sizes)) / total
+		if len(results) == 0:
+			return {}
+		if all(isinstance(result, dict) for result in results):
+			return {key: weighted_mean([result[key] for result in results]) for key in results[-1]}
+		return weighted_mean(results)
+
 
 class pipeline_ensembler(pipeline_classes):
 
@@ -126,12 +303,22 @@ class pipeline_ensembler(pipeline_classes):
 		pass
 
 class pipeline_data_visualizer(pipeline_classes):
+	# Columns of the predictions visualize uses, None reads all of them
+	prediction_columns = None
 
 	def visualize(self, dataset_x, dataset_y, results, predictions, directory) -> None:
 		# Visualize the data
 		# TODO Save data to the given directory
 		pass
 
+	def visualize_batches(self, batches, results, predictions, directory) -> None:
+		# Visualize a streaming dataset, batches yields {'x': ..., 'y': ...}
+		# This default joins all batches, override to visualize at constant memory, like iou_viz and videos_vis do
+		batches = list(batches)
+		dataset_x = concat_items([batch['x'] for batch in batches])
+		dataset_y = concat_items([batch['y'] for batch in batches])
+		self.visualize(dataset_x, dataset_y, results, predictions, directory)
+
 class pipeline_streamlit_visualizer(pipeline_classes):
 	def __init__(self, pipeline, streamlit) -> None:
 		super().__init__()
@@ -149,6 +336,16 @@ class pipeline_streamlit_visualizer(pipeline_classes):
 			unsafe_allow_html=True,
 		)
 		
+	@property
+	def testing_predictions(self):
+		return self.testing_predictions_reader.read_all()
+
+	@property
+	def training_predictions(self):
+		if self.training_predictions_reader is None:
+			return None
+		return self.training_predictions_reader.read_all()
+
 	def load_data(self):
 		self.pipeline_name = self.st.session_state.pipeline
 		#self.pipeline_name = self.pipeline.get_pipeline_name()
@@ -209,31 +406,32 @@ class pipeline_streamlit_visualizer(pipeline_classes):
 			commit_id=self.commit_id
 		)
 
+		from .predictions_store import predictions_exist, predictions_reader
 		self.testing_results_pkl = os.path.join(testing_dir, "results.pkl")
-		self.testing_predictions_pkl = os.path.join(testing_dir, "predictions.pkl")
-		if not (os.path.exists(self.self.testing_results_pkl) and os.path.exists(self.self.testing_predictions_pkl)):
-			st.markdown("# Data Does not exist")
+		if not (os.path.exists(self.testing_results_pkl) and predictions_exist(testing_dir)):
+			self.st.markdown("# Data Does not exist")
 			return
 
 		self.testing_results_handle = open(self.testing_results_pkl, 'rb')
 		self.testing_results = pickle.load(self.testing_results_handle)
 		self.testing_results_handle.close()
 
-		self.testing_predictions_handle = open(self.testing_predictions_pkl, 'rb')
-		self.testing_predictions = pickle.load(self.testing_predictions_handle)
-		self.testing_predictions_handle.close()
+		# Read when first used, or in parts through read(columns, images)
+		self.testing_predictions_reader = predictions_reader(testing_dir)
 
+		# Frozen models without a train_sample have no training outputs, the train views are skipped for them
 		self.training_results_pkl = os.path.join(training_dir, "results.pkl")
-		self.training_predictions_pkl = os.path.join(training_dir, "predictions.pkl")
-		self.training_results_handle = open(self.training_results_pkl, 'rb')
-		self.training_results = pickle.load(self.training_results_handle)
-		self.training_results_handle.close()
+		self.training_results = None
+		self.training_predictions_reader = None
+		if os.path.exists(self.training_results_pkl) and predictions_exist(training_dir):
+			self.training_results_handle = open(self.training_results_pkl, 'rb')
+			self.training_results = pickle.load(self.training_results_handle)
+			self.training_results_handle.close()
 
-		self.training_predictions_handle = open(self.training_predictions_pkl, 'rb')
-		self.training_predictions = pickle.load(self.training_predictions_handle)
-		self.training_predictions_handle.close()
+			self.training_predictions_reader = predictions_reader(training_dir)
 
-		self.dat = self.interpreters[self.interpreter_name](self.dataset_dir).get_dataset()
+		from .dataset_cache import get_dataset
+		self.dat = get_dataset(self.interpreters[self.interpreter_name], self.dataset_dir)
 
 
 	def visualize(self):
@@ -243,9 +441,10 @@ class pipeline_streamlit_visualizer(pipeline_classes):
 		self.st.write(self.testing_results)
 		#self.st.write(self.testing_predictions)
 
-		self.st.markdown("# Training Results")
-		self.st.write(self.training_results)
-		#self.st.write(self.training_predictions)
+		if self.training_results is not None:
+			self.st.markdown("# Training Results")
+			self.st.write(self.training_results)
+			#self.st.write(self.training_predictions)
 
 		try:
 			self.st.markdown("# Dataset")
@@ -266,7 +465,7 @@ class pipeline_streamlit_visualizer(pipeline_classes):
 			key='visualizer_name',
 		)
 		
-		self.visual_dir = MODEL_VISUAL.format(pipeline_name=self.pipeline_name, interpreter_name=self.interpreter_name, model_name=self.model_name, visualizer_name=self.visualizer_name)
+		self.visual_dir = MODEL_VISUAL.format(pipeline_name=self.pipeline_name, interpreter_name=self.interpreter_name, model_name=self.model_name, commit_id=self.commit_id, visualizer_name=self.visualizer_name)
 		self.st.markdown("# Visuals")
 		MAX_FRAMES = 5
 		frame_count = 0
@@ -0,0 +1,228 @@
+"""
+pipeline_manifest
+
+Lets the scheduler and the UI plan without importing the pipeline modules
+(and with them detectron2, torch hub, keras, tensorflow ...) in their own process.
+For every pipeline commit a manifest of the registered interpreters, models,
+ensemblers and visualizers along with their module, qualname and source_hash
+is generated once in a short lived subprocess and cached in the history.
+lazy_pipeline exposes the manifest through the pipeline_input getters, the
+classes it hands out are lazy_class references which turn back into the real
+classes when they are unpickled in the worker that runs the task.
+"""
+
+import os
+import sys
+import json
+import hashlib
+import importlib
+import subprocess
+import tempfile
+import traceback
+
+from .constants import REMOTE_PIPELINES_DIR
+from .history import local_history
+from .pipeline_input import source_hash
+from .tracing import span
+
+# Getter of pipeline_input -> manifest section
+SECTIONS = {
+	'get_pipeline_dataset_interpreter': 'interpreters',
+	'get_pipeline_model': 'models',
+	'get_pipeline_ensemble': 'ensembles',
+	'get_pipeline_visualizer': 'visualizers',
+}
+
+def load_class(module, qualname):
+	from . import all_pipelines_git # Puts REMOTE_PIPELINES_DIR on sys.path
+	with span("pipeline_import", module=module):
+		loaded = importlib.import_module(module)
+	for name in qualname.split("."):
+		loaded = getattr(loaded, name)
+	return loaded
+
+def class_hash(cls) -> str:
+	"""
+	str(source_hash(cls)) without importing cls if it is a lazy_class
+	"""
+	if isinstance(cls, lazy_class):
+		return cls.hash
+	return str(source_hash(cls))
+
+def frozen_train_sample(cls):
+	"""
+	None for models that train, else the number of train split items the frozen model predicts (0: none)
+	"""
+	if isinstance(cls, lazy_class):
+		return cls.train_sample
+	if not getattr(cls, 'frozen', False):
+		return None
+	return int(getattr(cls, 'train_sample', 0) or 0)
+
+
+class lazy_class:
+
+	def __init__(self, module, qualname, hash, train_sample=None) -> None:
+		self.module = module
+		self.qualname = qualname
+		self.hash = hash
+		self.train_sample = train_sample
+
+	def load(self) -> type:
+		return load_class(self.module, self.qualname)
+
+	def __call__(self, *args, **kwargs):
+		return self.load()(*args, **kwargs)
+
+	def __reduce__(self):
+		# Workers get the real class
+		return (load_class, (self.module, self.qualname))
+
+	def __repr__(self):
+		return "lazy_class(" + self.module + "." + self.qualname + ")"
+
+
+class lazy_pipeline:
+
+	def __init__(self, p_name, commit_id, manifest) -> None:
+		self.p_name = p_name
+		self.commit_id = commit_id
+		self.manifest = manifest
+
+	def lazy_classes(self, section) -> dict:
+		return {name: lazy_class(**self.manifest[section][name]) for name in self.manifest[section]}
+
+	def get_pipeline_name(self) -> str:
+		return self.manifest['pipeline_name']
+
+	def get_pipeline_dataset_interpreter(self) -> dict:
+		return self.lazy_classes('interpreters')
+
+	def get_pipeline_model(self) -> dict:
+		return self.lazy_classes('models')
+
+	def get_pipeline_ensemble(self) -> dict:
+		return self.lazy_classes('ensembles')
+
+	def get_pipeline_visualizer(self) -> dict:
+		return self.lazy_classes('visualizers')
+
+	def get_pipeline_streamlit_visualizer(self) -> lazy_class:
+		return lazy_class(**self.manifest['streamlit_visualizer'])
+
+	def load(self):
+		"""
+		Imports the pipeline in this process, returns its pipeline_input
+		"""
+		from .all_pipelines_git import load_pipeline
+		pipeline = load_pipeline(self.p_name, self.commit_id)
+		assert pipeline is not None, "Failed to import " + self.p_name
+		return pipeline
+
+	def __repr__(self):
+		return "lazy_pipeline(" + self.p_name + ", " + self.commit_id + ")"
+
+
+def class_entry(cls) -> dict:
+	return {'module': cls.__module__, 'qualname': cls.__qualname__, 'hash': str(source_hash(cls)), 'train_sample': frozen_train_sample(cls)}
+
+def generate_manifest(p_name) -> dict:
+	"""
+	Imports p_name and describes its exported_pipeline, run by build_manifest in a subprocess
+	"""
+	from .all_pipelines_git import import_pipeline
+	pipeline = import_pipeline(p_name).exported_pipeline
+	manifest = {
+		'pipeline_name': pipeline.get_pipeline_name(),
+		'streamlit_visualizer': class_entry(pipeline.get_pipeline_streamlit_visualizer()),
+	}
+	for getter, section in SECTIONS.items():
+		classes = getattr(pipeline, getter)()
+		manifest[section] = {name: class_entry(classes[name]) for name in classes}
+	return manifest
+
+def build_manifest(p_name, pipelines_dir=REMOTE_PIPELINES_DIR) -> dict:
+	manifest_fd, manifest_json = tempfile.mkstemp(suffix=".json")
+	os.close(manifest_fd)
+	env = dict(os.environ)
+	package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+	env['PYTHONPATH'] = os.pathsep.join([package_root, pipelines_dir] + ([env['PYTHONPATH']] if env.get('PYTHONPATH') else []))
+	try:
+		subprocess.run(
+			[sys.executable, '-m', 'ML_Ops_Pipeline.pipeline_manifest', p_name, manifest_json],
+			env=env, check=True, stdout=subprocess.DEVNULL
+		)
+		with open(manifest_json) as manifest_handle:
+			return json.load(manifest_handle)
+	finally:
+		os.remove(manifest_json)
+
+global framework_digest
+framework_digest = None
+
+def framework_hash() -> str:
+	# Manifests hold source hashes which include the pipeline_input base classes
+	global framework_digest
+	if framework_digest is None:
+		pipeline_input_py = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pipeline_input.py")
+		with open(pipeline_input_py, 'rb') as pipeline_input_handle:
+			framework_digest = hashlib.sha1(pipeline_input_handle.read()).hexdigest()
+	return framework_digest
+
+global failed_manifests
+failed_manifests = {}
+
+def get_manifest(p_name, commit_id, manifests=None) -> dict:
+	"""
+	Cached manifest of p_name at commit_id, None if the pipeline does not import
+	"""
+	global failed_manifests
+	if manifests is None:
+		manifests = local_history("pipeline_manifests")
+	key = p_name + ":" + commit_id + ":" + framework_hash()
+	manifest = manifests.get(key)
+	if manifest is not None:
+		return manifest
+	if failed_manifests.get(p_name) == key:
+		return None
+	print("Generating manifest of", p_name, "at", commit_id)
+	try:
+		manifest = build_manifest(p_name)
+	except Exception as e:
+		# Retried on the next commit or restart
+		print("FAILED to generate manifest of", p_name, e)
+		traceback.print_exc()
+		failed_manifests[p_name] = key
+		return None
+	manifests[key] = manifest
+	return manifest
+
+def get_all_manifests(debug=False) -> dict:
+	"""
+	Same as all_pipelines_git.get_all_inputs, but the pipelines are lazy_pipeline
+	"""
+	from .all_pipelines_git import read_remote_pipelines, sync_repos
+	with span("git_sync"):
+		synced = sync_repos(read_remote_pipelines(), debug=debug)
+	manifests = local_history("pipeline_manifests")
+	final_pipelines = {}
+	for p_name in sorted(synced):
+		if p_name in ["template", "__pycache__", "README.md"]:
+			continue
+		latest_commit = synced[p_name][0]
+		with span("pipeline_import", pipeline=p_name):
+			manifest = get_manifest(p_name, latest_commit.hexsha, manifests)
+		if manifest is None:
+			continue
+		final_pipelines[p_name] = {
+			'pipeline': lazy_pipeline(p_name, latest_commit.hexsha, manifest),
+			'git_data': latest_commit
+		}
+	return final_pipelines
+
+
+if __name__ == "__main__":
+	p_name, manifest_json = sys.argv[1], sys.argv[2]
+	manifest = generate_manifest(p_name)
+	with open(manifest_json, 'w') as manifest_handle:
+		json.dump(manifest, manifest_handle)
@@ -14,6 +14,7 @@ import datetime
 
 
 from constants import DATASET_DIR, MODEL_TESTING, DATA_BASE_DIR, MODEL_BASE
+from predictions_store import predictions_exist, read_predictions
 from pipeline_input import pipeline_input
 
 def vizualize_model(p_input: pipeline_input, interpreter_name: str, dataset_name: str, model_name: str, visualizer_name: str):
@@ -51,9 +52,9 @@ def vizualize_model(p_input: pipeline_input, interpreter_name: str, dataset_name
 
 
 	results_pkl = os.path.join(testing_dir, "results.pkl")
-	predictions_pkl = os.path.join(testing_dir, "predictions.pkl")
+	predictions_dir = testing_dir
 
-	if not os.path.exists(results_pkl) or not os.path.exists(predictions_pkl):
+	if not os.path.exists(results_pkl) or not predictions_exist(predictions_dir):
 		print("Analysis data for the given combination has not been generated yet")
 		exit()
 
@@ -69,9 +70,7 @@ def vizualize_model(p_input: pipeline_input, interpreter_name: str, dataset_name
 	results = pickle.load(results_handle)
 	results_handle.close()
 
-	predictions_handle = open(predictions_pkl, 'rb')
-	predictions = pickle.load(predictions_handle)
-	predictions_handle.close()
+	predictions = read_predictions(predictions_dir)
 
 	print("-"*10)
 	print("model_name:\t",model_name)
@@ -0,0 +1,193 @@
+"""
+planner
+
+Decides which artifacts need to be (re)built.
+Every artifact (model training/testing outputs, visuals, ensemble outputs)
+is described by the hashes of the inputs that produced it:
+ - the source hash of the model/ensemble class
+ - the source hash of the dataset interpreter
+ - the fingerprint of the dataset directory
+ - the source hash of the visualizer
+ - the digests of the upstream artifacts it consumes, the analysis of a
+   model that learns counts its training as one
+These digests are stored in a persistent manifest along with the commit_id
+directory the outputs were written to. A node is only scheduled when its
+digest differs from the manifest; everything else reuses the previous outputs.
+"""
+
+import os
+import glob
+import json
+import hashlib
+
+from .constants import DATASET_DIR
+from .pipeline_manifest import class_hash, frozen_train_sample
+from .dataset_cache import dataset_fingerprint
+
+def inputs_digest(inputs: dict) -> str:
+	return hashlib.sha1(json.dumps(inputs, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class planned_task:
+
+	def __init__(self, node_id, stage, pipeline_name, interpreter_name, dataset_dir, name, inputs, deps=(), visualizer_name=None, mode=None) -> None:
+		self.node_id = node_id
+		self.stage = stage
+		self.pipeline_name = pipeline_name
+		self.interpreter_name = interpreter_name
+		self.dataset_dir = dataset_dir
+		self.name = name
+		self.visualizer_name = visualizer_name
+		self.mode = mode
+		self.inputs = inputs
+		self.digest = inputs_digest(inputs)
+		self.deps = list(deps)
+		# Set by task_planner.plan
+		self.stale = True
+		self.blocked = False
+		self.commit_id = None
+		self.model_commit_ids = {}
+
+	def artifact_key(self) -> str:
+		return ":".join(self.node_id)
+
+	def __repr__(self):
+		return "planned_task(" + self.artifact_key() + ", stale=" + str(self.stale) + ")"
+
+
+class task_planner:
+
+	def __init__(self, manifest) -> None:
+		# manifest: dict like store of artifact_key -> {'digest', 'commit_id', 'status', 'inputs'}
+		self.manifest = manifest
+		self.entries = {}
+
+	def plan(self, all_inputs) -> dict:
+		"""
+		Returns {node_id: planned_task} for every artifact of every pipeline
+		Only tasks with stale=True and blocked=False have to be run
+		"""
+		planned = {}
+		# One read of the whole manifest instead of a lookup per task
+		self.entries = dict(self.manifest.items())
+		for pipeline_name in all_inputs:
+			pipeline = all_inputs[pipeline_name]['pipeline']
+			commit_id = all_inputs[pipeline_name]['git_data'].hexsha
+			all_dataset_dir = DATASET_DIR.format(pipeline_name=pipeline_name)
+			interpreters = pipeline.get_pipeline_dataset_interpreter()
+			model_classes = pipeline.get_pipeline_model()
+			ensemble_classes = pipeline.get_pipeline_ensemble()
+			visualizers = pipeline.get_pipeline_visualizer()
+
+			model_hashes = {name: class_hash(model_classes[name]) for name in model_classes}
+			ensemble_hashes = {name: class_hash(ensemble_classes[name]) for name in ensemble_classes}
+			visualizer_hashes = {name: class_hash(visualizers[name]) for name in visualizers}
+
+			for interpreter_name in interpreters:
+				interpreter_hash = class_hash(interpreters[interpreter_name])
+				interpreter_dataset_dir = os.path.join(all_dataset_dir, interpreter_name)
+				for dataset_dir in sorted(glob.glob(os.path.join(interpreter_dataset_dir, "*"))):
+					fingerprint = dataset_fingerprint(dataset_dir)
+					model_tasks = {'train': {}, 'analyze': {}}
+					for model_name in model_classes:
+						train_sample = frozen_train_sample(model_classes[model_name])
+						for stage in ('train', 'analyze'):
+							inputs = {
+								'stage': stage,
+								'model': model_hashes[model_name],
+								'interpreter': interpreter_hash,
+								'dataset': fingerprint,
+							}
+							if stage == 'train' and train_sample is not None:
+								if train_sample == 0:
+									# Frozen models have nothing to do on the train split
+									continue
+								inputs['train_sample'] = train_sample
+							upstreams = []
+							if stage == 'analyze' and train_sample is None:
+								# A model that learns is only analyzed once its training succeeded
+								upstreams = [model_tasks['train'][model_name]]
+								inputs['train'] = upstreams[0].digest
+							task = planned_task(
+								(stage, pipeline_name, interpreter_name, dataset_dir, model_name),
+								stage, pipeline_name, interpreter_name, dataset_dir, model_name,
+								inputs,
+								deps=[upstream.node_id for upstream in upstreams]
+							)
+							self.resolve(task, upstreams, commit_id)
+							planned[task.node_id] = task
+							model_tasks[stage][model_name] = task
+
+						for visualizer_name in visualizers:
+							for mode, upstream in (('train', model_tasks['train'].get(model_name)), ('test', model_tasks['analyze'][model_name])):
+								if upstream is None:
+									continue
+								task = planned_task(
+									('visualize', pipeline_name, interpreter_name, dataset_dir, model_name, visualizer_name, mode),
+									'visualize', pipeline_name, interpreter_name, dataset_dir, model_name,
+									{
+										'visualizer': visualizer_hashes[visualizer_name],
+										'upstream': upstream.digest,
+									},
+									deps=[upstream.node_id], visualizer_name=visualizer_name, mode=mode
+								)
+								self.resolve(task, [upstream], commit_id)
+								# Visuals live next to the model outputs they were made from
+								task.commit_id = upstream.commit_id
+								planned[task.node_id] = task
+
+					for ensemble_name in ensemble_classes:
+						ensemble_train = None
+						for stage, model_stage in (('ensemble_train', 'train'), ('ensemble_analyze', 'analyze')):
+							upstreams = [model_tasks[model_stage][model_name] for model_name in model_classes if model_name in model_tasks[model_stage]]
+							if stage == 'ensemble_train' and len(upstreams) == 0:
+								# Every model is frozen, there are no train predictions to ensemble
+								continue
+							inputs = {
+								'stage': stage,
+								'ensemble': ensemble_hashes[ensemble_name],
+								'interpreter': interpreter_hash,
+								'dataset': fingerprint,
+								'models': {upstream.name: upstream.digest for upstream in upstreams},
+							}
+							if ensemble_train is not None:
+								upstreams.append(ensemble_train)
+								inputs['ensemble_train'] = ensemble_train.digest
+							task = planned_task(
+								(stage, pipeline_name, interpreter_name, dataset_dir, ensemble_name),
+								stage, pipeline_name, interpreter_name, dataset_dir, ensemble_name,
+								inputs,
+								deps=[upstream.node_id for upstream in upstreams]
+							)
+							self.resolve(task, upstreams, commit_id)
+							task.model_commit_ids = {upstream.name: upstream.commit_id for upstream in upstreams if upstream.stage in ('train', 'analyze')}
+							planned[task.node_id] = task
+							ensemble_train = task
+		return planned
+
+	def resolve(self, task, upstreams, commit_id) -> None:
+		entry = self.entries.get(task.artifact_key())
+		upstream_stale = any(upstream.stale for upstream in upstreams)
+		task.stale = upstream_stale or entry is None or entry['digest'] != task.digest
+		# A fresh upstream that failed has nothing to consume until its inputs change
+		task.blocked = any(upstream.blocked or (not upstream.stale and self.status(upstream)!='SUCCESS') for upstream in upstreams)
+		if task.stale:
+			task.commit_id = commit_id
+		else:
+			task.commit_id = entry['commit_id']
+
+	def status(self, task) -> str:
+		entry = self.entries.get(task.artifact_key())
+		if entry is None:
+			return None
+		return entry['status']
+
+	def record(self, task, status) -> None:
+		entry = {
+			'digest': task.digest,
+			'commit_id': task.commit_id,
+			'status': 'SUCCESS' if status else 'FAILED',
+			'inputs': task.inputs,
+		}
+		self.manifest[task.artifact_key()] = entry
+		self.entries[task.artifact_key()] = entry
@@ -0,0 +1,198 @@
+"""
+prediction_cache
+
+Per item predictions of batched_predict kept across runs and dataset
+versions. An entry is keyed by the model (its class and source hash and the
+contents of its weights file) and by the contents of the item, where image
+paths count as the bytes of the file. A re-ingested dataset version that is a
+copy of the last one with a few new frames only runs the model over the new
+frames.
+Entries are stored pickled in one SQLite file, PREDICTION_CACHE_DB, shared by
+the workers. Once it holds more than PREDICTION_CACHE_SIZE bytes the least
+recently used entries are evicted.
+Only models whose predict_batch output can be split per item take part, see
+pipeline_model.split_predictions. By default these are frozen models and models
+loading a weights file, a model that learns in train() is not keyed on what it
+learnt.
+"""
+
+import os
+import time
+import pickle
+import sqlite3
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from .constants import PREDICTION_CACHE, PREDICTION_CACHE_DB, PREDICTION_CACHE_SIZE
+
+HASH_CHUNK = 1024**2
+# Keys per SELECT, below SQLite's limit on bound parameters
+LOOKUP_CHUNK = 500
+
+global file_digests
+# (path, size, mtime) -> sha1 of the file
+file_digests = {}
+
+def file_digest(path) -> str:
+	stat = os.stat(path)
+	key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+	if key not in file_digests:
+		digest = hashlib.sha1()
+		with open(path, 'rb') as file_handle:
+			for chunk in iter(lambda: file_handle.read(HASH_CHUNK), b''):
+				digest.update(chunk)
+		file_digests[key] = digest.hexdigest()
+	return file_digests[key]
+
+def update_digest(digest, value) -> bool:
+	"""
+	Adds the contents of value to digest, False for values that have no content hash
+	"""
+	if isinstance(value, str):
+		if os.path.isfile(value):
+			digest.update(b"file:" + file_digest(value).encode())
+		else:
+			digest.update(b"str:" + str(len(value)).encode() + b":" + value.encode())
+	elif isinstance(value, np.ndarray):
+		digest.update(b"array:" + str(value.dtype).encode() + str(value.shape).encode())
+		if value.dtype == object:
+			return all(update_digest(digest, element) for element in value.ravel())
+		digest.update(np.ascontiguousarray(value).tobytes())
+	elif isinstance(value, pd.Series):
+		# A DataFrame row, e.g. the image and label paths of one seg item
+		digest.update(b"row:" + str(list(value.index)).encode())
+		return all(update_digest(digest, element) for element in value.values)
+	elif isinstance(value, (list, tuple)):
+		digest.update(b"list:" + str(len(value)).encode())
+		return all(update_digest(digest, element) for element in value)
+	elif value is None or isinstance(value, (bool, int, float, np.number)):
+		digest.update(b"value:" + repr(value).encode())
+	else:
+		return False
+	return True
+
+def item_key(item) -> str:
+	"""
+	Content hash of one item of x, None if it can not be cached
+	"""
+	digest = hashlib.sha1()
+	if not update_digest(digest, item):
+		return None
+	return digest.hexdigest()
+
+def caches_predictions(mod) -> bool:
+	cache_predictions = getattr(mod, 'cache_predictions', None)
+	if cache_predictions is None:
+		return PREDICTION_CACHE and bool(getattr(mod, 'frozen', False) or getattr(mod, 'weights', None) is not None)
+	return bool(cache_predictions)
+
+def model_key(mod) -> str:
+	"""
+	Key of a loaded model, the weights are the ones the instance loaded
+	"""
+	from .pipeline_input import source_hash
+	model_class = type(mod)
+	digest = hashlib.sha1()
+	digest.update((model_class.__module__ + "." + model_class.__qualname__).encode())
+	digest.update(str(source_hash(model_class)).encode())
+	weights = getattr(mod, 'weights', None)
+	if weights is not None:
+		digest.update((file_digest(weights) if os.path.isfile(weights) else str(weights)).encode())
+	return digest.hexdigest()
+
+class prediction_cache:
+
+	def __init__(self, db_path=PREDICTION_CACHE_DB, max_size=PREDICTION_CACHE_SIZE) -> None:
+		self.db_path = db_path
+		self.max_size = max_size
+		self.connection = None
+		# Bytes held, summed once on connect and kept up to date by put_many and evict
+		self.total = 0
+		self.hits = 0
+		self.misses = 0
+
+	def connect(self) -> sqlite3.Connection:
+		# Opened by the process using it, connections do not survive spawn
+		if self.connection is None:
+			os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+			self.connection = sqlite3.connect(self.db_path, timeout=60)
+			self.connection.execute("PRAGMA journal_mode=WAL")
+			self.connection.execute("CREATE TABLE IF NOT EXISTS predictions (model TEXT, item TEXT, value BLOB, size INTEGER, used REAL, PRIMARY KEY (model, item))")
+			self.connection.execute("CREATE INDEX IF NOT EXISTS predictions_used ON predictions (used)")
+			self.connection.commit()
+			self.total = self.size()
+		return self.connection
+
+	def get_many(self, model, items) -> dict:
+		"""
+		{item key: prediction} of the given item keys cached for model
+		"""
+		connection = self.connect()
+		items = list(set(items))
+		found = {}
+		for start in range(0, len(items), LOOKUP_CHUNK):
+			chunk = items[start:start + LOOKUP_CHUNK]
+			rows = connection.execute(
+				"SELECT item, value FROM predictions WHERE model = ? AND item IN (" + ",".join("?" * len(chunk)) + ")",
+				[model] + chunk
+			).fetchall()
+			for item, value in rows:
+				found[item] = pickle.loads(value)
+		if found:
+			connection.executemany("UPDATE predictions SET used = ? WHERE model = ? AND item = ?", [(time.time(), model, item) for item in found])
+			connection.commit()
+		self.hits += len(found)
+		self.misses += len(items) - len(found)
+		return found
+
+	def put_many(self, model, entries) -> None:
+		"""
+		entries: [(item key, prediction), ...]
+		"""
+		connection = self.connect()
+		rows = []
+		for item, prediction in entries:
+			value = pickle.dumps(prediction, protocol=pickle.HIGHEST_PROTOCOL)
+			rows.append((model, item, value, len(value), time.time()))
+		connection.executemany("INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?, ?)", rows)
+		connection.commit()
+		# Replaced entries are counted twice, evict re-sums before deleting anything
+		self.total += sum(row[3] for row in rows)
+		self.evict()
+
+	def size(self) -> int:
+		return self.connect().execute("SELECT COALESCE(SUM(size), 0) FROM predictions").fetchone()[0]
+
+	def evict(self) -> None:
+		if self.total <= self.max_size:
+			return
+		# Other workers write to the same file, only their entries make the sum exact
+		size = self.size()
+		self.total = size
+		if size <= self.max_size:
+			return
+		# Down to 90% of the budget, so the next few puts do not evict again
+		excess = size - int(self.max_size * 0.9)
+		connection = self.connect()
+		evicted = []
+		for rowid, entry_size in connection.execute("SELECT rowid, size FROM predictions ORDER BY used"):
+			if excess <= 0:
+				break
+			evicted.append((rowid,))
+			excess -= entry_size
+			self.total -= entry_size
+		connection.executemany("DELETE FROM predictions WHERE rowid = ?", evicted)
+		connection.commit()
+		print("Prediction cache: evicted", len(evicted), "entries")
+
+
+global default_cache
+default_cache = None
+
+def get_prediction_cache() -> prediction_cache:
+	global default_cache
+	if default_cache is None:
+		default_cache = prediction_cache()
+	return default_cache
@@ -0,0 +1,182 @@
+"""
+predictions_store
+
+Predictions of the train, analyze and ensemble stages on disk. DataFrames
+are written as Parquet with their rows grouped by image and a row group per
+PREDICTIONS_IMAGES_PER_GROUP images, so a reader that asks for a few images
+and columns only decodes the row groups and column chunks holding them.
+Predictions Arrow can not represent (arrays, detectron2 structures, ...) and
+runs written by older versions stay in predictions.pkl.
+The CSV export is generated on demand by predictions_csv.
+"""
+
+import os
+import sys
+import pickle
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .constants import PREDICTIONS_IMAGES_PER_GROUP
+from .tracing import span
+
+PREDICTIONS_PARQUET = "predictions.parquet"
+PREDICTIONS_PKL = "predictions.pkl"
+PREDICTIONS_CSV = "predictions.csv"
+# Columns identifying the image a prediction belongs to, in order of preference
+IMAGE_COLUMNS = ('image', 'image_2', 'input_full')
+# Position of the row in the DataFrame that was written
+ROW_COLUMN = "__prediction_row__"
+
+def image_column(columns) -> str:
+	for column in IMAGE_COLUMNS:
+		if column in columns:
+			return column
+	return None
+
+def remove(path) -> None:
+	if os.path.exists(path):
+		os.remove(path)
+
+def write_parquet(parquet_path, predictions) -> None:
+	column = image_column(predictions.columns)
+	predictions = predictions.assign(**{ROW_COLUMN: range(len(predictions))})
+	if column is None:
+		groups = [predictions]
+	else:
+		predictions = predictions.sort_values(column, kind='stable')
+		images = predictions[column].unique()
+		groups = []
+		for start in range(0, len(images), PREDICTIONS_IMAGES_PER_GROUP):
+			groups.append(predictions[predictions[column].isin(images[start:start+PREDICTIONS_IMAGES_PER_GROUP])])
+	schema = pa.Schema.from_pandas(predictions, preserve_index=True)
+	tmp_path = parquet_path + "." + str(os.getpid()) + ".tmp"
+	try:
+		with pq.ParquetWriter(tmp_path, schema) as writer:
+			for group in groups:
+				writer.write_table(pa.Table.from_pandas(group, schema=schema, preserve_index=True))
+		os.replace(tmp_path, parquet_path)
+	finally:
+		remove(tmp_path)
+
+def write_predictions(directory, predictions) -> str:
+	"""
+	Writes predictions to directory, returns the path written
+	"""
+	parquet_path = os.path.join(directory, PREDICTIONS_PARQUET)
+	pkl_path = os.path.join(directory, PREDICTIONS_PKL)
+	remove(os.path.join(directory, PREDICTIONS_CSV))
+	if hasattr(predictions, 'to_dataframe'):
+		# Compact pipeline containers are stored through their DataFrame form
+		predictions = predictions.to_dataframe()
+	if isinstance(predictions, pd.DataFrame):
+		try:
+			with span("write_predictions", rows=len(predictions)):
+				write_parquet(parquet_path, predictions)
+			remove(pkl_path)
+			return parquet_path
+		except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError, TypeError, ValueError) as ex:
+			print("Predictions not stored as Parquet:", ex)
+	with span("pickle_dump", path=pkl_path):
+		predictions_handle = open(pkl_path, 'wb')
+		pickle.dump(predictions, predictions_handle, protocol=pickle.HIGHEST_PROTOCOL)
+		predictions_handle.close()
+	remove(parquet_path)
+	return pkl_path
+
+def predictions_exist(directory) -> bool:
+	return os.path.exists(os.path.join(directory, PREDICTIONS_PARQUET)) or os.path.exists(os.path.join(directory, PREDICTIONS_PKL))
+
+def read_predictions(directory, columns=None, images=None):
+	"""
+	Predictions stored in directory, only the given columns and the rows of the given images if set
+	"""
+	return predictions_reader(directory).read(columns, images)
+
+
+class predictions_reader:
+	"""
+	Lazy view of the predictions in directory, nothing is read until asked for
+	"""
+
+	def __init__(self, directory) -> None:
+		self.directory = directory
+		self.parquet_path = os.path.join(directory, PREDICTIONS_PARQUET)
+		self.pkl_path = os.path.join(directory, PREDICTIONS_PKL)
+		self.parquet = os.path.exists(self.parquet_path)
+		assert self.parquet or os.path.exists(self.pkl_path), "No predictions in " + directory
+		self.loaded = None
+		self.all_predictions = None
+
+	def load(self):
+		# Whole pickled predictions, older runs and predictions Parquet can not hold
+		if self.loaded is None:
+			predictions_handle = open(self.pkl_path, 'rb')
+			self.loaded = pickle.load(predictions_handle)
+			predictions_handle.close()
+		return self.loaded
+
+	@property
+	def columns(self) -> list:
+		if self.parquet:
+			return [name for name in pq.read_schema(self.parquet_path).names if name != ROW_COLUMN and not name.startswith("__index_level_")]
+		return list(self.load().columns)
+
+	@property
+	def image_column(self) -> str:
+		return image_column(self.columns)
+
+	def images(self) -> list:
+		column = self.image_column
+		assert column is not None, "Predictions in " + self.directory + " have no image column"
+		return list(self.read(columns=[column])[column].unique())
+
+	def read(self, columns=None, images=None):
+		if not self.parquet:
+			predictions = self.load()
+			if images is not None:
+				predictions = predictions[predictions[image_column(predictions.columns)].isin(images)]
+			if columns is not None:
+				predictions = predictions[columns]
+			return predictions
+
+		read_columns = None
+		if columns is not None:
+			read_columns = list(columns) + [ROW_COLUMN]
+		filters = None
+		if images is not None:
+			filters = [(self.image_column, 'in', list(images))]
+		table = pq.read_table(self.parquet_path, columns=read_columns, filters=filters, use_pandas_metadata=True)
+		predictions = table.to_pandas()
+		return predictions.sort_values(ROW_COLUMN, kind='stable').drop(columns=ROW_COLUMN)
+
+	def read_all(self):
+		# Every prediction, read once
+		if self.all_predictions is None:
+			self.all_predictions = self.read()
+		return self.all_predictions
+
+	def __len__(self):
+		if self.parquet:
+			return pq.ParquetFile(self.parquet_path).metadata.num_rows
+		return len(self.load())
+
+
+def predictions_csv(directory) -> str:
+	"""
+	CSV export of the predictions in directory, regenerated when the predictions are newer
+	"""
+	csv_path = os.path.join(directory, PREDICTIONS_CSV)
+	reader = predictions_reader(directory)
+	source_path = reader.parquet_path if reader.parquet else reader.pkl_path
+	if not os.path.exists(csv_path) or os.path.getmtime(csv_path) < os.path.getmtime(source_path):
+		with span("csv_export", path=csv_path):
+			reader.read().to_csv(csv_path)
+	return csv_path
+
+
+if __name__ == "__main__":
+	# python -m ML_Ops_Pipeline.predictions_store <training or testing dir> ...
+	for directory in sys.argv[1:]:
+		print(predictions_csv(directory))
@@ -0,0 +1,127 @@
+"""
+resource_usage
+
+CPU time and memory of a task, measured by every tracked run:
+ - user and system CPU of the process and of its waited for children (getrusage)
+ - peak RSS (VmHWM of /proc/self/status), reset when the task starts so it is
+   the peak of this task and not of the worker's earlier tasks
+ - with RESOURCE_TRACEMALLOC=1, the peak of the Python allocations and the
+   RESOURCE_TRACEMALLOC_TOP source lines holding the most memory at the end
+The usage is logged as resources.<name> metrics of the run and, for the stages
+that pass resources_json to start_run, written next to their status.txt.
+"""
+
+import sys
+import json
+import time
+import resource
+import tracemalloc
+
+from .constants import RESOURCE_TRACEMALLOC, RESOURCE_TRACEMALLOC_TOP
+
+def proc_status() -> dict:
+	"""
+	Memory fields of /proc/self/status in bytes, {} where /proc is not available
+	"""
+	status = {}
+	try:
+		with open("/proc/self/status") as status_handle:
+			for line in status_handle:
+				name, _, value = line.partition(":")
+				value = value.split()
+				if name.startswith("Vm") and len(value) == 2 and value[1] == "kB":
+					status[name] = int(value[0]) * 1024
+	except OSError:
+		pass
+	return status
+
+def reset_peak_rss() -> bool:
+	# Linux resets VmHWM to the current RSS when 5 is written to clear_refs
+	try:
+		with open("/proc/self/clear_refs", "w") as clear_refs:
+			clear_refs.write("5")
+		return True
+	except OSError:
+		return False
+
+def peak_rss() -> int:
+	status = proc_status()
+	if 'VmHWM' in status:
+		return status['VmHWM']
+	# ru_maxrss is in kB on Linux and in bytes on macOS
+	max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+def current_rss() -> int:
+	return proc_status().get('VmRSS', 0)
+
+
+# Measurements running in this process, the outermost one resets the peak
+active_usages = []
+
+class resource_usage:
+
+	def __init__(self, tracemalloc_top=None) -> None:
+		"""
+		tracemalloc_top: allocation sites to report, defaults to RESOURCE_TRACEMALLOC_TOP with RESOURCE_TRACEMALLOC=1, 0 to skip tracemalloc
+		"""
+		if tracemalloc_top is None:
+			tracemalloc_top = RESOURCE_TRACEMALLOC_TOP if RESOURCE_TRACEMALLOC else 0
+		self.tracemalloc_top = tracemalloc_top
+		self.started_tracemalloc = False
+		self.usage = None
+
+	def start(self) -> None:
+		self.peak_reset = len(active_usages) == 0 and reset_peak_rss()
+		active_usages.append(self)
+		if self.tracemalloc_top and not tracemalloc.is_tracing():
+			tracemalloc.start()
+			self.started_tracemalloc = True
+		self.start_time = time.time()
+		self.start_rss = current_rss()
+		self.start_self = resource.getrusage(resource.RUSAGE_SELF)
+		self.start_children = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+	def stop(self) -> dict:
+		end_self = resource.getrusage(resource.RUSAGE_SELF)
+		end_children = resource.getrusage(resource.RUSAGE_CHILDREN)
+		active_usages.remove(self)
+		self.usage = {
+			'wall_time': time.time() - self.start_time,
+			'cpu_user': end_self.ru_utime - self.start_self.ru_utime,
+			'cpu_system': end_self.ru_stime - self.start_self.ru_stime,
+			'children_cpu_user': end_children.ru_utime - self.start_children.ru_utime,
+			'children_cpu_system': end_children.ru_stime - self.start_children.ru_stime,
+			'rss_start': self.start_rss,
+			'rss_end': current_rss(),
+			'peak_rss': peak_rss(),
+			# Without the reset peak_rss is the peak of the whole worker process so far
+			'peak_rss_reset': bool(self.peak_reset),
+		}
+		if self.tracemalloc_top and tracemalloc.is_tracing():
+			self.usage['tracemalloc_peak'] = tracemalloc.get_traced_memory()[1]
+			statistics = tracemalloc.take_snapshot().statistics('lineno')
+			self.usage['top_allocations'] = [
+				{'site': str(stat.traceback), 'size': stat.size, 'count': stat.count}
+				for stat in statistics[:self.tracemalloc_top]
+			]
+		if self.started_tracemalloc:
+			tracemalloc.stop()
+		return self.usage
+
+	def metrics(self) -> dict:
+		# Numeric entries only, the allocation sites stay in the JSON
+		return {key: value for key, value in self.usage.items() if isinstance(value, (int, float)) and not isinstance(value, bool)}
+
+	def write(self, path) -> str:
+		with open(path, 'w') as usage_handle:
+			json.dump(self.usage, usage_handle, indent=4)
+		return path
+
+	def __enter__(self):
+		self.start()
+		return self
+
+	def __exit__(self, exc_type, exc_value, exc_traceback):
+		self.stop()
+		return False
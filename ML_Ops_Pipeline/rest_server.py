@@ -1,4 +1,4 @@
-from flask import Flask, json, jsonify
+from flask import Flask, json, jsonify, request
 
 from datetime import datetime
 import os
@@ -9,6 +9,9 @@ from constants import DATASET_DIR, DATA_BASE_DIR, MODEL_BASE, MODEL_TESTING, ENS
 import pickle
 from flask_cors import CORS
 
+# Pipeline listed when the request has no ?pipeline=
+DEFAULT_PIPELINE = "obj_det"
+
 api = Flask(__name__)
 CORS(api)
 
@@ -38,7 +41,7 @@ def get_pipelines_code():
 
 @api.route('/datasets', methods=['GET'])
 def get_datasets():
-	pipeline_name = "obj_det"
+	pipeline_name = request.args.get('pipeline', DEFAULT_PIPELINE)
 	datasets_list = []
 	all_dataset_dir = DATASET_DIR.format(pipeline_name=pipeline_name)
 	interpreters = os.listdir(all_dataset_dir)
@@ -58,40 +61,14 @@ def get_datasets():
 
 @api.route('/models', methods=['GET'])
 def get_models():
-	pipeline_name = "obj_det"
-	#pipeline_name = "depth_det"
+	pipeline_name = request.args.get('pipeline', DEFAULT_PIPELINE)
 	models_list = []
 	all_models_dir = MODEL_BASE.format(pipeline_name=pipeline_name)
 	models = os.listdir(all_models_dir)
 	for index, model_name in enumerate(models):
 		model_dir = os.path.join(all_models_dir, model_name)
 		time_stamp = model_dir.split("/")[-1]
-		scores_list = []
-		interpreters = os.listdir(os.path.join(model_dir, "testing"))
-		for interpreter_name in interpreters:
-			testing_dir = MODEL_TESTING.format(
-				pipeline_name=pipeline_name,
-				interpreter_name=interpreter_name,
-				model_name=model_name
-			)
-			results_pkl = os.path.join(testing_dir, "results.pkl")
-			try:
-				results_handle = open(results_pkl, 'rb')
-				results = pickle.load(results_handle)
-				results_handle.close()
-
-				scores_list.append({
-					"interpreter": interpreter_name,
-					"results": results
-				})
-			except Exception as ex:
-				print(ex)
-				scores_list.append({
-					"interpreter": interpreter_name,
-					"results": None,
-					"error": ex
-				})
-				
+		scores_list = get_scores(pipeline_name, model_dir, MODEL_TESTING, model_name=model_name)
 		models_list.append({
 			"indexNumber": index+1,
 			"model": model_name,
@@ -108,21 +85,42 @@ def get_models():
 
 @api.route('/ensembles', methods=['GET'])
 def get_ensembles():
-	pipeline_name = "obj_det"
-	#pipeline_name = "depth_det"
+	pipeline_name = request.args.get('pipeline', DEFAULT_PIPELINE)
 	ensembles_list = []
 	all_ensembles_dir = ENSEMBLE_BASE.format(pipeline_name=pipeline_name)
 	ensembles = os.listdir(all_ensembles_dir)
 	for index, ensemble_name in enumerate(ensembles):
 		ensemble_dir = os.path.join(all_ensembles_dir, ensemble_name)
 		time_stamp = ensemble_dir.split("/")[-1]
-		scores_list = []
-		interpreters = os.listdir(os.path.join(ensemble_dir, "testing"))
-		for interpreter_name in interpreters:
-			testing_dir = ENSEMBLE_TESTING.format(
+		scores_list = get_scores(pipeline_name, ensemble_dir, ENSEMBLE_TESTING, ensemble_name=ensemble_name)
+		ensembles_list.append({
+			"indexNumber": index+1,
+			"ensemble": ensemble_name,
+			"size": sizeof_fmt(get_size(ensemble_dir)),
+			"issueDate": time_stamp,
+			"name": ensemble_name,
+			"score": str(scores_list),
+			"scores_list": scores_list,
+			"status": "Done",
+			"last_update": datetime.fromtimestamp(os.path.getmtime(ensemble_dir))
+		})
+	return jsonify({'ensembles': ensembles_list})
+
+##################################
+
+def get_scores(pipeline_name, base_dir, testing_format, **names):
+	# Test results of every commit and interpreter, laid out as <base_dir>/<commit_id>/testing/<interpreter_name>
+	scores_list = []
+	for commit_id in sorted(os.listdir(base_dir)):
+		commit_testing_dir = os.path.join(base_dir, commit_id, "testing")
+		if not os.path.isdir(commit_testing_dir):
+			continue
+		for interpreter_name in os.listdir(commit_testing_dir):
+			testing_dir = testing_format.format(
 				pipeline_name=pipeline_name,
 				interpreter_name=interpreter_name,
-				ensembler_name=ensemble_name
+				commit_id=commit_id,
+				**names
 			)
 			results_pkl = os.path.join(testing_dir, "results.pkl")
 			try:
@@ -132,30 +130,18 @@ def get_ensembles():
 
 				scores_list.append({
 					"interpreter": interpreter_name,
+					"commit_id": commit_id,
 					"results": results
 				})
 			except Exception as ex:
 				print(ex)
 				scores_list.append({
 					"interpreter": interpreter_name,
+					"commit_id": commit_id,
 					"results": None,
-					"error": ex
+					"error": str(ex)
 				})
-				
-		ensembles_list.append({
-			"indexNumber": index+1,
-			"ensemble": ensemble_name,
-			"size": sizeof_fmt(get_size(ensemble_dir)),
-			"issueDate": time_stamp,
-			"name": ensemble_name,
-			"score": str(scores_list),
-			"scores_list": scores_list,
-			"status": "Done",
-			"last_update": datetime.fromtimestamp(os.path.getmtime(ensemble_dir))
-		})
-	return jsonify({'ensembles': ensembles_list})
-
-##################################
+	return scores_list
 
 def get_size(start_path):
 	total_size = 0
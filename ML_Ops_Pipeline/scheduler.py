@@ -0,0 +1,314 @@
+"""
+scheduler
+
+Runs the train -> analyze -> visualize -> ensemble stages of every
+(pipeline, interpreter, dataset, model) as a dependency graph.
+A node is submitted to the worker pool as soon as all of its dependencies
+have succeeded, so one slow model no longer holds back unrelated tasks.
+The on_start and on_done callbacks of a node run in the scheduling process when that
+node is submitted and finishes, which is where main_git writes to the history.
+Nodes sharing an affinity key are preferably sent to the worker that last ran
+that key, so state kept in the worker (the model_pool) is reused.
+A group runs several member nodes in one call, e.g. train and analyze of a
+model sharing the loaded model and dataset. Its function returns one result
+per member and every member finishes on its own, so a failed member only
+skips its own dependents.
+on_shutdown, given to run, is called once in every worker before the workers
+exit, e.g. to wait for the artifact uploads the tasks left in the background.
+A worker that dies (OOM kill, os._exit) fails the node it was running and is
+replaced by a fresh process, the rest of the graph keeps running.
+"""
+
+import traceback
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+PENDING = "PENDING"
+RUNNING = "RUNNING"
+SUCCESS = "SUCCESS"
+FAILED = "FAILED"
+SKIPPED = "SKIPPED"
+
+class task_node:
+
+	def __init__(self, node_id, func, args, deps=(), after=(), on_done=None, affinity=None, on_start=None) -> None:
+		self.node_id = node_id
+		self.func = func
+		self.args = args
+		# deps must succeed, after only has to finish (ordering constraint)
+		self.deps = list(deps)
+		self.after = list(after)
+		self.on_start = on_start
+		self.on_done = on_done
+		self.affinity = affinity
+		self.state = PENDING
+		self.result = None
+		# Set for groups and for the nodes run by a group
+		self.members = []
+		self.group = None
+
+	def succeeded(self) -> bool:
+		# Stage functions return (status, task_id, ...)
+		if isinstance(self.result, tuple) and len(self.result):
+			return bool(self.result[0])
+		return self.result is not None
+
+	def __repr__(self):
+		return "task_node(" + str(self.node_id) + ", " + self.state + ")"
+
+
+class task_graph:
+
+	def __init__(self) -> None:
+		self.nodes = {}
+
+	def add_task(self, node_id, func, args, deps=(), after=(), on_done=None, affinity=None, on_start=None) -> task_node:
+		assert node_id not in self.nodes, "Duplicate task: " + str(node_id)
+		node = task_node(node_id, func, args, deps, after, on_done, affinity, on_start)
+		self.nodes[node_id] = node
+		return node
+
+	def add_group(self, node_id, func, args, members, affinity=None) -> task_node:
+		"""
+		Runs the member nodes, already added, through a single func(*args) returning a tuple of their results
+		"""
+		assert len(members), "Empty group: " + str(node_id)
+		deps, after = [], []
+		for member_id in members:
+			member = self.nodes[member_id]
+			assert member.group is None and not member.members, str(member_id) + " can not join group " + str(node_id)
+			deps += [dep for dep in member.deps if dep not in members and dep not in deps]
+			after += [dep for dep in member.after if dep not in members and dep not in after]
+		node = self.add_task(node_id, func, args, deps=deps, after=after, affinity=affinity)
+		node.members = list(members)
+		for member_id in members:
+			member = self.nodes[member_id]
+			# The group waits for the dependencies in place of its members, the ones on other members skip them
+			member.deps, member.after = [dep for dep in member.deps if dep in members], []
+			member.group = node_id
+		return node
+
+	def tasks(self) -> dict:
+		# Nodes that stand for a task, groups only bundle them
+		return {node_id: node for node_id, node in self.nodes.items() if not node.members}
+
+	def __len__(self):
+		return len(self.tasks())
+
+	def __contains__(self, node_id):
+		return node_id in self.nodes
+
+	def validate(self) -> None:
+		for node in self.nodes.values():
+			for dep in node.deps + node.after:
+				assert dep in self.nodes, "Unknown dependency " + str(dep) + " of " + str(node.node_id)
+		# Kahn's algorithm, raises on cycles
+		indegree = {node_id: len(node.deps) + len(node.after) for node_id, node in self.nodes.items()}
+		dependents = self.dependents(include_after=True)
+		ready = [node_id for node_id in indegree if indegree[node_id]==0]
+		visited = 0
+		while ready:
+			node_id = ready.pop()
+			visited += 1
+			for child in dependents[node_id]:
+				indegree[child] -= 1
+				if indegree[child]==0:
+					ready.append(child)
+		assert visited == len(self.nodes), "Task graph has a cycle"
+
+	def dependents(self, include_after=False) -> dict:
+		children = {node_id: [] for node_id in self.nodes}
+		for node in self.nodes.values():
+			for dep in node.deps + (node.after if include_after else []):
+				children[dep].append(node.node_id)
+		return children
+
+	def ready_nodes(self) -> list:
+		ready = []
+		for node in self.nodes.values():
+			if node.state != PENDING or node.group is not None:
+				continue
+			if not all(self.nodes[dep].state == SUCCESS for dep in node.deps):
+				continue
+			if all(self.nodes[dep].state in (SUCCESS, FAILED, SKIPPED) for dep in node.after):
+				ready.append(node)
+		return ready
+
+	def skip_dependents(self, node_id) -> None:
+		children = self.dependents()
+		stack = list(children[node_id])
+		while stack:
+			child = stack.pop()
+			if self.nodes[child].state == PENDING:
+				self.nodes[child].state = SKIPPED
+				print("Skipping", child, "because", node_id, "did not succeed")
+				stack.extend(children[child])
+				stack.extend(self.nodes[child].members)
+
+	def start(self, node) -> None:
+		node.state = RUNNING
+		if node.on_start is not None:
+			try:
+				node.on_start(node)
+			except Exception:
+				traceback.print_exc()
+		for member_id in node.members:
+			self.start(self.nodes[member_id])
+
+	def finish(self, node, result) -> None:
+		if node.members:
+			member_results = result if isinstance(result, tuple) and len(result)==len(node.members) else (None,) * len(node.members)
+			for member_id, member_result in zip(node.members, member_results):
+				member = self.nodes[member_id]
+				if all(self.nodes[dep].state == SUCCESS for dep in member.deps):
+					self.finish(member, member_result)
+				else:
+					member.state = SKIPPED
+					print("Skipping", member_id, "because a task of", node.node_id, "did not succeed")
+					self.skip_dependents(member_id)
+			node.result = result
+			node.state = SUCCESS if all(self.nodes[member_id].state == SUCCESS for member_id in node.members) else FAILED
+			return
+		node.result = result
+		node.state = SUCCESS if node.succeeded() else FAILED
+		if node.on_done is not None:
+			try:
+				node.on_done(node, result)
+			except Exception:
+				traceback.print_exc()
+		if node.state != SUCCESS:
+			self.skip_dependents(node.node_id)
+
+	def run(self, workers=2, mp_context=None, on_shutdown=None) -> dict:
+		"""
+		Runs every node of the graph, returns {node_id: state}
+		workers<=0 runs the graph serially in the calling process
+		"""
+		self.validate()
+		if workers <= 0:
+			self.run_serial()
+			if on_shutdown is not None:
+				on_shutdown()
+		else:
+			self.run_pool(workers, mp_context, on_shutdown)
+		return {node_id: node.state for node_id, node in self.tasks().items()}
+
+	def run_serial(self) -> None:
+		ready = self.ready_nodes()
+		while ready:
+			for node in ready:
+				self.start(node)
+				try:
+					result = node.func(*node.args)
+				except KeyboardInterrupt:
+					raise
+				except Exception:
+					traceback.print_exc()
+					result = None
+				self.finish(node, result)
+			ready = self.ready_nodes()
+
+	def run_pool(self, workers, mp_context=None, on_shutdown=None) -> None:
+		# One single process executor per worker so nodes can be routed by affinity
+		slots = [ProcessPoolExecutor(max_workers=1, mp_context=mp_context) for _ in range(workers)]
+		slot_affinity = [None] * workers
+		running = {}
+		self.mp_context = mp_context
+		try:
+			self.submit_ready(slots, slot_affinity, running)
+			# Failed submits leave nothing running while other nodes may still be ready
+			while running or self.ready_nodes():
+				if running:
+					done, _ = wait(running.keys(), return_when=FIRST_COMPLETED)
+				else:
+					done = []
+				for future in done:
+					node, slot = running.pop(future)
+					try:
+						result = future.result()
+					except KeyboardInterrupt:
+						raise
+					except BrokenProcessPool:
+						print("Worker", slot, "died running", node.node_id)
+						traceback.print_exc()
+						self.replace_slot(slots, slot_affinity, slot)
+						result = None
+					except Exception:
+						traceback.print_exc()
+						result = None
+					self.finish(node, result)
+				self.submit_ready(slots, slot_affinity, running)
+		finally:
+			# A worker may have died after its last node or the loop may have raised, every pool is still shut down
+			if on_shutdown is not None:
+				futures = []
+				for slot, pool in enumerate(slots):
+					try:
+						futures.append(pool.submit(on_shutdown))
+					except Exception:
+						print("Worker", slot, "could not run on_shutdown")
+						traceback.print_exc()
+				for future in futures:
+					try:
+						future.result()
+					except Exception:
+						traceback.print_exc()
+			for pool in slots:
+				try:
+					pool.shutdown(wait=True)
+				except Exception:
+					traceback.print_exc()
+
+	def submit_ready(self, slots, slot_affinity, running) -> None:
+		busy = set(slot for node, slot in running.values())
+		idle = [slot for slot in range(len(slots)) if slot not in busy]
+		ready = self.ready_nodes()
+		for slot in list(idle):
+			for node in ready:
+				if node.affinity is not None and node.affinity == slot_affinity[slot]:
+					idle.remove(slot)
+					ready.remove(node)
+					busy.add(slot)
+					self.submit(node, slot, slots, slot_affinity, running)
+					break
+		while idle and ready:
+			slot = idle.pop(0)
+			held = set(slot_affinity[other] for other in range(len(slots)) if other != slot)
+			# Hold back nodes whose affinity belongs to another worker as long as there is other work
+			def preference(node):
+				if node.affinity is not None and node.affinity in held:
+					return 1
+				return 0
+			node = min(ready, key=preference)
+			ready.remove(node)
+			busy.add(slot)
+			self.submit(node, slot, slots, slot_affinity, running)
+
+	def replace_slot(self, slots, slot_affinity, slot) -> None:
+		# The state the dead worker held (the model_pool) is gone with it
+		slots[slot].shutdown(wait=False)
+		slots[slot] = ProcessPoolExecutor(max_workers=1, mp_context=self.mp_context)
+		slot_affinity[slot] = None
+
+	def submit(self, node, slot, slots, slot_affinity, running) -> None:
+		self.start(node)
+		try:
+			try:
+				future = slots[slot].submit(node.func, *node.args)
+			except BrokenProcessPool:
+				# The worker died after its last task finished, the node has not run yet
+				self.replace_slot(slots, slot_affinity, slot)
+				future = slots[slot].submit(node.func, *node.args)
+		except BrokenProcessPool:
+			traceback.print_exc()
+			self.finish(node, None)
+			return
+		if node.affinity is not None:
+			slot_affinity[slot] = node.affinity
+		running[future] = (node, slot)
+
+	def summary(self) -> dict:
+		counts = {}
+		for node in self.tasks().values():
+			counts[node.state] = counts.get(node.state, 0) + 1
+		return counts
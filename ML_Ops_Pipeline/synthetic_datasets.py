@@ -0,0 +1,307 @@
+"""
+synthetic_datasets
+
+Writes datasets in the directory layouts the bundled interpreters read, filled
+with small placeholder images and random labels, so interpreters, evaluators
+and visualizers can be profiled at scale without the real data:
+ - obj_det_interp_1: VOC, {Train/Train,Test/Test}/{Annotations/*.xml,JPEGImages/*.jpg}
+ - KITTI_lemenko_interp: KITTI object, data_object_{calib,image_2,image_3,label_2}/{training,testing}/...
+ - seg_kitti: KITTI semantics, {training,testing}/image_2 and training/{instance,semantic,semantic_rgb}
+ - interp_airsim, depth_interp_airsim: an AirSim recording, airsim_rec.txt and images/
+Every frame gets its own image, they differ in their first pixels, so content
+keyed caches see as many distinct frames as the dataset has.
+
+python -m ML_Ops_Pipeline.synthetic_datasets obj_det_interp_1 --frames 50000 --boxes-per-frame 20
+"""
+
+import os
+import time
+import datetime
+
+import numpy as np
+import cv2
+
+from .constants import DATASET_DIR
+
+# Pipeline each interpreter belongs to, used for the default output directory
+INTERPRETER_PIPELINES = {
+	'obj_det_interp_1': 'obj_det',
+	'KITTI_lemenko_interp': 'obj_det',
+	'seg_kitti': 'seg',
+	'interp_airsim': 'seg',
+	'depth_interp_airsim': 'depth_det',
+}
+VOC_LABELS = ('person', 'car', 'bicycle', 'dog', 'bus')
+KITTI_LABELS = ('Car', 'Pedestrian', 'Cyclist', 'Van', 'Truck', 'DontCare')
+# BGR colors the seg interpreters map to 'vehicle', as written by cv2
+KITTI_VEHICLE_COLORS = ((142, 0, 0), (70, 0, 0), (100, 60, 0))
+AIRSIM_VEHICLE_COLORS = ((182, 145, 184), (135, 150, 152))
+# AirSim ImageType of the images written per camera: Scene, DepthPlanar, Segmentation
+AIRSIM_IMAGE_TYPES = (0, 1, 5)
+KITTI_CALIB = (
+	"P0: 7.215377e+02 0.000000e+00 6.095593e+02 0.000000e+00 0.000000e+00 7.215377e+02 1.728540e+02 0.000000e+00 0.000000e+00 0.000000e+00 1.000000e+00 0.000000e+00\n"
+	"P1: 7.215377e+02 0.000000e+00 6.095593e+02 -3.875744e+02 0.000000e+00 7.215377e+02 1.728540e+02 0.000000e+00 0.000000e+00 0.000000e+00 1.000000e+00 0.000000e+00\n"
+	"P2: 7.215377e+02 0.000000e+00 6.095593e+02 4.485728e+01 0.000000e+00 7.215377e+02 1.728540e+02 2.163791e-01 0.000000e+00 0.000000e+00 1.000000e+00 2.745884e-03\n"
+	"P3: 7.215377e+02 0.000000e+00 6.095593e+02 -3.395242e+02 0.000000e+00 7.215377e+02 1.728540e+02 2.199936e+00 0.000000e+00 0.000000e+00 1.000000e+00 2.729905e-03\n"
+	"R0_rect: 9.999239e-01 9.837760e-03 -7.445048e-03 -9.869795e-03 9.999421e-01 -4.278459e-03 7.402527e-03 4.351614e-03 9.999631e-01\n"
+	"Tr_velo_to_cam: 7.533745e-03 -9.999714e-01 -6.166020e-04 -4.069766e-03 1.480249e-02 7.280733e-04 -9.998902e-01 -7.631618e-02 9.998621e-01 7.523790e-03 1.480755e-02 -2.717806e-01\n"
+	"Tr_imu_to_velo: 9.999976e-01 7.553071e-04 -2.035826e-03 -8.086759e-01 -7.854027e-04 9.998898e-01 -1.482298e-02 3.195559e-01 2.024406e-03 1.482454e-02 9.998881e-01 -7.997231e-01\n"
+	"\n"
+)
+
+def placeholder_image(index, width, height) -> np.ndarray:
+	image = np.empty((height, width, 3), dtype=np.uint8)
+	image[:] = ((index * 37) % 256, (index * 91) % 256, (index * 53) % 256)
+	# The frame index in the first pixels keeps every frame distinct
+	index_bytes = np.frombuffer(int(index).to_bytes(8, 'little'), dtype=np.uint8)
+	image.reshape(-1)[:min(8, image.size)] = index_bytes[:min(8, image.size)]
+	return image
+
+def encode_image(extension, image) -> bytes:
+	ok, encoded = cv2.imencode(extension, image)
+	assert ok, "Could not encode a " + extension + " image"
+	return encoded.tobytes()
+
+def write_image(path, image) -> None:
+	# image: an array, or the bytes of an image encoded once and written to several files
+	if isinstance(image, np.ndarray):
+		image = encode_image(os.path.splitext(path)[1], image)
+	with open(path, 'wb') as image_handle:
+		image_handle.write(image)
+
+def random_boxes(rng, count, width, height) -> np.ndarray:
+	"""
+	count x [xmin, ymin, xmax, ymax] inside a width x height image, at least 2 pixels wide and high
+	"""
+	box_width = rng.integers(2, max(3, width // 2), size=count, endpoint=True)
+	box_height = rng.integers(2, max(3, height // 2), size=count, endpoint=True)
+	xmin = rng.integers(0, width - box_width, endpoint=True)
+	ymin = rng.integers(0, height - box_height, endpoint=True)
+	return np.stack([xmin, ymin, xmin + box_width, ymin + box_height], axis=1)
+
+def box_count(rng, boxes_per_frame) -> int:
+	# Poisson around the mean, every frame keeps at least one box
+	return max(1, int(rng.poisson(boxes_per_frame)))
+
+def draw_boxes(image, boxes, colors) -> np.ndarray:
+	for i, (xmin, ymin, xmax, ymax) in enumerate(boxes):
+		image[ymin:ymax, xmin:xmax] = colors[i % len(colors)]
+	return image
+
+def split_frames(frames, test_fraction) -> dict:
+	test_frames = int(round(frames * test_fraction))
+	return {'train': frames - test_frames, 'test': test_frames}
+
+def voc_annotation(file_name, width, height, boxes, labels) -> str:
+	objects = "".join(
+		"\t<object>\n\t\t<name>" + label + "</name>\n\t\t<pose>Unspecified</pose>\n\t\t<truncated>0</truncated>\n\t\t<difficult>0</difficult>\n"
+		"\t\t<bndbox>\n\t\t\t<xmin>" + str(box[0]) + "</xmin>\n\t\t\t<ymin>" + str(box[1]) + "</ymin>\n"
+		"\t\t\t<xmax>" + str(box[2]) + "</xmax>\n\t\t\t<ymax>" + str(box[3]) + "</ymax>\n\t\t</bndbox>\n\t</object>\n"
+		for box, label in zip(boxes, labels)
+	)
+	return (
+		"<annotation>\n\t<folder>JPEGImages</folder>\n\t<filename>" + file_name + ".jpg</filename>\n"
+		"\t<size>\n\t\t<width>" + str(width) + "</width>\n\t\t<height>" + str(height) + "</height>\n\t\t<depth>3</depth>\n\t</size>\n"
+		+ objects + "</annotation>\n"
+	)
+
+def write_voc(output_dir, frames, boxes_per_frame=5, width=160, height=120, test_fraction=0.1, seed=0) -> dict:
+	"""
+	Layout of obj_det_interp_1
+	"""
+	rng = np.random.default_rng(seed)
+	counts = {'frames': 0, 'boxes': 0}
+	index = 0
+	for split, split_dir in (('train', 'Train/Train'), ('test', 'Test/Test')):
+		annotations_dir = os.path.join(output_dir, split_dir, 'Annotations')
+		images_dir = os.path.join(output_dir, split_dir, 'JPEGImages')
+		os.makedirs(annotations_dir, exist_ok=True)
+		os.makedirs(images_dir, exist_ok=True)
+		for _ in range(split_frames(frames, test_fraction)[split]):
+			file_name = "%08d" % index
+			boxes = random_boxes(rng, box_count(rng, boxes_per_frame), width, height)
+			labels = rng.choice(VOC_LABELS, size=len(boxes))
+			with open(os.path.join(annotations_dir, file_name + ".xml"), 'w') as annotation_handle:
+				annotation_handle.write(voc_annotation(file_name, width, height, boxes, labels))
+			write_image(os.path.join(images_dir, file_name + ".jpg"), placeholder_image(index, width, height))
+			counts['frames'] += 1
+			counts['boxes'] += len(boxes)
+			index += 1
+	return counts
+
+def kitti_labels(rng, boxes) -> str:
+	"""
+	Lines of a KITTI label_2 file: type truncated occluded alpha bbox(4) dimensions(3) location(3) rotation_y
+	"""
+	count = len(boxes)
+	columns = [
+		rng.choice(KITTI_LABELS, size=count),
+		np.char.mod("%.2f", rng.uniform(0, 1, size=count)),
+		rng.integers(0, 3, size=count, endpoint=True).astype(str),
+		np.char.mod("%.2f", rng.uniform(-np.pi, np.pi, size=count)),
+	]
+	columns += [np.char.mod("%.2f", boxes[:, i]) for i in range(4)]
+	for low, high in ((1, 3), (0.5, 2), (1, 5), (-20, 20), (1, 2), (2, 80), (-np.pi, np.pi)):
+		columns.append(np.char.mod("%.2f", rng.uniform(low, high, size=count)))
+	return "".join(" ".join(line) + "\n" for line in zip(*columns))
+
+def write_kitti_object(output_dir, frames, boxes_per_frame=5, width=160, height=48, test_fraction=0.1, seed=0) -> dict:
+	"""
+	Layout of KITTI_lemenko_interp, labels are only written for training like the real benchmark
+	"""
+	rng = np.random.default_rng(seed)
+	counts = {'frames': 0, 'boxes': 0}
+	index = 0
+	for split, mode in (('train', 'training'), ('test', 'testing')):
+		directories = {
+			name: os.path.join(output_dir, "data_object_" + name, mode, name)
+			for name in ('calib', 'image_2', 'image_3', 'label_2')
+		}
+		for name in directories:
+			if name != 'label_2' or mode == 'training':
+				os.makedirs(directories[name], exist_ok=True)
+		for _ in range(split_frames(frames, test_fraction)[split]):
+			file_name = "%06d" % index
+			with open(os.path.join(directories['calib'], file_name + ".txt"), 'w') as calib_handle:
+				calib_handle.write(KITTI_CALIB)
+			image = placeholder_image(index, width, height)
+			write_image(os.path.join(directories['image_2'], file_name + ".png"), image)
+			write_image(os.path.join(directories['image_3'], file_name + ".png"), image[:, ::-1])
+			if mode == 'training':
+				boxes = random_boxes(rng, box_count(rng, boxes_per_frame), width, height)
+				with open(os.path.join(directories['label_2'], file_name + ".txt"), 'w') as label_handle:
+					label_handle.write(kitti_labels(rng, boxes))
+				counts['boxes'] += len(boxes)
+			counts['frames'] += 1
+			index += 1
+	return counts
+
+def write_kitti_seg(output_dir, frames, boxes_per_frame=5, width=160, height=48, test_fraction=0.1, seed=0) -> dict:
+	"""
+	Layout of seg_kitti, the masks of training frames are boxes in the vehicle colors of its color_map
+	"""
+	rng = np.random.default_rng(seed)
+	counts = {'frames': 0, 'boxes': 0}
+	index = 0
+	for split, mode in (('train', 'training'), ('test', 'testing')):
+		folders = ('image_2', 'instance', 'semantic', 'semantic_rgb') if mode == 'training' else ('image_2',)
+		directories = {name: os.path.join(output_dir, mode, name) for name in folders}
+		for name in directories:
+			os.makedirs(directories[name], exist_ok=True)
+		for _ in range(split_frames(frames, test_fraction)[split]):
+			file_name = "%06d_10" % index
+			write_image(os.path.join(directories['image_2'], file_name + ".png"), placeholder_image(index, width, height))
+			if mode == 'training':
+				boxes = random_boxes(rng, box_count(rng, boxes_per_frame), width, height)
+				semantic_rgb = draw_boxes(np.zeros((height, width, 3), dtype=np.uint8), boxes, KITTI_VEHICLE_COLORS)
+				# Cityscapes ids, 26 is car
+				semantic = draw_boxes(np.zeros((height, width), dtype=np.uint8), boxes, (26,))
+				instance = np.zeros((height, width), dtype=np.uint16)
+				for i, (xmin, ymin, xmax, ymax) in enumerate(boxes):
+					instance[ymin:ymax, xmin:xmax] = 26 * 256 + i
+				write_image(os.path.join(directories['semantic_rgb'], file_name + ".png"), semantic_rgb)
+				write_image(os.path.join(directories['semantic'], file_name + ".png"), semantic)
+				write_image(os.path.join(directories['instance'], file_name + ".png"), instance)
+				counts['boxes'] += len(boxes)
+			counts['frames'] += 1
+			index += 1
+	return counts
+
+def write_airsim(output_dir, frames, boxes_per_frame=5, width=160, height=120, cameras=4, seed=0, vehicle="Drone1") -> dict:
+	"""
+	Layout of interp_airsim and depth_interp_airsim: airsim_rec.txt with one line per frame and
+	img_<vehicle>_<camera>_<image type>_<timestamp>.png of every camera and AIRSIM_IMAGE_TYPES in images/
+	"""
+	assert "_" not in vehicle, "The interpreters split image file names on _"
+	rng = np.random.default_rng(seed)
+	images_dir = os.path.join(output_dir, 'images')
+	os.makedirs(images_dir, exist_ok=True)
+	counts = {'frames': 0, 'boxes': 0}
+	timestamp = int(time.time() * 1000)
+	position = np.zeros(3)
+	# Depth as an 8 bit ramp from the top of the image to the bottom, the same for every camera and frame
+	depth = encode_image(".png", np.repeat(np.linspace(255, 0, height, dtype=np.uint8)[:, None], width, axis=1))
+	with open(os.path.join(output_dir, 'airsim_rec.txt'), 'w') as airsim_rec:
+		airsim_rec.write("\t".join(["VehicleName", "TimeStamp", "POS_X", "POS_Y", "POS_Z", "Q_W", "Q_X", "Q_Y", "Q_Z", "ImageFile"]) + "\n")
+		for index in range(frames):
+			timestamp += 50
+			position += rng.normal(scale=0.1, size=3)
+			boxes = random_boxes(rng, box_count(rng, boxes_per_frame), width, height)
+			segmentation = encode_image(".png", draw_boxes(np.zeros((height, width, 3), dtype=np.uint8), boxes, AIRSIM_VEHICLE_COLORS))
+			image_files = []
+			for camera in range(cameras):
+				scene = placeholder_image(index * cameras + camera, width, height)
+				for image_type in AIRSIM_IMAGE_TYPES:
+					image_file = "img_" + vehicle + "_" + str(camera) + "_" + str(image_type) + "_" + str(timestamp) + ".png"
+					if image_type == 0:
+						image = scene
+					elif image_type == 5:
+						image = segmentation
+					else:
+						image = depth
+					write_image(os.path.join(images_dir, image_file), image)
+					image_files.append(image_file)
+			airsim_rec.write("\t".join([
+				vehicle, str(timestamp), "%.4f" % position[0], "%.4f" % position[1], "%.4f" % position[2],
+				"1.0", "0.0", "0.0", "0.0", ";".join(image_files)
+			]) + "\n")
+			counts['frames'] += 1
+			counts['boxes'] += len(boxes)
+	return counts
+
+WRITERS = {
+	'obj_det_interp_1': write_voc,
+	'KITTI_lemenko_interp': write_kitti_object,
+	'seg_kitti': write_kitti_seg,
+	'interp_airsim': write_airsim,
+	'depth_interp_airsim': write_airsim,
+}
+
+def default_output_dir(interpreter_name) -> str:
+	# Next to the ingested datasets, where the planner picks it up
+	dataset_dir = DATASET_DIR.format(pipeline_name=INTERPRETER_PIPELINES[interpreter_name])
+	return os.path.join(dataset_dir, interpreter_name, "synthetic_" + str(datetime.datetime.now()).replace(" ", "_"))
+
+def write_dataset(interpreter_name, output_dir=None, frames=1000, **kwargs) -> dict:
+	"""
+	Writes a synthetic dataset in the layout of interpreter_name
+	kwargs are passed to its writer, e.g. boxes_per_frame, width, height, test_fraction, cameras, seed
+	Returns the counts of frames and boxes written and the output_dir
+	"""
+	assert interpreter_name in WRITERS, "No synthetic layout for " + str(interpreter_name) + ", expected one of " + str(list(WRITERS))
+	if output_dir is None:
+		output_dir = default_output_dir(interpreter_name)
+	os.makedirs(output_dir, exist_ok=True)
+	start = time.time()
+	counts = WRITERS[interpreter_name](output_dir, frames, **kwargs)
+	counts['output_dir'] = output_dir
+	counts['seconds'] = time.time() - start
+	return counts
+
+
+if __name__ == "__main__":
+	import argparse
+
+	parser = argparse.ArgumentParser()
+	parser.add_argument('interpreter_name', choices=list(WRITERS), help='Interpreter whose layout is written')
+	parser.add_argument('--output', default=None, help='Dataset directory, defaults to a new one under the datasets of the pipeline')
+	parser.add_argument('--frames', type=int, default=1000, help='Number of frames, split between train and test')
+	parser.add_argument('--boxes-per-frame', type=float, default=5, help='Mean number of boxes or masks per frame')
+	parser.add_argument('--width', type=int, default=None, help='Width of the placeholder images')
+	parser.add_argument('--height', type=int, default=None, help='Height of the placeholder images')
+	parser.add_argument('--test-fraction', type=float, default=0.1, help='Share of the frames in the test split')
+	parser.add_argument('--cameras', type=int, default=4, help='Cameras of an AirSim recording')
+	parser.add_argument('--seed', type=int, default=0, help='Seed of the random labels')
+	args = parser.parse_args()
+
+	kwargs = {'boxes_per_frame': args.boxes_per_frame, 'seed': args.seed}
+	if args.width is not None:
+		kwargs['width'] = args.width
+	if args.height is not None:
+		kwargs['height'] = args.height
+	if WRITERS[args.interpreter_name] is write_airsim:
+		kwargs['cameras'] = args.cameras
+	else:
+		kwargs['test_fraction'] = args.test_fraction
+	counts = write_dataset(args.interpreter_name, args.output, args.frames, **kwargs)
+	print("Wrote", counts['frames'], "frames with", counts['boxes'], "boxes to", counts['output_dir'], "in %.1f s" % counts['seconds'])
@@ -0,0 +1,108 @@
+"""
+tracing
+
+Timing spans written in the Chrome trace event format, the files open in
+ui.perfetto.dev or chrome://tracing.
+Every tracked run records the spans opened while it is active (dataset_load,
+model_load, train, evaluate, predict, pickle_dump, write_predictions,
+visualize, log_artifacts, ...). When the run ends the trace is written to
+TRACE_DIR/<experiment>/<run_name>.<run_id>.json and the summed duration of
+each span name is logged as the time.<name> metric of the run.
+main_git traces the scheduling process (git_sync, pipeline_import, plan,
+schedule) to TRACE_DIR/main/.
+A span opened while no trace is recording only costs two clock reads.
+"""
+
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+from .constants import TRACING, TRACE_DIR
+
+class trace:
+
+	def __init__(self, name) -> None:
+		self.name = name
+		self.start_us = now_us()
+		self.end_us = None
+		self.events = []
+
+	def add(self, name, start_us, end_us, args=None, category="stage") -> None:
+		event = {
+			'name': name,
+			'cat': category,
+			'ph': 'X',
+			'ts': start_us,
+			'dur': end_us - start_us,
+			'pid': os.getpid(),
+			'tid': threading.get_ident(),
+		}
+		if args:
+			event['args'] = args
+		self.events.append(event)
+
+	def durations(self) -> dict:
+		"""
+		{span name: seconds} summed over the stage spans, nested spans count in their parents as well
+		"""
+		durations = {}
+		for event in self.events:
+			if event['cat'] == "stage":
+				durations[event['name']] = durations.get(event['name'], 0.0) + event['dur'] / 1e6
+		return durations
+
+	def chrome_trace(self) -> dict:
+		process_name = {'name': 'process_name', 'ph': 'M', 'pid': os.getpid(), 'args': {'name': self.name}}
+		return {'traceEvents': [process_name] + self.events, 'displayTimeUnit': 'ms'}
+
+	def write(self, path) -> str:
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		with open(path, 'w') as trace_handle:
+			json.dump(self.chrome_trace(), trace_handle, default=str)
+		return path
+
+
+# Traces recording in this process, a span is added to all of them
+active_traces = []
+
+def now_us() -> int:
+	return time.time_ns() // 1000
+
+@contextmanager
+def span(name, **args):
+	"""
+	with span("predict", items=len(x)): ... records the time spent in the block
+	"""
+	start_us = now_us()
+	try:
+		yield
+	finally:
+		if active_traces:
+			end_us = now_us()
+			for recording in list(active_traces):
+				recording.add(name, start_us, end_us, args)
+
+def start_trace(name) -> trace:
+	"""
+	Starts recording spans, None when TRACING is off
+	"""
+	if not TRACING:
+		return None
+	recording = trace(name)
+	active_traces.append(recording)
+	return recording
+
+def stop_trace(recording) -> trace:
+	if recording is None:
+		return None
+	recording.end_us = now_us()
+	# The traced block itself, also visible in the traces it is nested in
+	for other in list(active_traces):
+		other.add(recording.name, recording.start_us, recording.end_us, category="run")
+	active_traces.remove(recording)
+	return recording
+
+def trace_path(*names) -> str:
+	return os.path.join(TRACE_DIR, *[str(name).replace(os.sep, "_") for name in names]) + ".json"
@@ -0,0 +1,274 @@
+"""
+tracking
+
+Experiment tracking of the stages behind one small interface, selected with
+TRACKING_BACKEND:
+ - mlflow: tags and metrics of a run are buffered and sent in one log_batch
+   when the run ends, experiment ids are looked up once per process,
+   artifacts go through the artifact_uploader
+ - jsonl: one JSON line per run appended to TRACKING_DIR/<experiment>.jsonl
+ - null: nothing is tracked
+Models are only serialized when TRACKING_LOG_MODELS=1.
+Each run records a trace of its stage, see tracing.py, and logs its
+durations as time.<span> metrics, and its CPU and memory as resources.<name>
+metrics, see resource_usage.py.
+
+The stages open runs with start_run, code running inside a run (e.g. the
+evaluate of a model) reaches it through the module level set_tag,
+log_metrics and log_model.
+"""
+
+import os
+import json
+import time
+import uuid
+import pickle
+import traceback
+
+from .constants import TRACKING_BACKEND, TRACKING_DIR, TRACKING_LOG_MODELS
+from .tracing import span, start_trace, stop_trace, trace_path
+from .resource_usage import resource_usage
+
+# Limits of a single mlflow log_batch call
+MLFLOW_BATCH_METRICS = 1000
+MLFLOW_BATCH_TAGS = 100
+
+
+def is_within(path, directory) -> bool:
+	return os.path.commonpath([os.path.abspath(path), os.path.abspath(directory)]) == os.path.abspath(directory)
+
+
+class tracked_run:
+
+	def __init__(self, backend, experiment, run_name, description=None, resources_json=None) -> None:
+		self.backend = backend
+		self.experiment = experiment
+		self.run_name = run_name
+		self.description = description
+		self.resources_json = resources_json
+		self.run_id = None
+		self.tags = {}
+		self.metrics = {}
+		self.artifacts = []
+		self.models = []
+		self.start_time = time.time()
+		self.end_time = None
+		self.status = None
+		self.trace = None
+		self.usage = resource_usage()
+		self.usage_recorded = False
+
+	def set_tag(self, key, value) -> None:
+		self.tags[key] = str(value)
+
+	def set_tags(self, tags) -> None:
+		for key in tags:
+			self.set_tag(key, tags[key])
+
+	def log_metric(self, key, value) -> None:
+		# Converted now, so a bad value fails the stage and not the flush at the end of the run
+		self.metrics[key] = (float(value), int(time.time() * 1000))
+
+	def log_metrics(self, metrics, prefix="") -> None:
+		for key in metrics:
+			if isinstance(metrics[key], dict):
+				# e.g. the confusion counts of an evaluator, logged as confusion.tp, confusion.fp, ...
+				self.log_metrics(metrics[key], prefix + str(key) + ".")
+			else:
+				self.log_metric(prefix + str(key), metrics[key])
+
+	def log_artifacts(self, local_dir) -> None:
+		if self.resources_json is not None and not self.usage_recorded and is_within(self.resources_json, local_dir):
+			# The stage's closing upload of its output directory, resources.json has to be written before it
+			try:
+				self.record_usage()
+			except Exception:
+				traceback.print_exc()
+		self.artifacts.append(local_dir)
+		with span("log_artifacts", local_dir=local_dir):
+			self.backend.log_artifacts(self, local_dir)
+
+	def log_model(self, model, name) -> None:
+		if not TRACKING_LOG_MODELS:
+			return
+		self.models.append(name)
+		self.backend.log_model(self, model, name)
+
+	def __enter__(self):
+		self.backend.begin(self)
+		active_runs.append(self)
+		self.trace = start_trace(self.run_name)
+		self.usage.start()
+		return self
+
+	def __exit__(self, exc_type, exc_value, exc_traceback):
+		active_runs.remove(self)
+		self.end_time = time.time()
+		self.status = "FINISHED" if exc_type is None else "FAILED"
+		# Losing the tracking of a run must not fail the stage that produced it
+		try:
+			if not self.usage_recorded:
+				self.record_usage()
+		except Exception:
+			traceback.print_exc()
+		try:
+			self.backend.end(self)
+		except Exception:
+			traceback.print_exc()
+		return False
+
+	def record_usage(self) -> None:
+		# Durations of the traced spans and the CPU and memory the run used, up to now
+		self.usage_recorded = True
+		recording = stop_trace(self.trace)
+		self.usage.stop()
+		if recording is not None:
+			durations = recording.durations()
+			durations['total'] = time.time() - self.start_time
+			self.log_metrics({'time': durations})
+			recording.write(trace_path(self.experiment, self.run_name + "." + str(self.run_id)))
+		self.log_metrics({'resources': self.usage.metrics()})
+		if self.resources_json is not None:
+			self.usage.write(self.resources_json)
+
+
+class null_tracker:
+
+	def experiment_id(self, experiment) -> str:
+		return experiment
+
+	def begin(self, run) -> None:
+		run.run_id = uuid.uuid4().hex
+
+	def end(self, run) -> None:
+		pass
+
+	def log_artifacts(self, run, local_dir) -> None:
+		pass
+
+	def log_model(self, run, model, name) -> None:
+		pass
+
+
+class jsonl_tracker(null_tracker):
+
+	def __init__(self, tracking_dir=TRACKING_DIR) -> None:
+		self.tracking_dir = tracking_dir
+
+	def end(self, run) -> None:
+		os.makedirs(self.tracking_dir, exist_ok=True)
+		record = {
+			'run_id': run.run_id,
+			'experiment': run.experiment,
+			'run_name': run.run_name,
+			'description': run.description,
+			'status': run.status,
+			'start_time': run.start_time,
+			'end_time': run.end_time,
+			'tags': run.tags,
+			'metrics': {key: run.metrics[key][0] for key in run.metrics},
+			'artifacts': run.artifacts,
+			'models': run.models,
+		}
+		# One write per run, appends of concurrent workers do not interleave
+		with open(os.path.join(self.tracking_dir, run.experiment + ".jsonl"), 'a') as jsonl_handle:
+			jsonl_handle.write(json.dumps(record, default=str) + "\n")
+
+	def log_model(self, run, model, name) -> None:
+		model_dir = os.path.join(self.tracking_dir, "models", run.run_id)
+		os.makedirs(model_dir, exist_ok=True)
+		with open(os.path.join(model_dir, name + ".pkl"), 'wb') as model_handle:
+			pickle.dump(model, model_handle, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+class mlflow_tracker(null_tracker):
+
+	def __init__(self) -> None:
+		from mlflow.tracking import MlflowClient
+		self.client = MlflowClient()
+		self.experiment_ids = {}
+
+	def experiment_id(self, experiment) -> str:
+		if experiment not in self.experiment_ids:
+			expt = self.client.get_experiment_by_name(experiment)
+			if expt is None:
+				try:
+					self.client.create_experiment(experiment)
+				except Exception:
+					# Created by another worker in the meantime
+					pass
+				expt = self.client.get_experiment_by_name(experiment)
+			self.experiment_ids[experiment] = expt.experiment_id
+		return self.experiment_ids[experiment]
+
+	def begin(self, run) -> None:
+		tags = {}
+		if run.description is not None:
+			tags["mlflow.note.content"] = str(run.description)
+		mlflow_run = self.client.create_run(self.experiment_id(run.experiment), run_name=run.run_name, tags=tags)
+		run.run_id = mlflow_run.info.run_id
+
+	def end(self, run) -> None:
+		from mlflow.entities import Metric, RunTag
+		metrics = [Metric(key, value, timestamp, 0) for key, (value, timestamp) in run.metrics.items()]
+		tags = [RunTag(key, value) for key, value in run.tags.items()]
+		while metrics or tags:
+			self.client.log_batch(run.run_id, metrics=metrics[:MLFLOW_BATCH_METRICS], tags=tags[:MLFLOW_BATCH_TAGS])
+			metrics, tags = metrics[MLFLOW_BATCH_METRICS:], tags[MLFLOW_BATCH_TAGS:]
+		self.client.set_terminated(run.run_id, run.status, end_time=int(run.end_time * 1000))
+
+	def log_artifacts(self, run, local_dir) -> None:
+		from .artifact_uploader import get_uploader
+		get_uploader().log_artifacts(self.client, run.run_id, local_dir)
+
+	def log_model(self, run, model, name) -> None:
+		import mlflow
+		import mlflow.sklearn
+		with mlflow.start_run(run_id=run.run_id):
+			mlflow.sklearn.log_model(model, name)
+
+
+TRACKERS = {
+	'mlflow': mlflow_tracker,
+	'jsonl': jsonl_tracker,
+	'null': null_tracker,
+}
+
+global default_tracker
+default_tracker = None
+# Runs open in this process, the innermost last
+active_runs = []
+
+def get_tracker():
+	global default_tracker
+	if default_tracker is None:
+		assert TRACKING_BACKEND in TRACKERS, "Unknown TRACKING_BACKEND " + str(TRACKING_BACKEND) + ", expected one of " + str(list(TRACKERS))
+		default_tracker = TRACKERS[TRACKING_BACKEND]()
+	return default_tracker
+
+def start_run(experiment, run_name, description=None, resources_json=None) -> tracked_run:
+	"""
+	with start_run(pipeline_name, run_name) as run: ... opens a run of the configured backend
+	resources_json: where to write the resource_usage of the run, e.g. next to the status.txt of the stage
+	"""
+	return tracked_run(get_tracker(), experiment, run_name, description, resources_json)
+
+def active_run() -> tracked_run:
+	if len(active_runs) == 0:
+		return None
+	return active_runs[-1]
+
+def set_tag(key, value) -> None:
+	run = active_run()
+	if run is not None:
+		run.set_tag(key, value)
+
+def log_metrics(metrics) -> None:
+	run = active_run()
+	if run is not None:
+		run.log_metrics(metrics)
+
+def log_model(model, name) -> None:
+	run = active_run()
+	if run is not None:
+		run.log_model(model, name)
@@ -6,10 +6,11 @@ import pickle
 import streamlit as st
 import pandas as pd
 
-from ML_Ops_Pipeline.all_pipelines_git import get_all_inputs
+from ML_Ops_Pipeline.pipeline_manifest import get_all_manifests
 from ML_Ops_Pipeline.constants import DATASET_DIR, MODEL_TRAINING, MODEL_TESTING, MODEL_VISUAL, folder_last_modified
 
-all_inputs = get_all_inputs()
+# Only the selected pipeline gets imported
+all_inputs = get_all_manifests()
 all_input_names = list(all_inputs.keys())
 
 def show_image(img_path):
@@ -37,7 +38,7 @@ def main():
 		st.markdown("# Error")
 		st.markdown("No pipelines available")
 		return
-	pipeline = all_inputs[pipeline_name]['pipeline']
+	pipeline = all_inputs[pipeline_name]['pipeline'].load()
 	viz_class = pipeline.get_pipeline_streamlit_visualizer()
 	viz = viz_class(pipeline, st)
 	viz.visualize()
@@ -0,0 +1,363 @@
+"""
+bench_pipeline
+
+Framework overhead on a synthetic CPU only pipeline: tiny numpy models over
+generated datasets under a temporary PIPELINE_HOME. Measures the latency and
+throughput of planning, dataset load, train/analyze, visualization, ensemble,
+history writes and the REST listing, and writes them as JSON so runs against
+different framework versions can be compared.
+
+The first pass over the stages runs with cold caches (model pool, dataset
+cache, prediction cache) and is reported as <stage>.cold, the following
+--repeat - 1 passes as <stage>.warm.
+
+python benchmarks/bench_pipeline.py [--models 4] [--datasets 4] [--items 2000] [--features 32] [--repeat 3] [--output bench_pipeline.json] [--compare old.json]
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import tempfile
+import importlib
+import platform
+import statistics
+import subprocess
+from contextlib import redirect_stdout
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--models', type=int, default=4, help='Number of model classes')
+parser.add_argument('--datasets', type=int, default=4, help='Number of datasets')
+parser.add_argument('--items', type=int, default=2000, help='Items per dataset, split in half between train and test')
+parser.add_argument('--features', type=int, default=32, help='Features per item')
+parser.add_argument('--repeat', type=int, default=3, help='Passes over every measurement, the first one is cold')
+parser.add_argument('--history-writes', type=int, default=1000, help='Keys written by the history benchmarks')
+parser.add_argument('--tracking', default='null', help='TRACKING_BACKEND of the stages')
+parser.add_argument('--output', default='bench_pipeline.json', help='Where to write the results')
+parser.add_argument('--compare', default=None, help='Results of an earlier run to compare against')
+parser.add_argument('--verbose', action='store_true', help='Show the output of the stages')
+args = parser.parse_args()
+assert args.repeat >= 1, "--repeat must be at least 1"
+
+PIPELINE_HOME = tempfile.mkdtemp(prefix="bench_pipeline_")
+os.environ['PIPELINE_HOME'] = PIPELINE_HOME
+os.environ['TRACKING_BACKEND'] = args.tracking
+open(os.path.join(PIPELINE_HOME, "remote_pipelines.txt"), 'w').close()
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import numpy as np
+import pandas as pd
+
+from ML_Ops_Pipeline.constants import DATASET_DIR, COMBINED_MODEL_TASKS
+from ML_Ops_Pipeline.planner import task_planner
+from ML_Ops_Pipeline.history import local_history, task_journal, DONE
+from ML_Ops_Pipeline.dataset_cache import dataset_cache
+from ML_Ops_Pipeline.main_git import stage_call
+from ML_Ops_Pipeline.model_utils.model_train_and_analyze import train_test_model
+
+PIPELINE_NAME = "bench"
+INTERPRETER_NAME = "bench_interp"
+
+PIPELINE_SOURCE = '''
+import os
+import numpy as np
+import pandas as pd
+from ML_Ops_Pipeline.constants import PREDICTION_CACHE
+from ML_Ops_Pipeline.pipeline_input import pipeline_dataset_interpreter, pipeline_model, pipeline_ensembler, pipeline_data_visualizer, pipeline_input
+
+FEATURES = {features}
+
+class bench_interp(pipeline_dataset_interpreter):
+	def load(self):
+		x = np.load(os.path.join(self.input_dir, "x.npy"))
+		y = pd.read_csv(os.path.join(self.input_dir, "labels.csv"))
+		half = len(x) // 2
+		self.dataset = {{
+			'train': {{'x': x[:half], 'y': y[:half].reset_index(drop=True)}},
+			'test': {{'x': x[half:], 'y': y[half:].reset_index(drop=True)}},
+		}}
+
+class bench_base_model(pipeline_model):
+	# A fixed random linear scorer, the cost of the model itself stays negligible
+	seed = 0
+	# train() does not change the weights, so the instance and its predictions can be reused across tasks
+	pooled = True
+	cache_predictions = PREDICTION_CACHE
+
+	def load(self):
+		self.model = np.random.default_rng(self.seed).normal(size=FEATURES).astype(np.float32)
+
+	def predict_batch(self, x_batch):
+		return x_batch @ self.model
+
+	def evaluate(self, x, y):
+		scores = self.predict(x)
+		predictions = pd.DataFrame({{'image': y['image'].values, 'score': scores}})
+		return {{'acc': float(((scores > 0) == y['label'].values).mean())}}, predictions
+
+	def train(self, x, y):
+		return self.evaluate(x, y)
+
+class bench_ensembler(pipeline_ensembler):
+	def evaluate(self, x, y, model_predictions=None):
+		scores = np.mean([
+			model_predictions[model_name].set_index('image')['score'].reindex(y['image']).values
+			for model_name in sorted(model_predictions)
+		], axis=0)
+		predictions = pd.DataFrame({{'image': y['image'].values, 'score': scores}})
+		return {{'acc': float(((scores > 0) == y['label'].values).mean())}}, predictions
+
+	def train(self, x, y, model_predictions=None):
+		return self.evaluate(x, y, model_predictions=model_predictions)
+
+class bench_visualizer(pipeline_data_visualizer):
+	prediction_columns = ['image', 'score']
+
+	def visualize(self, x, y, results, predictions, directory):
+		histogram, edges = np.histogram(predictions['score'].values, bins=20)
+		np.savetxt(os.path.join(directory, "histogram.txt"), np.stack([edges[:-1], histogram], axis=1))
+'''
+
+def write_pipeline(models, features):
+	pipeline_dir = tempfile.mkdtemp()
+	source = [PIPELINE_SOURCE.format(features=features)]
+	for i in range(models):
+		source.append("class bench_model_" + str(i) + "(bench_base_model):\n\tseed = " + str(i))
+	source.append("exported_pipeline = pipeline_input('" + PIPELINE_NAME + "', {'" + INTERPRETER_NAME + "': bench_interp}, {"
+		+ ", ".join("'bench_model_" + str(i) + "': bench_model_" + str(i) for i in range(models))
+		+ "}, {'bench_ensembler': bench_ensembler}, {'bench_visualizer': bench_visualizer})")
+	with open(os.path.join(pipeline_dir, "bench_pipeline_module.py"), 'w') as pipeline_handle:
+		pipeline_handle.write("\n\n".join(source) + "\n")
+	sys.path.insert(0, pipeline_dir)
+	return importlib.import_module("bench_pipeline_module").exported_pipeline
+
+def write_datasets(datasets, items, features):
+	interpreter_dir = os.path.join(DATASET_DIR.format(pipeline_name=PIPELINE_NAME), INTERPRETER_NAME)
+	direction = np.random.default_rng(0).normal(size=features)
+	dataset_dirs = []
+	for i in range(datasets):
+		rng = np.random.default_rng(i + 1)
+		dataset_dir = os.path.join(interpreter_dir, "dataset_" + str(i))
+		os.makedirs(dataset_dir, exist_ok=True)
+		x = rng.normal(size=(items, features)).astype(np.float32)
+		labels = (x @ direction + rng.normal(scale=0.5, size=items)) > 0
+		np.save(os.path.join(dataset_dir, "x.npy"), x)
+		pd.DataFrame({
+			'image': ["dataset_" + str(i) + "/item_" + str(j) for j in range(items)],
+			'label': labels,
+		}).to_csv(os.path.join(dataset_dir, "labels.csv"), index=False)
+		dataset_dirs.append(dataset_dir)
+	return dataset_dirs
+
+class git_data:
+	hexsha = "0" * 40
+
+def framework_commit() -> str:
+	try:
+		return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=REPO_DIR, stderr=subprocess.DEVNULL).decode().strip()
+	except Exception:
+		return None
+
+def summary(timings, items=None) -> dict:
+	"""
+	Latency of the calls in seconds and, with items handled per call, their throughput
+	"""
+	total = sum(timings)
+	result = {
+		'calls': len(timings),
+		'min': min(timings),
+		'median': statistics.median(timings),
+		'mean': total / len(timings),
+		'max': max(timings),
+		'total': total,
+	}
+	if items is not None and total > 0:
+		result['items_per_call'] = items
+		result['items_per_second'] = items * len(timings) / total
+	return result
+
+def timed(func, *func_args):
+	start = time.perf_counter()
+	result = func(*func_args)
+	return time.perf_counter() - start, result
+
+def quiet(func, *func_args):
+	# The stages print a lot, only shown with --verbose or when they fail
+	if args.verbose:
+		return func(*func_args)
+	output = io.StringIO()
+	try:
+		with redirect_stdout(output):
+			return func(*func_args)
+	except BaseException:
+		print(output.getvalue())
+		raise
+
+def succeeded(result) -> bool:
+	if isinstance(result[0], tuple):
+		# train_test_model returns the results of both stages
+		return all(stage_result[0] for stage_result in result)
+	return bool(result[0])
+
+def bench_planning(all_inputs, results) -> task_planner:
+	manifest = local_history("artifact_manifest")
+	timings = []
+	for _ in range(args.repeat):
+		planner = task_planner(manifest)
+		elapsed, planned = timed(planner.plan, all_inputs)
+		timings.append(elapsed)
+	results['plan.stale'] = summary(timings, len(planned))
+	return planner, planned
+
+def bench_dataset_load(pipeline, dataset_dirs, results) -> None:
+	interpreter = pipeline.get_pipeline_dataset_interpreter()[INTERPRETER_NAME]
+	parse, disk, memory = [], [], []
+	cache = dataset_cache()
+	for _ in range(args.repeat):
+		for dataset_dir in dataset_dirs:
+			parse.append(timed(lambda: interpreter(dataset_dir).get_dataset())[0])
+			# The first lookup of the pass misses the in-process LRU and reads the pickle
+			cache.clear()
+			cache.get_dataset(interpreter, dataset_dir)
+			cache.clear()
+			disk.append(timed(cache.get_dataset, interpreter, dataset_dir)[0])
+			memory.append(timed(cache.get_dataset, interpreter, dataset_dir)[0])
+	results['dataset_load.parse'] = summary(parse, args.items)
+	results['dataset_load.disk'] = summary(disk, args.items)
+	results['dataset_load.memory'] = summary(memory, args.items)
+
+def stage_calls(planned, pipeline) -> list:
+	"""
+	[(stage, tasks, items, stage_func, stage_args)] of every planned task in plan order, which respects their deps
+	The outputs of a model do not depend on the dataset directory, so each dataset has to be done before the next one
+	"""
+	train_items = args.items // 2
+	test_items = args.items - train_items
+	items = {'train': train_items, 'analyze': test_items, 'ensemble_train': train_items, 'ensemble_analyze': test_items}
+	calls = []
+	combined = set()
+	for task in planned.values():
+		if task.node_id in combined:
+			continue
+		stage_func, stage_args = stage_call(task, pipeline)
+		analyze_id = ('analyze',) + task.node_id[1:]
+		if COMBINED_MODEL_TASKS and task.stage == 'train' and analyze_id in planned:
+			# As main_git runs them: train and analyze of a model share one task
+			combined.add(analyze_id)
+			analyze_args = stage_call(planned[analyze_id], pipeline)[1]
+			calls.append(('train_test', [task, planned[analyze_id]], args.items, train_test_model, (stage_args, analyze_args)))
+		elif task.stage == 'visualize':
+			calls.append((task.stage, [task], train_items if task.mode == 'train' else test_items, stage_func, stage_args))
+		else:
+			calls.append((task.stage, [task], items[task.stage], stage_func, stage_args))
+	return calls
+
+def bench_stages(planner, planned, pipeline, results) -> None:
+	calls = stage_calls(planned, pipeline)
+	timings = {}
+	items = {}
+	for run in range(args.repeat):
+		suffix = ".cold" if run == 0 else ".warm"
+		for stage, tasks, stage_items, stage_func, stage_args in calls:
+			elapsed, result = timed(quiet, stage_func, *stage_args)
+			assert succeeded(result), "Stage failed, see --verbose: " + ", ".join(task.artifact_key() for task in tasks)
+			timings.setdefault(stage + suffix, []).append(elapsed)
+			items[stage + suffix] = stage_items
+			for task in tasks:
+				planner.record(task, True)
+	for name in timings:
+		results[name] = summary(timings[name], items[name])
+
+def bench_history(results) -> None:
+	keys = ["bench:" + str(i) for i in range(args.history_writes)]
+	entry = {'digest': "0" * 40, 'commit_id': git_data.hexsha, 'status': 'SUCCESS', 'inputs': {'stage': 'train'}}
+	single, batched, journal_single, journal_batched, read = [], [], [], [], []
+	journal = task_journal()
+	for run in range(args.repeat):
+		history = local_history("bench_history_" + str(run))
+		single.append(timed(lambda: [history.__setitem__(key, entry) for key in keys])[0])
+		history = local_history("bench_history_batch_" + str(run))
+		def write_batch():
+			with history.batch():
+				for key in keys:
+					history[key] = entry
+		batched.append(timed(write_batch)[0])
+		read.append(timed(history.get_many, keys)[0])
+		journal_single.append(timed(lambda: [journal.set_state(key, DONE) for key in keys])[0])
+		journal_batched.append(timed(journal.set_state, keys, DONE)[0])
+	results['history.write'] = summary(single, len(keys))
+	results['history.write_batch'] = summary(batched, len(keys))
+	results['history.get_many'] = summary(read, len(keys))
+	results['journal.set_state'] = summary(journal_single, len(keys))
+	results['journal.set_state_batch'] = summary(journal_batched, len(keys))
+
+def bench_rest(results) -> None:
+	# rest_server imports constants as a top level module, as when started by main.py
+	sys.path.insert(0, os.path.join(REPO_DIR, "ML_Ops_Pipeline"))
+	try:
+		rest_server = importlib.import_module("rest_server")
+	except ImportError as ex:
+		print("Skipping the REST benchmarks:", ex)
+		return
+	client = rest_server.api.test_client()
+	for route in ('/pipelines', '/datasets', '/models', '/ensembles'):
+		timings = []
+		for _ in range(args.repeat):
+			elapsed, response = timed(quiet, lambda: client.get(route, query_string={'pipeline': PIPELINE_NAME}))
+			assert response.status_code == 200, route + " returned " + str(response.status_code)
+			timings.append(elapsed)
+		results['rest' + route.replace("/", ".")] = summary(timings)
+
+def compare(results, previous_json) -> None:
+	with open(previous_json) as previous_handle:
+		previous = json.load(previous_handle)
+	print("-"*10)
+	print("Compared to", previous_json, "(framework", str(previous['framework']['commit']) + ")")
+	for name in results:
+		if name in previous['results']:
+			ratio = results[name]['median'] / max(previous['results'][name]['median'], 1e-9)
+			print(name.ljust(32), "%.2fx" % ratio)
+
+if __name__ == "__main__":
+	pipeline = write_pipeline(args.models, args.features)
+	dataset_dirs = write_datasets(args.datasets, args.items, args.features)
+	all_inputs = {PIPELINE_NAME: {'pipeline': pipeline, 'git_data': git_data}}
+	print(args.models, "models x", args.datasets, "datasets x", args.items, "items, PIPELINE_HOME", PIPELINE_HOME)
+
+	results = {}
+	planner, planned = bench_planning(all_inputs, results)
+	bench_dataset_load(pipeline, dataset_dirs, results)
+	bench_stages(planner, planned, pipeline, results)
+	# Every task is recorded now, the steady state tick of main_git
+	plan_timings = [timed(task_planner(local_history("artifact_manifest")).plan, all_inputs)[0] for _ in range(args.repeat)]
+	results['plan.up_to_date'] = summary(plan_timings, len(planned))
+	bench_history(results)
+	bench_rest(results)
+
+	for name in results:
+		line = name.ljust(32) + "median %.4f s" % results[name]['median']
+		if 'items_per_second' in results[name]:
+			line += "   %.0f items/s" % results[name]['items_per_second']
+		print(line)
+
+	output = {
+		'benchmark': "bench_pipeline",
+		'framework': {'commit': framework_commit()},
+		'environment': {
+			'python': platform.python_version(),
+			'platform': platform.platform(),
+			'numpy': np.__version__,
+			'pandas': pd.__version__,
+			'cpus': os.cpu_count(),
+		},
+		'config': vars(args),
+		'results': results,
+	}
+	with open(args.output, 'w') as output_handle:
+		json.dump(output, output_handle, indent=4)
+	print("Results:", args.output)
+	if args.compare:
+		compare(results, args.compare)
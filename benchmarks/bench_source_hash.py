@@ -0,0 +1,109 @@
+"""
+bench_source_hash
+
+Planning cost with and without the source_hash memo
+for a synthetic pipeline of 50 models x 100 datasets
+
+python benchmarks/bench_source_hash.py [--models 50] [--datasets 100] [--repeat 3]
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import importlib
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--models', type=int, default=50, help='Number of model classes')
+parser.add_argument('--datasets', type=int, default=100, help='Number of datasets')
+parser.add_argument('--repeat', type=int, default=3, help='Planning ticks per measurement')
+args = parser.parse_args()
+
+PIPELINE_HOME = tempfile.mkdtemp(prefix="bench_source_hash_")
+os.environ['PIPELINE_HOME'] = PIPELINE_HOME
+open(os.path.join(PIPELINE_HOME, "remote_pipelines.txt"), 'w').close()
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ML_Ops_Pipeline.constants import DATASET_DIR
+from ML_Ops_Pipeline import pipeline_input
+from ML_Ops_Pipeline.pipeline_input import source_hash
+from ML_Ops_Pipeline.planner import task_planner
+
+def write_pipeline(models):
+	pipeline_dir = tempfile.mkdtemp()
+	source = [
+		"from ML_Ops_Pipeline.pipeline_input import pipeline_dataset_interpreter, pipeline_model, pipeline_ensembler, pipeline_data_visualizer, pipeline_input",
+		"class bench_interp(pipeline_dataset_interpreter):\n\tpass",
+		"class bench_base_model(pipeline_model):\n\tdef predict(self, x):\n\t\treturn x",
+		"class bench_ensembler(pipeline_ensembler):\n\tpass",
+		"class bench_visualizer(pipeline_data_visualizer):\n\tpass",
+	]
+	for i in range(models):
+		source.append("class bench_model_" + str(i) + "(bench_base_model):\n\tdef evaluate(self, x, y):\n\t\treturn " + str(i))
+	source.append("exported_pipeline = pipeline_input('bench', {'bench_interp': bench_interp}, {"
+		+ ", ".join("'bench_model_" + str(i) + "': bench_model_" + str(i) for i in range(models))
+		+ "}, {'bench_ensembler': bench_ensembler}, {'bench_visualizer': bench_visualizer})")
+	with open(os.path.join(pipeline_dir, "bench_pipeline.py"), 'w') as pipeline_handle:
+		pipeline_handle.write("\n\n".join(source) + "\n")
+	sys.path.insert(0, pipeline_dir)
+	return importlib.import_module("bench_pipeline").exported_pipeline
+
+def write_datasets(datasets):
+	interpreter_dir = os.path.join(DATASET_DIR.format(pipeline_name="bench"), "bench_interp")
+	for i in range(datasets):
+		dataset_dir = os.path.join(interpreter_dir, "dataset_" + str(i))
+		os.makedirs(dataset_dir, exist_ok=True)
+		with open(os.path.join(dataset_dir, "labels.txt"), 'w') as labels:
+			labels.write(str(i))
+
+class git_data:
+	hexsha = "0" * 40
+
+def per_dataset_hashing(pipeline, datasets):
+	# The hashing pattern of the stage loops: every class for every dataset
+	model_classes = pipeline.get_pipeline_model()
+	ensemble_classes = pipeline.get_pipeline_ensemble()
+	for i in range(datasets):
+		for model_name in model_classes:
+			source_hash(model_classes[model_name])
+		for ensemble_name in ensemble_classes:
+			source_hash(ensemble_classes[ensemble_name])
+
+class no_memo(dict):
+	# Stands in for pipeline_input.source_hashes to measure source_hash without the memo
+	def __setitem__(self, key, item):
+		pass
+
+	def __getitem__(self, key):
+		raise KeyError(key)
+
+def measure(name, func, memoized):
+	memo = pipeline_input.source_hashes
+	if not memoized:
+		pipeline_input.source_hashes = no_memo()
+	timings = []
+	for _ in range(args.repeat):
+		start = time.perf_counter()
+		func()
+		timings.append(time.perf_counter() - start)
+	pipeline_input.source_hashes = memo
+	print(name.ljust(40), ("memoized" if memoized else "no memo").ljust(10), "%.4f s" % min(timings))
+
+if __name__ == "__main__":
+	pipeline = write_pipeline(args.models)
+	write_datasets(args.datasets)
+	all_inputs = {'bench': {'pipeline': pipeline, 'git_data': git_data}}
+	print(args.models, "models x", args.datasets, "datasets")
+
+	def plan():
+		task_planner({}).plan(all_inputs)
+
+	def hash_loop():
+		per_dataset_hashing(pipeline, args.datasets)
+
+	# Warm up the dataset fingerprints and the imports
+	plan()
+	for memoized in (False, True):
+		measure("task_planner.plan", plan, memoized)
+		measure("source_hash per model per dataset", hash_loop, memoized)
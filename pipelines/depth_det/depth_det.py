@@ -10,6 +10,8 @@ sys.path.append('../')
 
 from pipeline_input import *
 from constants import *
+from image_loader import image_loader
+from frame_cache import read_frame
 
 class depth_interp_airsim(pipeline_dataset_interpreter):
 	NUM_CAMS = 0
@@ -27,17 +29,48 @@ class depth_interp_airsim(pipeline_dataset_interpreter):
         '0': 'FrontL'
     }
 
-	def load(self) -> None:
-		super().load()
+	# Recordings can be longer than fits in memory, iter_batches reads airsim_rec.txt in chunks
+	streaming = True
+
+	def recording_paths(self):
 		airsim_txt=os.path.join(self.input_dir, 'airsim_rec.txt')
 		images_folder=os.path.join(self.input_dir, 'images')
 		
 		assert os.path.exists(airsim_txt)
 		assert os.path.exists(images_folder)
+		return airsim_txt, images_folder
+
+	def load(self) -> None:
+		super().load()
+		airsim_txt, images_folder = self.recording_paths()
 
 		df = pd.read_csv(airsim_txt, sep='\t')
 		df.set_index('TimeStamp')
+		x_vals = self.generate_data(df, images_folder)
+		self.dataset = {
+			'train': {
+				'x': x_vals,
+				'y': df
+			},
+			'test': {
+				'x': x_vals,
+				'y': df
+			}
+		}
+
+	def iter_batches(self, split, batch_size):
+		# train and test are the same recording
+		airsim_txt, images_folder = self.recording_paths()
+		for df in pd.read_csv(airsim_txt, sep='\t', chunksize=batch_size):
+			yield {'x': self.generate_data(df, images_folder), 'y': df}
 
+	def split_len(self, split) -> int:
+		airsim_txt, images_folder = self.recording_paths()
+		with open(airsim_txt) as airsim_rec:
+			# Header line
+			return sum(1 for line in airsim_rec) - 1
+
+	def generate_data(self, df, images_folder):
 		self.NUM_CAMS = len(df["ImageFile"].iloc[0].split(";"))
 
 		self.cam_name = {
@@ -69,21 +102,16 @@ class depth_interp_airsim(pipeline_dataset_interpreter):
 				if col!="ImageFile":
 					x_vals[col] += [row[col]]
 			x_vals["ImageFile"] += [";".join(input_images)]
-		x_vals = pd.DataFrame(x_vals)
-		self.dataset = {
-			'train': {
-				'x': x_vals,
-				'y': df
-			},
-			'test': {
-				'x': x_vals,
-				'y': df
-			}
-		}
+		x_vals = pd.DataFrame(x_vals, index=df.index)
+		return x_vals
 
 
 class videos_vis(pipeline_data_visualizer):
 
+	def visualize_batches(self, batches, results, preds, directory) -> None:
+		# The video is made from the predictions alone, the recording is not read
+		self.visualize(None, None, results, preds, directory)
+
 	def visualize(self, x, y, results, preds, directory) -> None:
 		writer = None
 
@@ -91,7 +119,7 @@ class videos_vis(pipeline_data_visualizer):
 			all_frames = []
 			for index, row in frame.iterrows():
 				f = row['input']
-				input_img = cv2.imread(row['input_full'])
+				input_img = read_frame(row['input_full'])
 				depth = row['depth']
 				cam_id, img_format = f.split("_")[2:4]
 				full_frame = cv2.vconcat([input_img, depth])
@@ -144,6 +172,8 @@ class depth_evaluator:
 		return results, predict_results
 
 class depth_pipeline_model(depth_evaluator, pipeline_model):
+	# Pretrained monodepth2, train only predicts
+	frozen = True
 
 	def load(self):
 		import monodepth2
@@ -167,18 +197,15 @@ class depth_pipeline_model(depth_evaluator, pipeline_model):
 		}
 		# TODO: Implement prediction
 		image_files = x["ImageFile"].split(";")
-		for image_path in image_files:
+		# The next frames are decoded while the model runs on this one
+		for image_path, img in image_loader(image_files):
 
 			f = image_path.split("/")[-1]
 			cam_id, img_format = f.split("_")[2:4]
 			img_format = int(img_format)
-			if f.endswith('.ppm'):
-				#img = PIL.Image.open(image_path)
-				#img = np.array(img.getdata()).reshape(img.size[1], img.size[0], 3)
-				img = cv2.imread(image_path)
-			#elif f.endswith('.pfm'):
-			#	img, scale = airsim.read_pfm(f)
-			else:
+			if not f.endswith('.ppm'):
+				#elif f.endswith('.pfm'):
+				#	img, scale = airsim.read_pfm(f)
 				print("Unknown format")
 
 			depth = self.model.eval(img)
@@ -0,0 +1,209 @@
+"""
+detection_table
+
+Compact container for bounding boxes, used for both the labels and the
+predictions of obj_det. Every box is one record of a structured numpy array
+with float32 coordinates and confidence, an int32 id into the shared list of
+image paths and an int16 id into the list of label names, 26 bytes per box
+instead of a DataFrame row holding two path strings and a label string.
+to_dataframe / from_dataframe convert at the edges (storage, Streamlit).
+"""
+
+import os
+import numpy as np
+import pandas as pd
+
+DETECTION_DTYPE = np.dtype([
+	('xmin', np.float32),
+	('ymin', np.float32),
+	('xmax', np.float32),
+	('ymax', np.float32),
+	('confidence', np.float32),
+	('image_id', np.int32),
+	('label_id', np.int16),
+])
+COORDINATES = ['xmin', 'ymin', 'xmax', 'ymax']
+NO_LABEL = -1
+
+
+class detection_table:
+
+	def __init__(self, images=None, labels=None, boxes=None) -> None:
+		self.images = list(images or [])
+		self.image_ids = {image_path: i for i, image_path in enumerate(self.images)}
+		self.labels = list(labels or [])
+		self.label_ids = {label: i for i, label in enumerate(self.labels)}
+		self.chunks = [] if boxes is None else [boxes]
+		self.groups_index = None
+
+	def image_id(self, image_path) -> int:
+		if image_path not in self.image_ids:
+			self.image_ids[image_path] = len(self.images)
+			self.images.append(image_path)
+		return self.image_ids[image_path]
+
+	def label_id(self, label) -> int:
+		if label is None:
+			return NO_LABEL
+		if label not in self.label_ids:
+			self.label_ids[label] = len(self.labels)
+			self.labels.append(label)
+		return self.label_ids[label]
+
+	def add(self, image_path, xyxy, confidence=None, label=None) -> None:
+		"""
+		Adds the n boxes xyxy (n x 4, or 4 for a single box) of image_path
+		"""
+		xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+		chunk = np.empty(len(xyxy), dtype=DETECTION_DTYPE)
+		for i, coordinate in enumerate(COORDINATES):
+			chunk[coordinate] = xyxy[:, i]
+		chunk['confidence'] = np.nan if confidence is None else confidence
+		chunk['image_id'] = self.image_id(image_path)
+		chunk['label_id'] = self.label_id(label)
+		self.chunks.append(chunk)
+		self.groups_index = None
+
+	@property
+	def boxes(self) -> np.ndarray:
+		if len(self.chunks) != 1:
+			self.chunks = [np.concatenate(self.chunks) if self.chunks else np.empty(0, dtype=DETECTION_DTYPE)]
+		return self.chunks[0]
+
+	def __len__(self):
+		return len(self.boxes)
+
+	@property
+	def nbytes(self) -> int:
+		return self.boxes.nbytes
+
+	def __getstate__(self):
+		return {'images': self.images, 'labels': self.labels, 'boxes': self.boxes}
+
+	def __setstate__(self, state):
+		self.__init__(state['images'], state['labels'], state['boxes'])
+
+	def groups(self) -> tuple:
+		# (image ids in order of their first box, start of each image's boxes in order, the box order)
+		if self.groups_index is None:
+			image_ids = self.boxes['image_id']
+			unique_ids, first = np.unique(image_ids, return_index=True)
+			order = np.argsort(image_ids, kind='stable')
+			starts = np.searchsorted(image_ids[order], unique_ids)
+			by_appearance = np.argsort(first, kind='stable')
+			self.groups_index = (unique_ids, starts, order, by_appearance)
+		return self.groups_index
+
+	def image_paths(self) -> np.ndarray:
+		"""
+		Paths of the images with boxes, in order of their first box, like DataFrame["image"].unique()
+		"""
+		unique_ids, starts, order, by_appearance = self.groups()
+		return np.array([self.images[i] for i in unique_ids[by_appearance]], dtype=object)
+
+	def for_image(self, image_path) -> np.ndarray:
+		"""
+		Boxes of image_path, empty if it has none
+		"""
+		image_id = self.image_ids.get(image_path)
+		if image_id is None:
+			return np.empty(0, dtype=DETECTION_DTYPE)
+		unique_ids, starts, order, by_appearance = self.groups()
+		position = np.searchsorted(unique_ids, image_id)
+		if position == len(unique_ids) or unique_ids[position] != image_id:
+			return np.empty(0, dtype=DETECTION_DTYPE)
+		stop = starts[position+1] if position+1 < len(starts) else len(order)
+		return self.boxes[order[starts[position]:stop]]
+
+	def select_images(self, image_paths) -> "detection_table":
+		image_ids = [self.image_ids[image_path] for image_path in image_paths if image_path in self.image_ids]
+		boxes = self.boxes[np.isin(self.boxes['image_id'], image_ids)]
+		return detection_table(self.images, self.labels, boxes)
+
+	def split_items(self, image_paths) -> list:
+		"""
+		One single image table per path of image_paths, what the prediction_cache stores
+		"""
+		tables = []
+		for image_path in image_paths:
+			boxes = self.for_image(image_path).copy()
+			boxes['image_id'] = 0
+			tables.append(detection_table([image_path], self.labels, boxes))
+		return tables
+
+	def with_item(self, image_path) -> "detection_table":
+		# A cached single image table reused for the same image under another path
+		assert len(self.images) <= 1, "with_item expects a single image table"
+		return detection_table([image_path], self.labels, self.boxes)
+
+	@classmethod
+	def concat(cls, tables) -> "detection_table":
+		merged = cls()
+		for table in tables:
+			boxes = table.boxes.copy()
+			if len(boxes) == 0:
+				continue
+			image_map = np.array([merged.image_id(image_path) for image_path in table.images], dtype=np.int32)
+			boxes['image_id'] = image_map[boxes['image_id']]
+			if table.labels:
+				label_map = np.array([merged.label_id(label) for label in table.labels] + [NO_LABEL], dtype=np.int16)
+				# NO_LABEL (-1) indexes the trailing NO_LABEL
+				boxes['label_id'] = label_map[boxes['label_id']]
+			merged.chunks.append(boxes)
+		return merged
+
+	@classmethod
+	def from_dataframe(cls, df) -> "detection_table":
+		image_codes, images = pd.factorize(df['image'])
+		table = cls(images=list(images))
+		boxes = np.empty(len(df), dtype=DETECTION_DTYPE)
+		for coordinate in COORDINATES:
+			boxes[coordinate] = df[coordinate].to_numpy(dtype=np.float32)
+		boxes['confidence'] = df['confidence'].to_numpy(dtype=np.float32) if 'confidence' in df.columns else np.nan
+		boxes['image_id'] = image_codes
+		if 'label' in df.columns:
+			label_codes, labels = pd.factorize(df['label'])
+			table.labels = list(labels)
+			table.label_ids = {label: i for i, label in enumerate(table.labels)}
+			boxes['label_id'] = label_codes
+		else:
+			boxes['label_id'] = NO_LABEL
+		table.chunks = [boxes]
+		return table
+
+	def to_dataframe(self) -> pd.DataFrame:
+		boxes = self.boxes
+		images = pd.Categorical.from_codes(boxes['image_id'], categories=self.images)
+		# File names of different directories may collide, so they are not used as categories directly
+		names = pd.Categorical(np.array([os.path.basename(image_path)[0:-4] for image_path in self.images] + [None], dtype=object)[boxes['image_id']])
+		df = pd.DataFrame({coordinate: boxes[coordinate] for coordinate in COORDINATES + ['confidence']})
+		if self.labels:
+			df['label'] = pd.Categorical.from_codes(boxes['label_id'], categories=self.labels)
+		df['name'] = names
+		df['image'] = images
+		return df
+
+
+def as_detections(detections) -> detection_table:
+	if isinstance(detections, detection_table):
+		return detections
+	return detection_table.from_dataframe(detections)
+
+def xyxy(boxes) -> np.ndarray:
+	return np.stack([boxes[coordinate] for coordinate in COORDINATES], axis=-1).astype(np.float64)
+
+def iou_matrix(boxes1, boxes2) -> np.ndarray:
+	"""
+	IoU of every box of boxes1 with every box of boxes2, len(boxes1) x len(boxes2)
+	"""
+	a = xyxy(boxes1)[:, None, :]
+	b = xyxy(boxes2)[None, :, :]
+	x_left = np.maximum(a[..., 0], b[..., 0])
+	y_top = np.maximum(a[..., 1], b[..., 1])
+	x_right = np.minimum(a[..., 2], b[..., 2])
+	y_bottom = np.minimum(a[..., 3], b[..., 3])
+	intersection_area = np.clip(x_right - x_left, 0, None) * np.clip(y_bottom - y_top, 0, None)
+	a_area = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+	b_area = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+	union_area = a_area + b_area - intersection_area
+	return np.where(union_area > 0, intersection_area / np.where(union_area > 0, union_area, 1), 0.0)
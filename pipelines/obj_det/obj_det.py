@@ -18,6 +18,9 @@ sys.path.append('../')
 
 from pipeline_input import *
 from constants import *
+from image_loader import image_loader
+from frame_cache import read_frame
+from .detection_table import detection_table, as_detections, iou_matrix
 
 
 import warnings as wr
@@ -41,9 +44,6 @@ from detectron2.config import get_cfg
 from detectron2.utils.visualizer import Visualizer
 from detectron2.data import MetadataCatalog, DatasetCatalog
 
-import mlflow
-import mlflow.sklearn
-from urllib.parse import urlparse
 import logging
 
 logging.basicConfig(level=logging.WARN)
@@ -123,11 +123,11 @@ class KITTI_lemenko_interp(pipeline_dataset_interpreter):
 		xtrain, xtest = self.generate_data(dataset['training'])
 		self.dataset = {
 			'train': {
-				'x': xtrain["image"].unique(),
+				'x': xtrain.image_paths(),
 				'y': xtrain
 			},
 			'test': {
-				'x': xtest["image"].unique(),
+				'x': xtest.image_paths(),
 				'y': xtest
 			}
 		}
@@ -161,71 +161,95 @@ class KITTI_lemenko_interp(pipeline_dataset_interpreter):
 
 		information = pd.DataFrame(information)
 		#return information, information
-		return train_test_split(information, test_size=0.1, random_state=1)
+		train, test = train_test_split(information, test_size=0.1, random_state=1)
+		return detection_table.from_dataframe(train), detection_table.from_dataframe(test)
 
 
 class obj_det_interp_1(pipeline_dataset_interpreter):
+	# iter_batches parses batch_size annotation files at a time
+	streaming = True
+
+	def split_paths(self, split):
+		split_dir = {'train': 'Train/Train', 'test': 'Test/Test'}[split]
+		image_path=os.path.join(self.input_dir, split_dir, 'JPEGImages')
+		annot_path=os.path.join(self.input_dir, split_dir, 'Annotations')
+		assert os.path.exists(image_path)
+		assert os.path.exists(annot_path)
+		return annot_path, image_path
+
+	def iter_batches(self, split, batch_size):
+		# One item per image, y holds every box of the images in x
+		annot_path, image_path = self.split_paths(split)
+		annot_files = sorted(glob.glob(str(annot_path+'/*.xml*')))
+		for start in range(0, len(annot_files), batch_size):
+			y = self.generate_data(annot_path, image_path, annot_files[start:start+batch_size])
+			if len(y)==0:
+				continue
+			yield {'x': y.image_paths(), 'y': y}
+
+	def split_len(self, split) -> int:
+		annot_path, image_path = self.split_paths(split)
+		return len(glob.glob(str(annot_path+'/*.xml*')))
+
 	def load(self) -> None:
 		super().load()
-		train_path=os.path.join(self.input_dir, 'Train/Train/JPEGImages')
-		train_annot=os.path.join(self.input_dir, 'Train/Train/Annotations')
-		test_path=os.path.join(self.input_dir, 'Test/Test/JPEGImages')
-		test_annot=os.path.join(self.input_dir, 'Test/Test/Annotations')
-		assert os.path.exists(train_path)
-		assert os.path.exists(train_annot)
-		assert os.path.exists(test_path)
-		assert os.path.exists(test_annot)
+		train_annot, train_path = self.split_paths('train')
+		test_annot, test_path = self.split_paths('test')
 		xtrain = self.generate_data(train_annot, train_path)
 		xtest = self.generate_data(test_annot, test_path)
 		self.dataset = {
 			'train': {
-				'x': xtrain["image"].unique(),
+				'x': xtrain.image_paths(),
 				'y': xtrain
 			},
 			'test': {
-				'x': xtest["image"].unique(),
+				'x': xtest.image_paths(),
 				'y': xtest
 			}
 		}
 		
-	def generate_data(self, Annotpath, Imagepath):
-		information={'xmin':[],'ymin':[],'xmax':[],'ymax':[],'ymax':[],'name':[] ,'label':[], 'image':[]}
-		for file in sorted(glob.glob(str(Annotpath+'/*.xml*'))):
+	def generate_data(self, Annotpath, Imagepath, annot_files=None) -> detection_table:
+		information = detection_table()
+		if annot_files is None:
+			annot_files = sorted(glob.glob(str(Annotpath+'/*.xml*')))
+		for file in annot_files:
+			file_name = file.split('/')[-1][0:-4]
+			image_path = os.path.join(Imagepath, file_name + '.jpg')
 			dat=ET.parse(file)
 			for element in dat.iter():    
 				if 'object'==element.tag:
+					name = None
+					bbox = {}
 					for attribute in list(element):
 						if 'name' in attribute.tag:
 							name = attribute.text
-							file_name = file.split('/')[-1][0:-4]
-							information['label'] += [name]
-							information['name'] +=[file_name]
-							#information['name'] +=[file]
-							information['image'] += [os.path.join(Imagepath, file_name + '.jpg')]
 						if 'bndbox'==attribute.tag:
 							for dim in list(attribute):
-								if 'xmin'==dim.tag:
-									xmin=int(round(float(dim.text)))
-									information['xmin']+=[xmin]
-								if 'ymin'==dim.tag:
-									ymin=int(round(float(dim.text)))
-									information['ymin']+=[ymin]
-								if 'xmax'==dim.tag:
-									xmax=int(round(float(dim.text)))
-									information['xmax']+=[xmax]
-								if 'ymax'==dim.tag:
-									ymax=int(round(float(dim.text)))
-									information['ymax']+=[ymax]
-		return pd.DataFrame(information)
+								if dim.tag in ('xmin', 'ymin', 'xmax', 'ymax'):
+									bbox[dim.tag] = int(round(float(dim.text)))
+					information.add(image_path, [bbox['xmin'], bbox['ymin'], bbox['xmax'], bbox['ymax']], label=name)
+		return information
+
+def largest_ious(labels, detections) -> np.ndarray:
+	# IoU of every label box with its best matching detection, 0 when the image has no detections
+	if len(detections)==0:
+		return np.zeros(len(labels))
+	return iou_matrix(labels, detections).max(axis=1)
+
+def draw_boxes(img, boxes, color):
+	for box in boxes:
+		img = cv2.rectangle(img, (round(float(box['xmin'])), round(float(box['ymin']))), (round(float(box['xmax'])), round(float(box['ymax']))), color, 2)
+	return img
+
 
 class streamlit_viz(pipeline_streamlit_visualizer):
 
 	def visualize(self):
 		self.load_data()
 		self.st.markdown("# Visuals")
-		preds = self.testing_predictions
-		y = self.dat['test']['y']
-		image_names_list = y["name"].unique()
+		preds = as_detections(self.testing_predictions)
+		y = as_detections(self.dat['test']['y'])
+		image_paths = y.image_paths()
 		iou_list = []
 		iou_thresh = 0.5
 		yolo_metrics = {
@@ -238,24 +262,14 @@ class streamlit_viz(pipeline_streamlit_visualizer):
 		iou_thresh_min, iou_thresh_max = self.st.sidebar.slider('IOU Threshold', 0, 100, [0,10])
 		iou_thresh_min, iou_thresh_max = iou_thresh_min/100.0, iou_thresh_max/100.0
 
-		for image_name in tqdm(image_names_list, file=sys.__stdout__):
-			iou_list = []
-			labels = y[y["name"]==image_name]
-			detections = preds[preds["name"]==image_name]
-			for index1, lab in labels.iterrows():
-				largest_iou = 0.0
-				for index2, yolo_bb in detections.iterrows():
-					iou = get_iou(lab, yolo_bb)
-					if iou > largest_iou:
-						largest_iou = iou
-				if largest_iou==0:
-					yolo_metrics['fn'] += 1
-				else:
-					if largest_iou>iou_thresh:
-						yolo_metrics['tp'] += 1
-					else:
-						yolo_metrics['fp'] += 1
-				iou_list.append(largest_iou)
+		for image_path in tqdm(image_paths, file=sys.__stdout__):
+			labels = y.for_image(image_path)
+			detections = preds.for_image(image_path)
+			ious = largest_ious(labels, detections)
+			yolo_metrics['fn'] += int(np.sum(ious==0))
+			yolo_metrics['tp'] += int(np.sum(ious>iou_thresh))
+			yolo_metrics['fp'] += int(np.sum((ious>0) & (ious<=iou_thresh)))
+			iou_list = list(ious)
 
 			min_iou = min(iou_list)
 			max_iou = max(iou_list)
@@ -263,12 +277,9 @@ class streamlit_viz(pipeline_streamlit_visualizer):
 
 			if iou_thresh_min <= min_iou and  max_iou <= iou_thresh_max:
 
-				image_path = labels["image"].iloc[0]
-				img = cv2.imread(image_path)
-				for index1, lab in labels.iterrows():
-					img = cv2.rectangle(img, (round(lab['xmin']), round(lab['ymin'])), (round(lab['xmax']), round(lab['ymax'])), (255,255,0),2)
-				for index2, lab in detections.iterrows():
-					img = cv2.rectangle(img, (round(lab['xmin']), round(lab['ymin'])), (round(lab['xmax']), round(lab['ymax'])), (0,255,0),2)
+				img = read_frame(image_path)
+				img = draw_boxes(img, labels, (255,255,0))
+				img = draw_boxes(img, detections, (0,255,0))
 				
 				img = cv2.putText(img, 'min_iou='+str(round(min_iou,4)), (25,25), 
 					cv2.FONT_HERSHEY_SIMPLEX, 
@@ -297,9 +308,17 @@ class iou_viz(pipeline_data_visualizer):
 	def __init__(self) -> None:
 		super().__init__()
 
+	def visualize_batches(self, batches, results, preds, save_dir) -> None:
+		# Images are drawn one at a time, so only the labels of a batch are needed at once
+		preds = as_detections(preds)
+		for batch in batches:
+			self.visualize(batch['x'], batch['y'], results, preds, save_dir)
+
 	def visualize(self, x, y, results, preds, save_dir) -> None:
 		plot = True
-		image_names_list = y["name"].unique()
+		y = as_detections(y)
+		preds = as_detections(preds)
+		image_paths = y.image_paths()
 		iou_list = []
 		iou_thresh = 0.5
 		yolo_metrics = {
@@ -308,31 +327,18 @@ class iou_viz(pipeline_data_visualizer):
 			'fn':0		# iou==0	
 		}
 		print("obj_det_data_visualizer: visualize")
-		for image_name in tqdm(image_names_list, file=sys.__stdout__):
-			iou_list = []
-			labels = y[y["name"]==image_name]
-			detections = preds[preds["name"]==image_name]
-			for index1, lab in labels.iterrows():
-				largest_iou = 0.0
-				for index2, yolo_bb in detections.iterrows():
-					iou = get_iou(lab, yolo_bb)
-					if iou > largest_iou:
-						largest_iou = iou
-				if largest_iou==0:
-					yolo_metrics['fn'] += 1
-				else:
-					if largest_iou>iou_thresh:
-						yolo_metrics['tp'] += 1
-					else:
-						yolo_metrics['fp'] += 1
-				iou_list.append(largest_iou)
-
-			image_path = labels["image"].iloc[0]
-			img = cv2.imread(image_path)
-			for index1, lab in labels.iterrows():
-				img = cv2.rectangle(img, (round(lab['xmin']), round(lab['ymin'])), (round(lab['xmax']), round(lab['ymax'])), (255,255,0),2)
-			for index2, lab in detections.iterrows():
-				img = cv2.rectangle(img, (round(lab['xmin']), round(lab['ymin'])), (round(lab['xmax']), round(lab['ymax'])), (0,255,0),2)
+		for image_path in tqdm(image_paths, file=sys.__stdout__):
+			labels = y.for_image(image_path)
+			detections = preds.for_image(image_path)
+			ious = largest_ious(labels, detections)
+			yolo_metrics['fn'] += int(np.sum(ious==0))
+			yolo_metrics['tp'] += int(np.sum(ious>iou_thresh))
+			yolo_metrics['fp'] += int(np.sum((ious>0) & (ious<=iou_thresh)))
+			iou_list = list(ious)
+
+			img = read_frame(image_path)
+			img = draw_boxes(img, labels, (255,255,0))
+			img = draw_boxes(img, detections, (0,255,0))
 			
 			min_iou = min(iou_list)
 			max_iou = max(iou_list)
@@ -399,8 +405,9 @@ class iou_sub_10_percent(iou_sub_x_percent):
 class obj_det_evaluator:
 
 	def evaluate(self, x, y, plot=False):
-		preds = self.predict(x)
-		image_names_list = y["name"].unique()
+		preds = as_detections(self.predict(x))
+		y = as_detections(y)
+		image_paths = y.image_paths()
 		iou_list = []
 		iou_thresh = 0.5
 		yolo_metrics = {
@@ -410,30 +417,18 @@ class obj_det_evaluator:
 		}
 		print("obj_det_evaluator")
 
-		for image_name in tqdm(image_names_list, file=sys.__stdout__):
-			labels = y[y["name"]==image_name]
-			detections = preds[preds["name"]==image_name]
-			for index1, lab in labels.iterrows():
-				largest_iou = 0.0
-				for index2, yolo_bb in detections.iterrows():
-					iou = get_iou(lab, yolo_bb)
-					if iou > largest_iou:
-						largest_iou = iou
-				if largest_iou==0:
-					yolo_metrics['fn'] += 1
-				else:
-					if largest_iou>iou_thresh:
-						yolo_metrics['tp'] += 1
-					else:
-						yolo_metrics['fp'] += 1
-				iou_list.append(largest_iou)
+		for image_path in tqdm(image_paths, file=sys.__stdout__):
+			labels = y.for_image(image_path)
+			detections = preds.for_image(image_path)
+			ious = largest_ious(labels, detections)
+			yolo_metrics['fn'] += int(np.sum(ious==0))
+			yolo_metrics['tp'] += int(np.sum(ious>iou_thresh))
+			yolo_metrics['fp'] += int(np.sum((ious>0) & (ious<=iou_thresh)))
+			iou_list += list(ious)
 			if plot:
-				image_path = labels["image"].iloc[0]
-				img = cv2.imread(image_path)
-				for index1, lab in labels.iterrows():
-					img = cv2.rectangle(img, (round(lab['xmin']), round(lab['ymin'])), (round(lab['xmax']), round(lab['ymax'])), (255,0,0),2)
-				for index2, lab in detections.iterrows():
-					img = cv2.rectangle(img, (round(lab['xmin']), round(lab['ymin'])), (round(lab['xmax']), round(lab['ymax'])), (0,255,0),2)
+				img = read_frame(image_path)
+				img = draw_boxes(img, labels, (255,0,0))
+				img = draw_boxes(img, detections, (0,255,0))
 				print(len(labels), len(detections))
 				print(labels)
 				print(detections)
@@ -450,73 +445,70 @@ class obj_det_evaluator:
 			'confusion': yolo_metrics
 		}
 
-		model_name = ((str(self.__class__.__name__).split('_'))[-1]).capitalize()
-
-		with mlflow.start_run(run_name = model_name):
-			# mlflow.log_param("alpha", alpha)
-			# mlflow.log_param("l1_ratio", l1_ratio)
-			mlflow.log_metric("prec", prec)
-			mlflow.log_metric("recall", recall)
-			mlflow.log_metric("f1_score", f1_score)
-			mlflow.log_metric("iou_average", iou_avg)
-			# mlflow.log_metric("confusion", yolo_metrics)
-			# mlflow.log_metric(str(key),value)
-
-			tracking_url_type_store = urlparse(mlflow.get_tracking_uri()).scheme
-
-			# Model registry does not work with file store
-			if tracking_url_type_store != "file":
-
-				# Register the model
-				# There are other ways to use the Model Registry, which depends on the use case,
-				# please refer to the doc for more information:
-				# https://mlflow.org/docs/latest/model-registry.html#api-workflow
-				mlflow.sklearn.log_model(self.model, "model", registered_model_name="ElasticnetWineModel")
-			else:
-				mlflow.sklearn.log_model(self.model, "model")
+		# Logged into the run of the stage, the model only when TRACKING_LOG_MODELS=1
+		self.pipeline_tracking.log_metrics({
+			'prec': prec,
+			'recall': recall,
+			'f1_score': f1_score,
+			'iou_average': iou_avg,
+		})
+		self.pipeline_tracking.log_model(self.model, "model")
 
 		print(results)
 		preds1 = preds
 		return results, preds1
 
+	def merge_results(self, results, sizes):
+		# Precision and recall of a streamed dataset come from the summed confusion counts
+		if not all('confusion' in batch_results for batch_results in results):
+			return super().merge_results(results, sizes)
+		yolo_metrics = {key: sum(batch_results['confusion'][key] for batch_results in results) for key in ('tp', 'fp', 'fn')}
+		label_counts = [sum(batch_results['confusion'].values()) for batch_results in results]
+		prec = np.float64(yolo_metrics['tp']) / float(yolo_metrics['tp'] + yolo_metrics['fp'])
+		recall = np.float64(yolo_metrics['tp']) / float(yolo_metrics['tp'] + yolo_metrics['fn'])
+		f1_score = np.float64(2*prec*recall)/(prec+recall)
+		iou_avg = np.float64(sum(batch_results['iou_avg']*count for batch_results, count in zip(results, label_counts))) / sum(label_counts)
+		return {
+			'prec': prec,
+			'recall': recall,
+			'f1_score': f1_score,
+			'iou_avg': iou_avg,
+			'confusion': yolo_metrics
+		}
+
 
 class obj_det_pipeline_model(obj_det_evaluator, pipeline_model):
+	# Pretrained yolov5, train only predicts
+	frozen = True
 
 	def load(self):
 		self.model = torch.hub.load('ultralytics/yolov5', 'yolov5s')
 		
 	def train(self, x, y) -> np.array:
 		preds = self.predict(x)
-		image_names_list = y["name"].unique()
 		
 		results = {
 			'training_results': 1,
 		}
 		return results, preds
 
-		
-	def predict(self, x: dict) -> np.array:
-		# Runs prediction on list of values x of length n
-		# Returns a list of values of length n
-		predict_results = {
-			'xmin': [], 'ymin':[], 'xmax':[], 'ymax':[], 'confidence': [], 'name':[], 'image':[]
-		}
-		print("obj_det_pipeline_model: predict")
-		for image_path in tqdm(x, file=sys.__stdout__):
-			img = cv2.imread(image_path)
-			results = self.model(image_path)
-			df = results.pandas().xyxyn[0]
-			res = df[df["name"]=="person"]
-			for index, yolo_bb in res.iterrows():
-				file_name = image_path.split('/')[-1][0:-4]
-				predict_results["xmin"] += [yolo_bb["xmin"]*img.shape[1]]
-				predict_results["ymin"] += [yolo_bb["ymin"]*img.shape[0]]
-				predict_results["xmax"] += [yolo_bb["xmax"]*img.shape[1]]
-				predict_results["ymax"] += [yolo_bb["ymax"]*img.shape[0]]
-				predict_results["confidence"] += [yolo_bb["confidence"]]
-				predict_results["name"] += [file_name]
-				predict_results["image"] += [image_path]
-		predict_results = pd.DataFrame(predict_results)
+
+	def item_image(self, image_path):
+		return image_path
+
+	def predict_batch(self, x_batch, images=None) -> detection_table:
+		# The image paths of x_batch go through yolov5 as one batch, predict joins the batches
+		predict_results = detection_table()
+		image_paths = list(x_batch)
+		if len(image_paths):
+			if images is None:
+				images = image_loader(image_paths).images()
+			# yolov5 takes numpy images as RGB
+			results = self.model([image[..., ::-1] for image in images])
+			# xyxy is in pixels of the original image
+			for image_path, df in zip(image_paths, results.pandas().xyxy):
+				res = df[df["name"]=="person"]
+				predict_results.add(image_path, res[['xmin', 'ymin', 'xmax', 'ymax']].to_numpy(), res["confidence"].to_numpy())
 		return predict_results
 
 
@@ -542,43 +534,24 @@ class obj_det_pipeline_model_yolov5x(obj_det_pipeline_model):
 
 class obj_det_pipeline_ensembler_1(obj_det_evaluator, pipeline_ensembler):
 
-	def predict(self, x: dict) -> np.array:
+	def predict(self, x: dict) -> detection_table:
 		model_names = list(x.keys())
-		image_paths = x[model_names[0]]["image"].unique()
-		nms_res = {'xmin':[],'ymin':[],'xmax':[],'ymax':[],'ymax':[], 'confidence':[],'name':[], 'image':[]}
+		model_preds = [as_detections(x[mod_name]) for mod_name in model_names]
+		image_paths = model_preds[0].image_paths()
+		nms_res = detection_table()
 		for img_path in image_paths:
-			boxes = []
-			scores = []
-			for mod_name in model_names:
-				preds = x[mod_name][x[mod_name]["image"]==img_path]
-				for index, lab in preds.iterrows():
-					boxes.append((
-						lab['xmin'],				# x
-						lab['ymin'],				# y
-						lab['xmax'] - lab['xmin'],	# w
-						lab['ymax'] - lab['ymin'],	# h
-					))
-					scores.append(lab['confidence'])
-			indexes = cv2.dnn.NMSBoxes(boxes, scores,score_threshold=0.4,nms_threshold=0.8)
-			for ind in indexes:
-				i = ind
-				if type(ind)==list:
-					i = ind[0]
-				file_name = img_path.split('/')[-1][0:-4]
-				nms_res['xmin'] += [boxes[i][0]]
-				nms_res['ymin'] += [boxes[i][1]]
-				nms_res['xmax'] += [boxes[i][0] + boxes[i][2]]
-				nms_res['ymax'] += [boxes[i][1] + boxes[i][3]]
-				nms_res['confidence'] += [scores[i]]
-				nms_res['name'] += [file_name]
-				nms_res['image'] += [img_path]
-		nms_res = pd.DataFrame(nms_res)
-		print(nms_res)
+			preds = np.concatenate([mod_preds.for_image(img_path) for mod_preds in model_preds])
+			# x, y, w, h
+			boxes = np.stack([preds['xmin'], preds['ymin'], preds['xmax'] - preds['xmin'], preds['ymax'] - preds['ymin']], axis=-1).tolist()
+			scores = preds['confidence'].tolist()
+			indexes = np.array(cv2.dnn.NMSBoxes(boxes, scores,score_threshold=0.4,nms_threshold=0.8), dtype=int).reshape(-1)
+			kept = preds[indexes]
+			nms_res.add(img_path, np.stack([kept['xmin'], kept['ymin'], kept['xmax'], kept['ymax']], axis=-1), kept['confidence'])
+		print(nms_res.to_dataframe())
 		return nms_res
 
 	def train(self, x, y) -> np.array:
 		preds = self.predict(x)
-		image_names_list = y["name"].unique()
 		
 		results = {
 			'training_results': 0,
@@ -587,6 +560,8 @@ class obj_det_pipeline_ensembler_1(obj_det_evaluator, pipeline_ensembler):
 
 
 class obj_det_pipeline_model_yolov3(obj_det_evaluator, pipeline_model):
+	frozen = True
+
 	def load(self):
 		self.weights = 'dependencies/yolov3.weights'
 		self.cfg = 'dependencies/yolov3.cfg'
@@ -598,13 +573,10 @@ class obj_det_pipeline_model_yolov3(obj_det_evaluator, pipeline_model):
 		pass
 	def train(self):
 		pass
-	def predict(self, x: np.array) -> np.array:
-		predict_results = {
-			'xmin': [], 'ymin':[], 'xmax':[], 'ymax':[], 'confidence': [], 'name':[], 'image':[]
-		}
+	def predict(self, x: np.array) -> detection_table:
+		predict_results = detection_table()
 		
-		for image_path in tqdm(x):
-			image = cv2.imread(image_path)
+		for image_path, image in tqdm(image_loader(x), total=len(x)):
 			height, width = image.shape[:2]
 			height = image.shape[0]
 			width = image.shape[1]
@@ -643,51 +615,54 @@ class obj_det_pipeline_model_yolov3(obj_det_evaluator, pipeline_model):
 					y = person_boxes[it][1]
 					w = person_boxes[it][2]
 					h = person_boxes[it][3]
-					file_name = image_path.split('/')[-1][0:-4]
-					predict_results["xmin"] += [x]
-					predict_results["ymin"] += [y]
-					predict_results["xmax"] += [x+w]
-					predict_results["ymax"] += [y+h]
-					predict_results["confidence"] += [person_confidences[i]]
-					predict_results["name"] += [file_name]
-					predict_results["image"] += [image_path]
+					predict_results.add(image_path, [x, y, x+w, y+h], person_confidences[i])
 					it += 1
-		predict_results = pd.DataFrame(predict_results)
 		return predict_results
 	
 
 class obj_det_pipeline_model_frcnn(obj_det_evaluator, pipeline_model):
+	frozen = True
+
 	def load(self):
 		self.cfg = get_cfg()
 		self.cfg.merge_from_file(model_zoo.get_config_file("COCO-Detection/faster_rcnn_X_101_32x8d_FPN_3x.yaml"))
 		self.cfg.MODEL.ROI_HEADS.SCORE_THRESH_TEST = 0.5 
 		self.cfg.MODEL.WEIGHTS = model_zoo.get_checkpoint_url("COCO-Detection/faster_rcnn_X_101_32x8d_FPN_3x.yaml")
-		pass
+		self.predictor = DefaultPredictor(self.cfg)
 	def train(self):
 		pass
-	def predict(self, x: np.array) -> np.array:
-		predict_results = {
-			'xmin': [], 'ymin':[], 'xmax':[], 'ymax':[], 'confidence': [], 'name':[], 'image':[]
-		}
-		predictor = DefaultPredictor(self.cfg)
-		for image_path in tqdm(x):
-			img = cv2.imread(image_path)
-			outputs = predictor(img)
-			v = Visualizer(img[:, :, ::-1], MetadataCatalog.get(self.cfg.DATASETS.TRAIN[0]), scale=1.2)
-			boxes = v._convert_boxes(outputs["instances"][outputs["instances"].pred_classes == 0].pred_boxes.to('cpu'))
-			for box in boxes:
-				file_name = image_path.split('/')[-1][0:-4]
-				predict_results["xmin"] += [box[0]]
-				predict_results["ymin"] += [box[1]]
-				predict_results["xmax"] += [box[2]]
-				predict_results["ymax"] += [box[3]]
-				predict_results["confidence"] += [0]
-				predict_results["name"] += [file_name]
-				predict_results["image"] += [image_path]
-		predict_results = pd.DataFrame(predict_results)
+	def item_image(self, image_path):
+		return image_path
+
+	def predict_batch(self, x_batch, images=None) -> detection_table:
+		predict_results = detection_table()
+		image_paths = list(x_batch)
+		if images is None:
+			images = image_loader(image_paths).images()
+		batch_outputs = predictor_batch(self.predictor, images)
+		for image_path, outputs in zip(image_paths, batch_outputs):
+			instances = outputs["instances"].to('cpu')
+			boxes = instances[instances.pred_classes == 0].pred_boxes.tensor.numpy()
+			predict_results.add(image_path, boxes, 0)
 		return predict_results
 
 
+def predictor_batch(predictor, images) -> list:
+	# DefaultPredictor.__call__ for a list of BGR images in a single forward pass
+	if len(images) == 0:
+		return []
+	with torch.no_grad():
+		inputs = []
+		for original_image in images:
+			if predictor.input_format == "RGB":
+				original_image = original_image[:, :, ::-1]
+			height, width = original_image.shape[:2]
+			image = predictor.aug.get_transform(original_image).apply_image(original_image)
+			image = torch.as_tensor(image.astype("float32").transpose(2, 0, 1))
+			inputs.append({"image": image, "height": height, "width": width})
+		return predictor.model(inputs)
+
+
 obj_det_input = pipeline_input("obj_det", 
 	p_dataset_interpreter={
 		# 'KITTI_lemenko_interp':KITTI_lemenko_interp,
@@ -0,0 +1,82 @@
+"""
+packed_masks
+
+Instance masks of one image stored one bit a pixel with np.packbits, 8 times
+smaller than the H x W bool arrays detectron2 returns. Unions, intersections
+and areas are computed on the packed bytes, masks are only unpacked when
+they are drawn.
+"""
+
+import numpy as np
+
+# Set bits of every byte value
+POPCOUNT_TABLE = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+def pack_mask(mask) -> np.ndarray:
+	return np.packbits(np.asarray(mask, dtype=bool).reshape(-1))
+
+def popcount(packed) -> int:
+	return int(POPCOUNT_TABLE[packed].sum(dtype=np.int64))
+
+def packed_iou(packed1, packed2) -> float:
+	"""
+	IoU of two packed masks of the same shape, 0 when both are empty
+	"""
+	union = popcount(np.bitwise_or(packed1, packed2))
+	if union == 0:
+		return 0.0
+	return popcount(np.bitwise_and(packed1, packed2)) / union
+
+
+class packed_masks:
+
+	def __init__(self, masks=None, shape=None, bits=None) -> None:
+		"""
+		masks: N x H x W bool array, or shape (H, W) with the already packed N x ceil(H*W/8) bits
+		"""
+		if masks is not None:
+			masks = np.asarray(masks, dtype=bool)
+			assert masks.ndim == 3, "Expected N x H x W masks, got " + str(masks.shape)
+			shape = masks.shape[1:]
+			bits = np.packbits(masks.reshape(len(masks), shape[0] * shape[1]), axis=1)
+		assert shape is not None and bits is not None
+		self.shape = tuple(shape)
+		self.bits = bits
+
+	def __len__(self):
+		return len(self.bits)
+
+	def __getitem__(self, index) -> np.ndarray:
+		size = self.shape[0] * self.shape[1]
+		return np.unpackbits(self.bits[index], count=size).view(bool).reshape(self.shape)
+
+	def __iter__(self):
+		for index in range(len(self)):
+			yield self[index]
+
+	@property
+	def nbytes(self) -> int:
+		return self.bits.nbytes
+
+	def decode(self) -> np.ndarray:
+		size = self.shape[0] * self.shape[1]
+		return np.unpackbits(self.bits, axis=1, count=size).view(bool).reshape((len(self),) + self.shape)
+
+	def union(self, indices=None) -> np.ndarray:
+		"""
+		Packed union of the masks at indices, all of them by default
+		"""
+		bits = self.bits if indices is None else self.bits[list(indices)]
+		if len(bits) == 0:
+			return np.zeros(self.bits.shape[1], dtype=np.uint8)
+		return np.bitwise_or.reduce(bits, axis=0)
+
+	def areas(self) -> np.ndarray:
+		return POPCOUNT_TABLE[self.bits].sum(axis=1, dtype=np.int64)
+
+
+def as_packed_masks(masks) -> packed_masks:
+	# Predictions stored before the masks were packed hold the N x H x W array
+	if masks is None or isinstance(masks, packed_masks):
+		return masks
+	return packed_masks(masks)
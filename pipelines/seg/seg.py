@@ -15,6 +15,9 @@ sys.path.append('../')
 
 from pipeline_input import pipeline_data_visualizer, pipeline_dataset_interpreter, pipeline_ensembler, pipeline_model, pipeline_input, pipeline_streamlit_visualizer
 from constants import *
+from image_loader import image_loader
+from frame_cache import read_frame
+from .packed_masks import packed_masks, as_packed_masks, pack_mask, popcount
 
 # Some basic setup:
 # Setup detectron2 logger
@@ -318,7 +321,7 @@ class iou_vis(seg_data_visualizer):
 			scores = row['scores']
 			classes = row['classes']
 			keypoints = row['keypoints']
-			masks = row['masks']
+			masks = as_packed_masks(row['masks'])
 
 			# visualizer = Visualizer(img, self.metadata, instance_mode=self.instance_mode)
 			# vis_output = visualizer.draw_instance_predictions(predictions=instances)
@@ -352,7 +355,7 @@ class video_vis(seg_data_visualizer):
 			scores = row['scores']
 			classes = row['classes']
 			keypoints = row['keypoints']
-			masks = row['masks']
+			masks = as_packed_masks(row['masks'])
 
 			# visualizer = Visualizer(img, self.metadata, instance_mode=self.instance_mode)
 			# vis_output = visualizer.draw_instance_predictions(predictions=instances)
@@ -390,6 +393,17 @@ class video_vis(seg_data_visualizer):
 			#cv2.imwrite(save_path, vis_output_img)
 	
 
+def selected_instances(pred_classes_list, model_output_classes, color_map) -> list:
+	# Indices of the predicted instances whose class maps to a class of the ground truth
+	indices = []
+	for ind, pred_class in enumerate(pred_classes_list or []):
+		#if pred_class in (3, 4, 6, 8, ):
+		for class_name in color_map:
+			if pred_class in model_output_classes[class_name]:
+				indices.append(ind)
+	return indices
+
+
 class seg_evaluator:
 
 	def evaluate(self, x, y):
@@ -409,9 +423,9 @@ class seg_evaluator:
 
 		dat_test = x.join(y)
 		print("Evaluate")
-		for index, row in tqdm(dat_test.iterrows(), total=dat_test.shape[0]):
-			img = cv2.imread(row['image_2'])
-			semantic_rgb = cv2.imread(row['semantic_rgb'])
+		# The image and its ground truth are decoded ahead on the loader's threads
+		loader = image_loader(zip(dat_test['image_2'], dat_test['semantic_rgb']), read=lambda paths: (read_frame(paths[0]), read_frame(paths[1])))
+		for (index, row), (paths, (img, semantic_rgb)) in tqdm(zip(dat_test.iterrows(), loader), total=dat_test.shape[0]):
 			semantic_rgb = cv2.resize(semantic_rgb, dsize=(img.shape[1], img.shape[0]), interpolation=cv2.INTER_CUBIC)
 			color_map = row['color_map']
 
@@ -420,27 +434,19 @@ class seg_evaluator:
 				for color in color_map[class_name]:
 					gt_mask += (semantic_rgb == color).all(-1)
 
-			pred_mask = np.full(gt_mask.shape, False, dtype=bool)
-
 			model_pred = preds[preds["image_2"]==row['image_2']]
-			pred_mask_list = model_pred["masks"].iloc[0]
+			pred_masks = as_packed_masks(model_pred["masks"].iloc[0])
 			pred_classes_list = model_pred["classes"].iloc[0]
 			model_output_classes = preds['model_output_classes'].iloc[0]
-			pred_classes_list_final = []
-			for ind, msk in enumerate(pred_mask_list):
-				pred_class = pred_classes_list[ind]
-				#if pred_class in (3, 4, 6, 8, ):
-				for class_name in color_map:
-					if pred_class in model_output_classes[class_name]:
-						pred_mask = np.logical_or(pred_mask, msk)
-						pred_classes_list_final.append(msk)
-			
-			pred_classes_list = pred_classes_list_final
-
-			intersection = np.logical_and(gt_mask, pred_mask)
-			union = np.logical_or(gt_mask, pred_mask)
-			IOU = np.sum(intersection) / np.sum(union)
-			Dice_coeff = 2 * np.sum(intersection) / (np.sum(gt_mask) + np.sum(pred_mask))
+			indices = selected_instances(pred_classes_list, model_output_classes, color_map)
+
+			# Compared bit packed, the predicted masks are never unpacked
+			gt_packed = pack_mask(gt_mask)
+			pred_packed = pred_masks.union(indices) if pred_masks is not None else np.zeros_like(gt_packed)
+			intersection = popcount(np.bitwise_and(gt_packed, pred_packed))
+			union = popcount(np.bitwise_or(gt_packed, pred_packed))
+			IOU = np.float64(intersection) / union
+			Dice_coeff = np.float64(2 * intersection) / (popcount(gt_packed) + popcount(pred_packed))
 			Dice_coeff_list.append(Dice_coeff)
 			iou_list.append(IOU)
 			if IOU==0:
@@ -471,6 +477,8 @@ class seg_evaluator:
 		return results, preds
 
 class detectron_base_model(seg_evaluator, pipeline_model, seg_cfg):
+	# Model zoo weights, train only evaluates
+	frozen = True
 
 	def load(self):
 		self.get_cfg()
@@ -484,9 +492,14 @@ class detectron_base_model(seg_evaluator, pipeline_model, seg_cfg):
 
 		return results, preds
 
-	def predict(self, x) -> np.array:
-		# Runs prediction on list of values x of length n
-		# Returns a list of values of length n
+	def item_image(self, row):
+		return row['image_2']
+
+	def read_image(self, image_path):
+		return read_image(image_path)
+
+	def predict_batch(self, x_batch, images=None) -> pd.DataFrame:
+		# The rows of x_batch go through the predictor as one batch, predict joins the batches
 
 		predict_results = {
 			'image_2': [],
@@ -497,13 +510,9 @@ class detectron_base_model(seg_evaluator, pipeline_model, seg_cfg):
 			'masks': [],
 			'model_output_classes': []
 		}
-		for index, row in tqdm(x.iterrows(), total=x.shape[0]):
-		# 	# TODO produce model predictions
-			# img = cv2.imread(row['image_2'])
-			img = read_image(row['image_2'])
-			
-			outputs = self.predictor(img)
-			
+		if images is None:
+			images = image_loader(x_batch['image_2'], read=read_image).images()
+		for image_path, outputs in zip(x_batch['image_2'], predictor_batch(self.predictor, images)):
 			instances = outputs["instances"].to(self.cpu_device) # detectron2.structures.instances.Instances
 			predictions = instances
 			boxes = predictions.pred_boxes if predictions.has("pred_boxes") else None
@@ -512,12 +521,12 @@ class detectron_base_model(seg_evaluator, pipeline_model, seg_cfg):
 			keypoints = predictions.pred_keypoints if predictions.has("pred_keypoints") else None
 
 			if predictions.has("pred_masks"):
-				masks = np.asarray(predictions.pred_masks)
+				masks = packed_masks(np.asarray(predictions.pred_masks))
 			else:
 				masks = None
 
 
-			predict_results['image_2'] += [row['image_2'], ]
+			predict_results['image_2'] += [image_path, ]
 			predict_results['boxes'] += [boxes, ]
 			predict_results['scores'] += [scores, ]
 			predict_results['classes'] += [classes, ]
@@ -529,6 +538,32 @@ class detectron_base_model(seg_evaluator, pipeline_model, seg_cfg):
 		predict_results = pd.DataFrame(predict_results)
 		return predict_results
 
+	def split_predictions(self, x_batch, predictions):
+		# One row per row of x_batch
+		return [predictions.iloc[i:i + 1] for i in range(len(predictions))]
+
+	def reuse_prediction(self, item, prediction):
+		# Same image contents, possibly under the path of another dataset version
+		prediction = prediction.copy()
+		prediction['image_2'] = [item['image_2']]
+		return prediction
+
+
+def predictor_batch(predictor, images) -> list:
+	# DefaultPredictor.__call__ for a list of images in a single forward pass
+	if len(images) == 0:
+		return []
+	with torch.no_grad():
+		inputs = []
+		for original_image in images:
+			if predictor.input_format == "RGB":
+				original_image = original_image[:, :, ::-1]
+			height, width = original_image.shape[:2]
+			image = predictor.aug.get_transform(original_image).apply_image(original_image)
+			image = torch.as_tensor(image.astype("float32").transpose(2, 0, 1))
+			inputs.append({"image": image, "height": height, "width": width})
+		return predictor.model(inputs)
+
 
 class mask_rcnn(detectron_base_model):
 	config_path = os.path.expanduser("~/detectron2/configs/quick_schedules/mask_rcnn_R_50_FPN_inference_acc_test.yaml")
@@ -602,11 +637,13 @@ class streamlit_viz(pipeline_streamlit_visualizer):
 		self.st.write(self.testing_results)
 		#self.st.write(self.testing_predictions)
 
-		self.st.markdown("# Training Results")
-		self.st.write(self.training_results)
+		if self.training_results is not None:
+			self.st.markdown("# Training Results")
+			self.st.write(self.training_results)
 
 		self.st.markdown("# Visuals")
-		training_data = False
+		# Frozen models have no training predictions to show
+		training_data = False and self.training_predictions_reader is not None
 
 		if training_data:
 			preds = self.training_predictions
@@ -630,8 +667,8 @@ class streamlit_viz(pipeline_streamlit_visualizer):
 		
 		dat_test = x.join(y)
 		for index, row in dat_test.iterrows():
-			img = cv2.imread(row['image_2'])
-			semantic_rgb = cv2.imread(row['semantic_rgb'])
+			img = read_frame(row['image_2'])
+			semantic_rgb = read_frame(row['semantic_rgb'])
 			semantic_rgb = cv2.resize(semantic_rgb, dsize=(img.shape[1], img.shape[0]), interpolation=cv2.INTER_CUBIC)
 			color_map = row['color_map']
 			
@@ -641,25 +678,17 @@ class streamlit_viz(pipeline_streamlit_visualizer):
 				for color in color_map[class_name]:
 					gt_mask += (semantic_rgb == color).all(-1)
 
-			pred_mask = np.full(gt_mask.shape, False, dtype=bool)
-
 			model_pred = preds[preds["image_2"]==row['image_2']]
-			pred_mask_list = model_pred["masks"].iloc[0]
+			pred_masks = as_packed_masks(model_pred["masks"].iloc[0])
 			pred_classes_list = model_pred["classes"].iloc[0]
 			model_output_classes = preds['model_output_classes'].iloc[0]
-			pred_classes_list_final = []
-			for ind, msk in enumerate(pred_mask_list):
-				pred_class = pred_classes_list[ind]
-				#if pred_class in (3, 4, 6, 8, ):
-				for class_name in color_map:
-					if pred_class in model_output_classes[class_name]:
-						pred_mask = np.logical_or(pred_mask, msk)
-						pred_classes_list_final.append(msk)
-			
-			intersection = np.logical_and(gt_mask, pred_mask)
-			union = np.logical_or(gt_mask, pred_mask)
-			IOU = 1.0 * np.sum(intersection) / np.sum(union)
-			Dice_coeff = 2 * np.sum(intersection) / (np.sum(gt_mask) + np.sum(pred_mask))
+			indices = selected_instances(pred_classes_list, model_output_classes, color_map)
+
+			gt_packed = pack_mask(gt_mask)
+			pred_packed = pred_masks.union(indices) if pred_masks is not None else np.zeros_like(gt_packed)
+			intersection = popcount(np.bitwise_and(gt_packed, pred_packed))
+			IOU = np.float64(intersection) / popcount(np.bitwise_or(gt_packed, pred_packed))
+			Dice_coeff = np.float64(2 * intersection) / (popcount(gt_packed) + popcount(pred_packed))
 			iou_list.append(IOU)
 			if IOU==0:
 				yolo_metrics['fn'] += 1
@@ -678,7 +707,8 @@ class streamlit_viz(pipeline_streamlit_visualizer):
 				gt_masked_color = cv2.bitwise_or(gt_masked_color, gt_masked_color, mask=gt_mask.astype(np.uint8))
 
 				final_masked_color = np.zeros_like(img)
-				for index, mask in enumerate(pred_classes_list_final):
+				# Only the masks drawn are unpacked
+				for index, mask in enumerate(pred_masks[i] for i in indices):
 					mask = mask.astype(np.uint8)
 					#label_hash = int(hashlib.sha1(str(labels[index]).encode("utf-8")).hexdigest(), 16) % (2**32)
 					#color = random_color(seed=label_hash)
@@ -0,0 +1,6 @@
+import os
+import tempfile
+
+# Keep test runs out of the user's ~/.ML_Ops_Pipeline
+if 'PIPELINE_HOME' not in os.environ:
+	os.environ['PIPELINE_HOME'] = tempfile.mkdtemp(prefix="ML_Ops_Pipeline_tests_")
@@ -2,4 +2,98 @@ import ML_Ops_Pipeline
 
 def test_get_all_inputs():
 	from ML_Ops_Pipeline import all_pipelines_git
-	all_inputs_git_data = all_pipelines_git.get_all_inputs()
\ No newline at end of file
+	all_inputs_git_data = all_pipelines_git.get_all_inputs()
+
+def make_remote(root, name):
+	import os
+	import git
+	work_dir = os.path.join(root, "work", name)
+	repo = git.Repo.init(work_dir)
+	with repo.config_writer() as config:
+		config.set_value("user", "name", "test")
+		config.set_value("user", "email", "test@example.com")
+	commit_file(repo, "__init__.py", "exported_pipeline = None\n")
+	bare_dir = os.path.join(root, "remotes", name + ".git")
+	repo.clone(bare_dir, bare=True)
+	repo.create_remote("origin", bare_dir)
+	return repo, bare_dir
+
+def commit_file(repo, file_name, contents):
+	import os
+	with open(os.path.join(repo.working_tree_dir, file_name), "w") as file_handle:
+		file_handle.write(contents)
+	repo.index.add([file_name])
+	return repo.index.commit("update " + file_name)
+
+def test_sync_repos_local_remotes():
+	import os
+	import tempfile
+	from ML_Ops_Pipeline.all_pipelines_git import sync_repos
+	root = tempfile.mkdtemp()
+	remote_pipelines_dir = os.path.join(root, "remote_pipelines")
+	work_a, bare_a = make_remote(root, "pipeline_a")
+	work_b, bare_b = make_remote(root, "pipeline_b")
+
+	# Single commit repos used to fail on diff('HEAD~1')
+	synced = sync_repos([bare_a, bare_b], remote_pipelines_dir)
+	assert synced["pipeline_a"][1] and synced["pipeline_b"][1]
+	assert synced["pipeline_a"][0].hexsha == work_a.head.commit.hexsha
+
+	synced = sync_repos([bare_a, bare_b], remote_pipelines_dir)
+	assert not synced["pipeline_a"][1] and not synced["pipeline_b"][1]
+
+	new_commit = commit_file(work_b, "model.py", "x = 1\n")
+	work_b.remotes.origin.push("HEAD:" + work_b.active_branch.name)
+	# Local edits to a checkout are undone even when the remote did not move
+	with open(os.path.join(remote_pipelines_dir, "pipeline_a", "__init__.py"), "w") as file_handle:
+		file_handle.write("broken\n")
+	synced = sync_repos([bare_a, bare_b], remote_pipelines_dir)
+	assert not synced["pipeline_a"][1]
+	assert open(os.path.join(remote_pipelines_dir, "pipeline_a", "__init__.py")).read() == "exported_pipeline = None\n"
+	assert synced["pipeline_b"][1]
+	assert synced["pipeline_b"][0].hexsha == new_commit.hexsha
+	# Stray untracked modules are removed the same way
+	with open(os.path.join(remote_pipelines_dir, "pipeline_a", "stray.py"), "w") as file_handle:
+		file_handle.write("raise ImportError\n")
+	synced = sync_repos([bare_a], remote_pipelines_dir)
+	assert not synced["pipeline_a"][1]
+	assert not os.path.exists(os.path.join(remote_pipelines_dir, "pipeline_a", "stray.py"))
+
+	# A remote that does not exist is reported and left out
+	synced = sync_repos([bare_a, os.path.join(root, "remotes", "missing.git")], remote_pipelines_dir)
+	assert list(synced.keys()) == ["pipeline_a"]
+
+def test_sync_repos_shallow():
+	import os
+	import tempfile
+	from ML_Ops_Pipeline.all_pipelines_git import sync_repos
+	root = tempfile.mkdtemp()
+	work, bare = make_remote(root, "pipeline_shallow")
+	commit_file(work, "model.py", "x = 1\n")
+	work.remotes.origin.push("HEAD:" + work.active_branch.name)
+	remote_pipelines_dir = os.path.join(root, "remote_pipelines")
+	# Local paths ignore --depth unless they are given as file:// urls
+	synced = sync_repos(["file://" + bare], remote_pipelines_dir, depth=1)
+	assert synced["pipeline_shallow"][0].hexsha == work.head.commit.hexsha
+	assert os.path.exists(os.path.join(remote_pipelines_dir, "pipeline_shallow", ".git", "shallow"))
+
+def test_import_pipeline_purges_submodules():
+	import os
+	import sys
+	import tempfile
+	from ML_Ops_Pipeline.all_pipelines_git import import_pipeline
+	root = tempfile.mkdtemp()
+	package_dir = os.path.join(root, "registry_pipeline")
+	os.makedirs(package_dir)
+	with open(os.path.join(package_dir, "__init__.py"), "w") as file_handle:
+		file_handle.write("from .model import exported_pipeline\n")
+	with open(os.path.join(package_dir, "model.py"), "w") as file_handle:
+		file_handle.write("exported_pipeline = 1\n")
+	sys.path.append(root)
+	try:
+		assert import_pipeline("registry_pipeline").exported_pipeline == 1
+		with open(os.path.join(package_dir, "model.py"), "w") as file_handle:
+			file_handle.write("exported_pipeline = 22\n")
+		assert import_pipeline("registry_pipeline").exported_pipeline == 22
+	finally:
+		sys.path.remove(root)
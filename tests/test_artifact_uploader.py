@@ -0,0 +1,68 @@
+import os
+import tempfile
+
+def test_artifact_uploader_links_unchanged_files():
+	from mlflow.tracking import MlflowClient
+	from ML_Ops_Pipeline.artifact_uploader import artifact_uploader, local_artifact_dir
+	client = MlflowClient()
+	experiment_id = client.create_experiment("artifact_uploader_test")
+	local_dir = tempfile.mkdtemp()
+	os.makedirs(os.path.join(local_dir, "visuals"))
+	with open(os.path.join(local_dir, "predictions.pkl"), 'wb') as file_handle:
+		file_handle.write(os.urandom(4096))
+	with open(os.path.join(local_dir, "visuals", "0.png"), 'wb') as file_handle:
+		file_handle.write(b"png")
+
+	uploader = artifact_uploader(blobs_dir=tempfile.mkdtemp(), queue_size=2)
+	run_ids = [client.create_run(experiment_id).info.run_id for _ in range(3)]
+	for run_id in run_ids[:2]:
+		uploader.log_artifacts(client, run_id, local_dir)
+	uploader.wait()
+	assert uploader.stats == {'files': 4, 'copied': 2, 'copied_bytes': 4099}
+	first, second = [local_artifact_dir(client, run_id) for run_id in run_ids[:2]]
+	assert sorted(artifact.path for artifact in client.list_artifacts(run_ids[1])) == ['predictions.pkl', 'visuals']
+	assert os.stat(os.path.join(first, "predictions.pkl")).st_ino == os.stat(os.path.join(second, "predictions.pkl")).st_ino
+
+	# Rewriting the output after it was logged leaves the logged artifact as it was
+	with open(os.path.join(local_dir, "visuals", "0.png"), 'wb') as file_handle:
+		file_handle.write(b"new png")
+	with open(os.path.join(first, "visuals", "0.png"), 'rb') as file_handle:
+		assert file_handle.read() == b"png"
+	synchronous = artifact_uploader(blobs_dir=uploader.blobs_dir, queue_size=0)
+	synchronous.log_artifacts(client, run_ids[2], local_dir)
+	assert synchronous.stats['copied'] == 1
+	with open(os.path.join(local_artifact_dir(client, run_ids[2]), "visuals", "0.png"), 'rb') as file_handle:
+		assert file_handle.read() == b"new png"
+
+def test_artifact_uploader_snapshots_before_returning():
+	import shutil
+	import threading
+	from mlflow.tracking import MlflowClient
+	from ML_Ops_Pipeline.artifact_uploader import artifact_uploader, local_artifact_dir
+	client = MlflowClient()
+	experiment_id = client.create_experiment("artifact_uploader_snapshot_test")
+	local_dir = tempfile.mkdtemp()
+	with open(os.path.join(local_dir, "train.png"), 'wb') as file_handle:
+		file_handle.write(b"train")
+
+	# Holds the background thread until the directory was rewritten
+	rewritten = threading.Event()
+	class held_uploader(artifact_uploader):
+		def upload(self, *args, **kwargs):
+			rewritten.wait(10)
+			return super().upload(*args, **kwargs)
+	uploader = held_uploader(blobs_dir=tempfile.mkdtemp(), queue_size=2)
+	run_id = client.create_run(experiment_id).info.run_id
+	uploader.log_artifacts(client, run_id, local_dir)
+
+	# The next stage clears the directory and writes its own outputs
+	shutil.rmtree(local_dir)
+	os.makedirs(local_dir)
+	with open(os.path.join(local_dir, "test.png"), 'wb') as file_handle:
+		file_handle.write(b"test")
+	rewritten.set()
+	uploader.wait()
+	artifact_dir = local_artifact_dir(client, run_id)
+	assert os.listdir(artifact_dir) == ["train.png"]
+	with open(os.path.join(artifact_dir, "train.png"), 'rb') as file_handle:
+		assert file_handle.read() == b"train"
@@ -0,0 +1,59 @@
+import pandas as pd
+
+from ML_Ops_Pipeline.pipeline_input import pipeline_dataset_interpreter, pipeline_model
+
+class streaming_interp(pipeline_dataset_interpreter):
+	streaming = True
+	batch_size = 4
+
+	def load(self) -> None:
+		raise AssertionError("streaming interpreters are not loaded")
+
+	def iter_batches(self, split, batch_size):
+		for start in range(0, 10, batch_size):
+			stop = min(start + batch_size, 10)
+			yield {'x': list(range(start, stop)), 'y': [i * 2 for i in range(start, stop)]}
+
+	def split_len(self, split) -> int:
+		return 10
+
+class batch_counting_model(pipeline_model):
+	pooled = False
+
+	def load(self) -> None:
+		self.batches = 0
+
+	def evaluate(self, x, y):
+		self.batches += 1
+		return {'accuracy': float(len(x) == len(y)), 'batch': self.batches}, [value * 2 for value in x]
+
+def test_run_batches_merges_results():
+	from ML_Ops_Pipeline.dataset_batches import has_batches, open_batches, run_batches
+	assert has_batches(streaming_interp)
+	assert not has_batches(pipeline_dataset_interpreter)
+
+	interp = open_batches(streaming_interp, "/nonexistent")
+	assert len(interp) == 20
+	mod = batch_counting_model("/nonexistent")
+	results, predictions = run_batches(mod, 'evaluate', interp, 'test')
+	assert mod.batches == 3
+	assert predictions == [i * 2 for i in range(10)]
+	assert results['accuracy'] == 1.0
+	# Weighted by the 4, 4 and 2 items of each batch
+	assert results['batch'] == (1*4 + 2*4 + 3*2) / 10
+
+def test_default_iter_batches_slices_loaded_dataset():
+	class loaded_interp(pipeline_dataset_interpreter):
+		def load(self) -> None:
+			self.dataset = {
+				'train': {'x': pd.DataFrame({'a': range(5)}), 'y': pd.Series(range(5))},
+				'test': {'x': [1, 2, 3], 'y': None},
+			}
+
+	interp = loaded_interp("/nonexistent")
+	batches = list(interp.iter_batches('train', 2))
+	assert [len(batch['x']) for batch in batches] == [2, 2, 1]
+	assert list(batches[-1]['y']) == [4]
+	# Unaligned splits come back whole
+	assert len(list(interp.iter_batches('test', 2))) == 1
+	assert len(interp) == 8
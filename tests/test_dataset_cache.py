@@ -0,0 +1,64 @@
+import os
+import tempfile
+
+from ML_Ops_Pipeline.pipeline_input import pipeline_dataset_interpreter
+
+class counting_interp(pipeline_dataset_interpreter):
+	loads = 0
+
+	def load(self) -> None:
+		counting_interp.loads += 1
+		with open(os.path.join(self.input_dir, "labels.txt")) as labels:
+			self.dataset = {
+				'train': {'x': labels.read().split(), 'y': []},
+				'test': {'x': [], 'y': []},
+			}
+
+def test_dataset_cache_layers():
+	from ML_Ops_Pipeline.dataset_cache import dataset_cache
+	dataset_dir = tempfile.mkdtemp()
+	with open(os.path.join(dataset_dir, "labels.txt"), "w") as labels:
+		labels.write("1 2 3\n")
+	cache_dir = tempfile.mkdtemp()
+
+	cache = dataset_cache(cache_dir=cache_dir, max_entries=1)
+	dat = cache.get_dataset(counting_interp, dataset_dir)
+	assert dat['train']['x'] == ['1', '2', '3']
+	assert cache.get_dataset(counting_interp, dataset_dir) is dat
+	assert counting_interp.loads == 1
+
+	# A new process only has the on disk layer
+	other_cache = dataset_cache(cache_dir=cache_dir)
+	assert other_cache.get_dataset(counting_interp, dataset_dir) == dat
+	assert other_cache.disk_hits == 1
+	assert counting_interp.loads == 1
+
+	# Changing the dataset changes its fingerprint
+	with open(os.path.join(dataset_dir, "new_labels.txt"), "w") as labels:
+		labels.write("4\n")
+	cache.get_dataset(counting_interp, dataset_dir)
+	assert counting_interp.loads == 2
+	assert len(cache.entries) == 1
+
+def test_dataset_fingerprint_sees_nested_edits():
+	import time
+	from ML_Ops_Pipeline.dataset_cache import dataset_fingerprint
+	dataset_dir = tempfile.mkdtemp()
+	os.makedirs(os.path.join(dataset_dir, "Annotations"))
+	with open(os.path.join(dataset_dir, "Annotations", "0.xml"), "w") as annotation:
+		annotation.write("<annotation/>")
+	dataset_mtime = os.stat(dataset_dir).st_mtime_ns
+	fingerprint = dataset_fingerprint(dataset_dir)
+
+	# Neither edit touches the mtime of the dataset directory itself
+	time.sleep(0.01)
+	with open(os.path.join(dataset_dir, "Annotations", "0.xml"), "w") as annotation:
+		annotation.write("<annotation><object/></annotation>")
+	assert os.stat(dataset_dir).st_mtime_ns == dataset_mtime
+	edited = dataset_fingerprint(dataset_dir)
+	assert edited != fingerprint
+	with open(os.path.join(dataset_dir, "Annotations", "1.xml"), "w") as annotation:
+		annotation.write("<annotation/>")
+	# Reused within max_age only
+	assert dataset_fingerprint(dataset_dir, max_age=60) == edited
+	assert dataset_fingerprint(dataset_dir) not in (fingerprint, edited)
@@ -0,0 +1,84 @@
+import os
+import sys
+import pickle
+import importlib.util
+
+import numpy as np
+import pandas as pd
+
+def load_detection_table():
+	# pipelines/obj_det/__init__.py pulls in detectron2, the table module itself only needs numpy and pandas
+	path = os.path.join(os.path.dirname(__file__), "..", "pipelines", "obj_det", "detection_table.py")
+	spec = importlib.util.spec_from_file_location("detection_table", path)
+	module = importlib.util.module_from_spec(spec)
+	spec.loader.exec_module(module)
+	# Pickle finds the class through its module
+	sys.modules["detection_table"] = module
+	return module
+
+def test_detection_table_dataframe_round_trip():
+	module = load_detection_table()
+	labels = pd.DataFrame({
+		'xmin': [10, 0, 5, 1], 'ymin': [10, 0, 5, 1], 'xmax': [20, 4, 9, 3], 'ymax': [20, 4, 9, 3],
+		'label': ['person', 'person', 'car', 'person'],
+		'image': ['/d/b.jpg', '/d/a.jpg', '/d/b.jpg', '/e/a.jpg'],
+	})
+	table = module.detection_table.from_dataframe(labels)
+	assert len(table) == 4
+	assert list(table.image_paths()) == ['/d/b.jpg', '/d/a.jpg', '/e/a.jpg']
+	assert list(table.for_image('/d/b.jpg')['xmin']) == [10, 5]
+	assert len(table.for_image('/missing.jpg')) == 0
+
+	df = table.to_dataframe()
+	assert list(df['image']) == list(labels['image'])
+	assert list(df['label']) == list(labels['label'])
+	# Same file name in two directories
+	assert list(df['name']) == ['b', 'a', 'b', 'a']
+	assert module.detection_table.from_dataframe(df).to_dataframe().equals(df)
+
+	restored = pickle.loads(pickle.dumps(table))
+	assert restored.boxes.tobytes() == table.boxes.tobytes()
+	assert restored.images == table.images
+
+	# 26 bytes a box, against the float64 coordinates and the name and image strings of a DataFrame row
+	assert table.nbytes == 4 * 26
+	image_paths = ["/data/obj_det/datasets/pedestrians/Train/JPEGImages/image (" + str(i // 8) + ").jpg" for i in range(800)]
+	predictions = pd.DataFrame({
+		'xmin': np.zeros(800), 'ymin': np.zeros(800), 'xmax': np.ones(800), 'ymax': np.ones(800), 'confidence': np.ones(800),
+		'name': pd.Series([os.path.basename(image_path)[0:-4] for image_path in image_paths], dtype=object),
+		'image': pd.Series(image_paths, dtype=object),
+	})
+	assert module.detection_table.from_dataframe(predictions).nbytes * 8 < predictions.memory_usage(deep=True).sum()
+
+def test_detection_table_concat_and_iou():
+	module = load_detection_table()
+	first = module.detection_table()
+	first.add('/d/a.jpg', [[0, 0, 10, 10], [20, 20, 30, 30]], [0.9, 0.8], 'person')
+	second = module.detection_table()
+	second.add('/d/c.jpg', [0, 0, 1, 1], 0.5)
+	second.add('/d/a.jpg', [0, 0, 5, 10], 0.7, 'car')
+	second.add('/d/empty.jpg', np.empty((0, 4)), np.empty(0))
+	merged = module.detection_table.concat([first, second])
+	assert list(merged.image_paths()) == ['/d/a.jpg', '/d/c.jpg']
+	a_boxes = merged.for_image('/d/a.jpg')
+	assert list(a_boxes['xmax']) == [10, 30, 5]
+	assert [merged.labels[i] if i >= 0 else None for i in a_boxes['label_id']] == ['person', 'person', 'car']
+	assert merged.for_image('/d/c.jpg')['label_id'][0] == module.NO_LABEL
+
+	ious = module.iou_matrix(first.boxes, second.boxes)
+	expected = [[0.01, 0.5], [0.0, 0.0]]
+	assert np.allclose(ious, expected)
+	assert module.iou_matrix(first.boxes, np.empty(0, dtype=module.DETECTION_DTYPE)).shape == (2, 0)
+
+def test_detection_table_split_items():
+	module = load_detection_table()
+	table = module.detection_table()
+	table.add('/v1/a.jpg', [[0, 0, 10, 10], [20, 20, 30, 30]], [0.9, 0.8], 'person')
+	table.add('/v1/b.jpg', [1, 1, 2, 2], 0.5, 'car')
+	parts = table.split_items(['/v1/a.jpg', '/v1/empty.jpg', '/v1/b.jpg'])
+	assert [len(part) for part in parts] == [2, 0, 1]
+	# A cached part reused for the same image in the next dataset version
+	reused = parts[2].with_item('/v2/b.jpg')
+	merged = module.detection_table.concat([parts[0], parts[1], reused])
+	assert list(merged.image_paths()) == ['/v1/a.jpg', '/v2/b.jpg']
+	assert list(merged.to_dataframe()['label']) == ['person', 'person', 'car']
@@ -0,0 +1,53 @@
+import os
+import time
+import tempfile
+
+import numpy as np
+import cv2
+
+def test_frame_cache_shards_and_invalidation():
+	from ML_Ops_Pipeline.constants import DATA_BASE_DIR
+	from ML_Ops_Pipeline.frame_cache import frame_cache, dataset_root
+	# <pipeline>/datasets/<interpreter>/<version> as written by data_ingestion
+	interpreter_dir = os.path.join(DATA_BASE_DIR, "frames", "datasets", "frames_interp")
+	dataset_dir = os.path.join(interpreter_dir, "v1")
+	os.makedirs(os.path.join(dataset_dir, "images"))
+	for i in range(3):
+		cv2.imwrite(os.path.join(dataset_dir, "images", str(i) + ".png"), np.full((4, 5, 3), i, dtype=np.uint8))
+	image_path = os.path.join(dataset_dir, "images", "1.png")
+	assert dataset_root(image_path) == os.path.abspath(dataset_dir)
+	assert dataset_root(os.path.join(dataset_dir, "1.png")) == os.path.abspath(dataset_dir)
+	assert dataset_root(os.path.join(interpreter_dir, "v1")) is None
+	assert dataset_root(tempfile.gettempdir()) is None
+
+	cache_dir = tempfile.mkdtemp()
+	# Room for two frames per shard
+	cache = frame_cache(dataset_dir, cache_dir=cache_dir, shard_size=2 * 4 * 5 * 3)
+	frame = cache.get(image_path)
+	assert isinstance(frame, np.memmap)
+	assert (frame == cv2.imread(image_path)).all()
+	assert len(cache) == 3
+	assert os.path.exists(cache.shard_bin(1))
+	assert cache.get(os.path.join(dataset_dir, "missing.png")) is None
+
+	# Drawing on a frame does not write through to the shard
+	frame[:] = 255
+	assert (frame_cache(dataset_dir, cache_dir=cache_dir).get(image_path) == 1).all()
+
+	# A changed dataset gets its own store and replaces the old one
+	time.sleep(0.01)
+	cv2.imwrite(os.path.join(dataset_dir, "3.png"), np.full((2, 2, 3), 3, dtype=np.uint8))
+	new_cache = frame_cache(dataset_dir, cache_dir=cache_dir)
+	assert new_cache.key != cache.key
+	assert len(new_cache) == 4
+	assert not os.path.exists(cache.path)
+
+	# Another ingested version of the interpreter has a cache of its own next to it
+	other_dir = os.path.join(interpreter_dir, "v2")
+	os.makedirs(other_dir)
+	cv2.imwrite(os.path.join(other_dir, "0.png"), np.full((3, 3, 3), 7, dtype=np.uint8))
+	other_cache = frame_cache(dataset_root(os.path.join(other_dir, "0.png")), cache_dir=cache_dir)
+	assert other_cache.key != new_cache.key
+	assert len(other_cache) == 1 and (other_cache.get(os.path.join(other_dir, "0.png")) == 7).all()
+	assert os.path.exists(new_cache.path)
+	assert new_cache.get(os.path.join(other_dir, "0.png")) is None
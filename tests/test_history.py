@@ -0,0 +1,68 @@
+import os
+import pickle
+import multiprocessing
+
+def write_keys(prefix):
+	from ML_Ops_Pipeline.history import local_history
+	hist = local_history("test_history_processes")
+	with hist.batch():
+		for i in range(50):
+			hist[prefix + str(i)] = i
+
+def test_local_history_dict_api():
+	from datetime import datetime
+	from ML_Ops_Pipeline.history import local_history
+	hist = local_history("test_history_api")
+	assert hist["missing"] == datetime.fromtimestamp(0)
+	assert len(hist) == 0
+	hist["a"] = {'digest': '1'}
+	hist.update({"b": 2, "c": 3})
+	assert local_history("test_history_api")["a"] == {'digest': '1'}
+	assert hist.get_many(["a", "c", "missing"]) == {"a": {'digest': '1'}, "c": 3}
+	assert sorted(hist.keys()) == ["a", "b", "c"]
+	del hist["b"]
+	assert "b" not in hist and hist.get("b") is None
+
+def test_local_history_migrates_pickle():
+	from ML_Ops_Pipeline.constants import HISTORY_PATH
+	from ML_Ops_Pipeline.history import local_history
+	os.makedirs(HISTORY_PATH, exist_ok=True)
+	old_pkl = os.path.join(HISTORY_PATH, "test_history_old.pkl")
+	with open(old_pkl, "wb") as old_handle:
+		pickle.dump({"task": "commit"}, old_handle)
+	hist = local_history("test_history_old")
+	assert hist["task"] == "commit"
+	assert not os.path.exists(old_pkl)
+
+def test_local_history_processes():
+	from ML_Ops_Pipeline.history import local_history
+	context = multiprocessing.get_context('spawn')
+	processes = [context.Process(target=write_keys, args=(prefix,)) for prefix in "xyz"]
+	for process in processes:
+		process.start()
+	for process in processes:
+		process.join()
+	assert len(local_history("test_history_processes")) == 150
+
+def test_task_journal_recover():
+	from ML_Ops_Pipeline.history import task_journal, RUNNING, DONE, FAILED
+	journal = task_journal()
+	journal.set_state(["done_task", "crashed_task"], RUNNING)
+	journal.set_state("done_task", DONE)
+	# Pretend the scheduler that ran crashed_task died
+	journal.connection.execute("UPDATE task_state SET pid=? WHERE task_id=?", (2**22 + 1, "crashed_task"))
+	assert journal.recover() == ["crashed_task"]
+	assert journal.state("crashed_task") == FAILED
+	assert journal.state("done_task") == DONE
+
+def test_task_journal_abort():
+	from ML_Ops_Pipeline.history import task_journal, QUEUED, RUNNING, DONE, FAILED
+	journal = task_journal()
+	journal.set_state(["abort_queued", "abort_running", "abort_done"], QUEUED)
+	journal.set_state("abort_running", RUNNING)
+	journal.set_state("abort_done", DONE)
+	# Written by this live process, only abort marks them
+	assert journal.recover() == []
+	assert sorted(journal.abort(["abort_queued", "abort_running", "abort_done"])) == ["abort_queued", "abort_running"]
+	assert journal.states(FAILED).keys() >= {"abort_queued", "abort_running"}
+	assert journal.state("abort_done") == DONE
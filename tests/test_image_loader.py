@@ -0,0 +1,49 @@
+import os
+import tempfile
+
+import numpy as np
+import cv2
+
+def write_images(shapes) -> list:
+	images_dir = tempfile.mkdtemp()
+	image_paths = []
+	for i, shape in enumerate(shapes):
+		image_path = os.path.join(images_dir, str(i) + ".png")
+		cv2.imwrite(image_path, np.full(shape, i, dtype=np.uint8))
+		image_paths.append(image_path)
+	return image_paths
+
+def test_image_loader_order_and_shapes():
+	from ML_Ops_Pipeline.image_loader import image_loader, image_shape
+	image_paths = write_images([(4, 6, 3)] * 5 + [(2, 3, 3)])
+	assert image_shape(image_paths[0]) == (4, 6, 3)
+
+	loader = image_loader(image_paths, workers=3, prefetch=2)
+	loaded = list(loader)
+	assert [image_path for image_path, image in loaded] == image_paths
+	assert [int(image[0, 0, 0]) for image_path, image in loaded] == list(range(6))
+	assert loader.shapes[image_paths[-1]] == (2, 3, 3)
+
+	# Stopping early leaves nothing behind
+	for image_path, image in image_loader(image_paths, prefetch=2):
+		break
+
+def test_image_loader_batches():
+	from ML_Ops_Pipeline.image_loader import image_loader
+	image_paths = write_images([(4, 6, 3)] * 5 + [(2, 3, 3)])
+	loader = image_loader(image_paths, workers=2)
+	batches = []
+	for batch_paths, batch in loader.batches(2):
+		batches.append((batch_paths, batch if isinstance(batch, list) else batch.copy()))
+	assert [len(batch_paths) for batch_paths, batch in batches] == [2, 2, 2]
+	assert batches[0][1].shape == (2, 4, 6, 3)
+	assert list(batches[1][1][:, 0, 0, 0]) == [2, 3]
+	# The last batch mixes shapes
+	assert isinstance(batches[2][1], list)
+	assert batches[2][1][1].shape == (2, 3, 3)
+
+	# Uneven bounds, and a reader decoding another shape than the header says
+	loader = image_loader(image_paths, workers=2, read=lambda image_path: cv2.imread(image_path)[:1])
+	batches = [(batch_paths, batch) for batch_paths, batch in loader.batches([(0, 1), (1, 4)])]
+	assert [batch_paths for batch_paths, batch in batches] == [image_paths[:1], image_paths[1:4]]
+	assert isinstance(batches[1][1], list) and batches[1][1][0].shape == (1, 6, 3)
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+
+from ML_Ops_Pipeline.pipeline_input import pipeline_model
+
+class doubling_model(pipeline_model):
+	inference_batch_size = 3
+
+	def load(self) -> None:
+		self.batches = []
+
+	def predict_batch(self, x_batch):
+		self.batches.append(len(x_batch))
+		return pd.DataFrame({'value': np.asarray(x_batch) * 2})
+
+def test_batched_predict_keeps_order():
+	mod = doubling_model("/nonexistent")
+	assert mod.has_predict_batch()
+	assert not pipeline_model("/nonexistent").has_predict_batch()
+
+	predictions = mod.predict(np.arange(8))
+	assert mod.batches == [3, 3, 2]
+	assert list(predictions['value']) == [i * 2 for i in range(8)]
+	assert list(predictions.index) == list(range(8))
+
+def test_batch_bounds_memory_budget():
+	from ML_Ops_Pipeline.inference import batch_bounds
+	x = [np.zeros(10, dtype=np.uint8), np.zeros(10, dtype=np.uint8), np.zeros(30, dtype=np.uint8), np.zeros(5, dtype=np.uint8)]
+	assert batch_bounds(x, 8) == [(0, 4)]
+	# An item larger than the budget still gets a batch of its own
+	assert batch_bounds(x, 8, batch_memory=20) == [(0, 2), (2, 3), (3, 4)]
+	assert batch_bounds(x, 1, batch_memory=1000) == [(0, 1), (1, 2), (2, 3), (3, 4)]
+	assert batch_bounds([], 8, batch_memory=20) == []
+
+def test_batched_predict_decodes_ahead():
+	import os
+	import tempfile
+	import threading
+	import cv2
+	image_paths = []
+	images_dir = tempfile.mkdtemp()
+	for i in range(7):
+		image_paths.append(os.path.join(images_dir, str(i) + ".png"))
+		cv2.imwrite(image_paths[-1], np.full((4, 6, 3), i, dtype=np.uint8))
+	x = pd.DataFrame({'image': image_paths, 'other': range(7)})
+	# Predicting batch 1 waits until the loader started decoding batch 2
+	third_batch = threading.Event()
+
+	class image_model(pipeline_model):
+		inference_batch_size = 3
+
+		def load(self) -> None:
+			self.decoded = []
+
+		def item_image(self, row):
+			return row['image']
+
+		def read_image(self, image_path):
+			self.decoded.append(image_path)
+			if image_path == image_paths[6]:
+				third_batch.set()
+			return cv2.imread(image_path)
+
+		def predict_batch(self, x_batch, images=None):
+			if x_batch['image'].iloc[0] == image_paths[3]:
+				assert third_batch.wait(10), "the next batch was not decoded during predict_batch"
+			assert images.shape == (len(x_batch), 4, 6, 3)
+			return list(images[:, 0, 0, 0])
+
+	mod = image_model("/nonexistent")
+	assert mod.has_item_image() and not doubling_model("/nonexistent").has_item_image()
+	assert [int(value) for value in mod.predict(x)] == list(range(7))
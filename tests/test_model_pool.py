@@ -0,0 +1,54 @@
+from ML_Ops_Pipeline.pipeline_input import pipeline_model
+
+class counting_model(pipeline_model):
+	loads = 0
+	pooled = True
+
+	def load(self) -> None:
+		counting_model.loads += 1
+		self.model = [0] * 1000
+
+class unpooled_model(counting_model):
+	pooled = False
+
+class other_model(counting_model):
+	pass
+
+def test_model_pool_reuse():
+	from ML_Ops_Pipeline.model_pool import model_pool
+	pool = model_pool(max_entries=1)
+	mod = pool.get_model(counting_model, "training")
+	assert pool.get_model(counting_model, "testing") is mod
+	assert mod.training_dir == "testing"
+	assert counting_model.loads == 1
+
+	pool.get_model(unpooled_model, "training")
+	pool.get_model(unpooled_model, "training")
+	assert counting_model.loads == 3
+
+	# Evicts counting_model
+	pool.get_model(other_model, "training")
+	assert len(pool.entries) == 1
+	assert pool.get_model(counting_model, "training") is not mod
+	assert counting_model.loads == 5
+
+class learning_model(pipeline_model):
+
+	def load(self) -> None:
+		self.model = []
+
+	def train(self, x, y):
+		self.model.append(x)
+
+class frozen_model(learning_model):
+	frozen = True
+
+def test_model_pool_skips_learning_models():
+	from ML_Ops_Pipeline.model_pool import model_pool
+	pool = model_pool()
+	mod = pool.get_model(learning_model, "training")
+	mod.train("dataset_a", None)
+	# Training on the next dataset starts from a fresh instance, not from the weights of dataset_a
+	assert pool.get_model(learning_model, "training").model == []
+	assert len(pool.entries) == 0
+	assert pool.get_model(frozen_model, "training") is pool.get_model(frozen_model, "testing")
@@ -0,0 +1,39 @@
+import os
+import sys
+import pickle
+import importlib.util
+
+import numpy as np
+
+def load_packed_masks():
+	# pipelines/seg/seg.py needs detectron2, the mask module only numpy
+	path = os.path.join(os.path.dirname(__file__), "..", "pipelines", "seg", "packed_masks.py")
+	spec = importlib.util.spec_from_file_location("packed_masks", path)
+	module = importlib.util.module_from_spec(spec)
+	spec.loader.exec_module(module)
+	sys.modules["packed_masks"] = module
+	return module
+
+def test_packed_masks_round_trip_and_iou():
+	module = load_packed_masks()
+	rng = np.random.default_rng(0)
+	masks = rng.random((3, 7, 9)) > 0.5
+	packed = module.packed_masks(masks)
+	assert len(packed) == 3
+	assert packed.nbytes == 3 * 8
+	assert (packed.decode() == masks).all()
+	assert all((mask == masks[i]).all() for i, mask in enumerate(packed))
+	assert (pickle.loads(pickle.dumps(packed))[1] == masks[1]).all()
+	assert list(packed.areas()) == list(masks.reshape(3, -1).sum(axis=1))
+
+	union = packed.union([0, 2])
+	assert module.popcount(union) == np.logical_or(masks[0], masks[2]).sum()
+	assert module.popcount(packed.union([])) == 0
+
+	gt_mask = rng.random((7, 9)) > 0.5
+	expected = np.logical_and(gt_mask, masks[1]).sum() / np.logical_or(gt_mask, masks[1]).sum()
+	assert np.isclose(module.packed_iou(module.pack_mask(gt_mask), packed.bits[1]), expected)
+
+	assert module.as_packed_masks(packed) is packed
+	assert module.as_packed_masks(None) is None
+	assert len(module.packed_masks(np.zeros((0, 4, 4), dtype=bool))) == 0
@@ -0,0 +1,44 @@
+import os
+import pickle
+import tempfile
+
+PIPELINE_SOURCE = """
+from ML_Ops_Pipeline.pipeline_input import pipeline_dataset_interpreter, pipeline_model, pipeline_input
+
+class manifest_interp(pipeline_dataset_interpreter):
+	pass
+
+class manifest_model(pipeline_model):
+	pass
+
+exported_pipeline = pipeline_input("manifest_test", {'manifest_interp': manifest_interp}, {'manifest_model': manifest_model}, {}, {})
+"""
+
+def test_build_manifest():
+	import sys
+	from ML_Ops_Pipeline.pipeline_manifest import build_manifest, lazy_pipeline, class_hash
+	from ML_Ops_Pipeline.pipeline_input import source_hash
+	pipelines_dir = tempfile.mkdtemp()
+	package_dir = os.path.join(pipelines_dir, "manifest_pipeline")
+	os.makedirs(package_dir)
+	with open(os.path.join(package_dir, "__init__.py"), "w") as file_handle:
+		file_handle.write("from .manifest_pipeline import *\n")
+	with open(os.path.join(package_dir, "manifest_pipeline.py"), "w") as file_handle:
+		file_handle.write(PIPELINE_SOURCE)
+
+	manifest = build_manifest("manifest_pipeline", pipelines_dir)
+	# Generated in a subprocess
+	assert "manifest_pipeline" not in sys.modules
+	pipeline = lazy_pipeline("manifest_pipeline", "0"*40, manifest)
+	assert pipeline.get_pipeline_name() == "manifest_test"
+	assert list(pipeline.get_pipeline_model().keys()) == ['manifest_model']
+	assert pipeline.get_pipeline_ensemble() == {}
+
+	model = pipeline.get_pipeline_model()['manifest_model']
+	sys.path.append(pipelines_dir)
+	try:
+		model_class = pickle.loads(pickle.dumps(model))
+		assert model_class.__qualname__ == "manifest_model"
+		assert class_hash(model) == str(source_hash(model_class))
+	finally:
+		sys.path.remove(pipelines_dir)
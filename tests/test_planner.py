@@ -0,0 +1,117 @@
+import os
+
+from ML_Ops_Pipeline.pipeline_input import pipeline_dataset_interpreter, pipeline_model, pipeline_ensembler, pipeline_data_visualizer, pipeline_input
+
+class planner_interp(pipeline_dataset_interpreter):
+	pass
+
+class planner_model(pipeline_model):
+	pass
+
+class planner_frozen_model(pipeline_model):
+	frozen = True
+
+class planner_ensembler(pipeline_ensembler):
+	pass
+
+class planner_visualizer(pipeline_data_visualizer):
+	pass
+
+class git_data:
+	hexsha = "0" * 40
+
+def make_inputs(pipeline_name, models=None):
+	from ML_Ops_Pipeline.constants import DATASET_DIR
+	dataset_dir = os.path.join(DATASET_DIR.format(pipeline_name=pipeline_name), 'planner_interp', 'dataset_1')
+	os.makedirs(dataset_dir, exist_ok=True)
+	with open(os.path.join(dataset_dir, "labels.txt"), "w") as labels:
+		labels.write("1\n")
+	pipeline = pipeline_input(pipeline_name, {'planner_interp': planner_interp}, models or {'planner_model': planner_model}, {'planner_ensembler': planner_ensembler}, {'planner_visualizer': planner_visualizer})
+	return {pipeline_name: {'pipeline': pipeline, 'git_data': git_data}}, dataset_dir
+
+def test_plan_everything_once():
+	from ML_Ops_Pipeline.planner import task_planner
+	all_inputs, dataset_dir = make_inputs("planner_once")
+	manifest = {}
+	planner = task_planner(manifest)
+	planned = planner.plan(all_inputs)
+	# train, analyze, 2 visualize, 2 ensemble
+	assert len(planned) == 6
+	assert all(task.stale and not task.blocked for task in planned.values())
+	for task in planned.values():
+		planner.record(task, True)
+
+	planned = planner.plan(all_inputs)
+	assert not any(task.stale for task in planned.values())
+	assert all(task.commit_id == git_data.hexsha for task in planned.values())
+
+def test_plan_only_changed_nodes():
+	from ML_Ops_Pipeline.planner import task_planner
+	all_inputs, dataset_dir = make_inputs("planner_changed")
+	manifest = {}
+	planner = task_planner(manifest)
+	for task in planner.plan(all_inputs).values():
+		planner.record(task, True)
+
+	# Simulate an edited visualizer
+	visualize_keys = [key for key in manifest if key.startswith("visualize:")]
+	for key in visualize_keys:
+		manifest[key] = dict(manifest[key], digest="changed")
+	stale = [task.stage for task in planner.plan(all_inputs).values() if task.stale]
+	assert sorted(stale) == ['visualize', 'visualize']
+
+	# A new file in the dataset invalidates everything built from it
+	with open(os.path.join(dataset_dir, "more_labels.txt"), "w") as labels:
+		labels.write("2\n")
+	assert all(task.stale for task in planner.plan(all_inputs).values())
+
+def test_failed_upstream_blocks_dependents():
+	from ML_Ops_Pipeline.planner import task_planner
+	all_inputs, dataset_dir = make_inputs("planner_failed")
+	manifest = {}
+	planner = task_planner(manifest)
+	for task in planner.plan(all_inputs).values():
+		planner.record(task, task.stage != 'train')
+	for key in list(manifest):
+		if not key.startswith("train:"):
+			del manifest[key]
+	planned = planner.plan(all_inputs)
+	train = [task for task in planned.values() if task.stage == 'train'][0]
+	assert not train.stale
+	assert all(task.blocked for task in planned.values() if train.node_id in task.deps)
+
+def test_frozen_models_skip_train_split():
+	from ML_Ops_Pipeline.planner import task_planner
+	from ML_Ops_Pipeline.pipeline_manifest import frozen_train_sample
+	assert frozen_train_sample(planner_model) is None
+	assert frozen_train_sample(planner_frozen_model) == 0
+	all_inputs, dataset_dir = make_inputs("planner_frozen", {'planner_model': planner_model, 'planner_frozen_model': planner_frozen_model})
+	planned = task_planner({}).plan(all_inputs)
+	frozen_stages = sorted((task.stage, task.mode) for task in planned.values() if task.name == 'planner_frozen_model')
+	assert frozen_stages == [('analyze', None), ('visualize', 'test')]
+	ensemble_train = [task for task in planned.values() if task.stage == 'ensemble_train'][0]
+	assert list(ensemble_train.inputs['models']) == ['planner_model']
+	# Only the analysis of a model that learns waits for its training
+	analyze = planned[('analyze', 'planner_frozen', 'planner_interp', dataset_dir, 'planner_model')]
+	assert analyze.deps == [('train', 'planner_frozen', 'planner_interp', dataset_dir, 'planner_model')]
+	assert planned[('analyze', 'planner_frozen', 'planner_interp', dataset_dir, 'planner_frozen_model')].deps == []
+
+	# Only frozen models: no ensemble training, the analysis runs on its own
+	all_inputs, dataset_dir = make_inputs("planner_all_frozen", {'planner_frozen_model': planner_frozen_model})
+	planned = task_planner({}).plan(all_inputs)
+	assert sorted(task.stage for task in planned.values()) == ['analyze', 'ensemble_analyze', 'visualize']
+
+def test_sample_split():
+	import numpy as np
+	import pandas as pd
+	from ML_Ops_Pipeline.pipeline_input import sample_split
+	x = pd.DataFrame({'image': [str(i) for i in range(10)]})
+	y = pd.DataFrame({'label': list(range(10))})
+	x_sample, y_sample = sample_split(x, y, 4)
+	assert list(x_sample['image']) == ['0', '3', '6', '9']
+	assert list(y_sample['label']) == [0, 3, 6, 9]
+	# Labels that are not one per item stay whole
+	boxes = np.zeros(25)
+	x_sample, y_sample = sample_split(list(range(10)), boxes, 2)
+	assert x_sample == [0, 9] and y_sample is boxes
+	assert sample_split(x, y, 20)[0] is x
@@ -0,0 +1,107 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from ML_Ops_Pipeline.pipeline_input import pipeline_model
+
+class file_size_model(pipeline_model):
+	inference_batch_size = 4
+
+	def load(self) -> None:
+		self.predicted = []
+
+	def predict_batch(self, x_batch):
+		self.predicted += list(x_batch)
+		return [os.path.basename(path) + ":" + str(os.path.getsize(path)) for path in x_batch]
+
+def write_images(directory, count, start=0):
+	os.makedirs(directory, exist_ok=True)
+	for i in range(start, start + count):
+		with open(os.path.join(directory, str(i) + ".png"), 'wb') as image_handle:
+			image_handle.write(bytes([i]) * (100 + i))
+	return [os.path.join(directory, str(i) + ".png") for i in range(start, start + count)]
+
+def test_prediction_cache_skips_unchanged_images():
+	from ML_Ops_Pipeline.prediction_cache import prediction_cache
+	from ML_Ops_Pipeline.inference import batched_predict
+	root = tempfile.mkdtemp()
+	cache = prediction_cache(os.path.join(root, "cache.sqlite"))
+	first = write_images(os.path.join(root, "v1"), 20)
+	mod = file_size_model("/nonexistent")
+	assert batched_predict(mod, first, cache=cache) == [str(i) + ".png:" + str(100 + i) for i in range(20)]
+	assert len(mod.predicted) == 20
+
+	# The next version is a full copy with one new image
+	shutil.copytree(os.path.join(root, "v1"), os.path.join(root, "v2"))
+	second = [path.replace("v1", "v2") for path in first] + write_images(os.path.join(root, "v2"), 1, start=20)
+	mod = file_size_model("/nonexistent")
+	predictions = batched_predict(mod, second, cache=cache)
+	assert mod.predicted == second[-1:]
+	assert predictions == [str(i) + ".png:" + str(100 + i) for i in range(21)]
+	assert cache.hits == 20
+
+	# Another model does not see these predictions
+	class other_model(file_size_model):
+		pass
+	mod = other_model("/nonexistent")
+	batched_predict(mod, second, cache=cache)
+	assert len(mod.predicted) == 21
+
+def test_prediction_cache_eviction_and_keys():
+	from ML_Ops_Pipeline.prediction_cache import prediction_cache, item_key
+	root = tempfile.mkdtemp()
+	cache = prediction_cache(os.path.join(root, "cache.sqlite"), max_size=10000)
+	for i in range(30):
+		cache.put_many("model", [("item" + str(i), np.zeros(1000, dtype=np.uint8))])
+	assert cache.size() <= 10000
+	assert cache.total == cache.size()
+	# The oldest entries went first
+	assert cache.get_many("model", ["item0", "item29"]).keys() == {"item29"}
+
+	paths = write_images(root, 2)
+	assert item_key(paths[0]) != item_key(paths[1])
+	assert item_key(np.zeros(3)) != item_key(np.zeros(4))
+	assert item_key(object()) is None
+
+def test_prediction_cache_only_for_fixed_weights():
+	from ML_Ops_Pipeline import prediction_cache as prediction_cache_module
+	from ML_Ops_Pipeline.prediction_cache import prediction_cache, caches_predictions, model_key
+	from ML_Ops_Pipeline.inference import batched_predict
+	root = tempfile.mkdtemp()
+	prediction_cache_module.default_cache = prediction_cache(os.path.join(root, "cache.sqlite"))
+	images = write_images(os.path.join(root, "images"), 4)
+
+	# Learns in train(), the predictions of the previous task are stale
+	class learning_model(file_size_model):
+		pass
+	assert not caches_predictions(learning_model("/nonexistent"))
+	mod = learning_model("/nonexistent")
+	batched_predict(mod, images)
+	mod = learning_model("/nonexistent")
+	batched_predict(mod, images)
+	assert len(mod.predicted) == 4
+
+	class weights_model(file_size_model):
+		weights = None
+		def load(self) -> None:
+			super().load()
+			self.weights = os.path.join(root, "weights.bin")
+	with open(os.path.join(root, "weights.bin"), 'wb') as weights_handle:
+		weights_handle.write(b"first")
+	mod = weights_model("/nonexistent")
+	assert caches_predictions(mod)
+	batched_predict(mod, images)
+	first_key = model_key(mod)
+	mod = weights_model("/nonexistent")
+	batched_predict(mod, images)
+	assert mod.predicted == []
+	# New weights loaded by the instance, nothing cached applies
+	with open(os.path.join(root, "weights.bin"), 'wb') as weights_handle:
+		weights_handle.write(b"second")
+	mod = weights_model("/nonexistent")
+	assert model_key(mod) != first_key
+	batched_predict(mod, images)
+	assert len(mod.predicted) == 4
+	prediction_cache_module.default_cache = None
@@ -0,0 +1,56 @@
+import os
+import pickle
+import tempfile
+
+import pandas as pd
+
+class box:
+	def __init__(self, x) -> None:
+		self.x = x
+
+def test_predictions_parquet_round_trip():
+	import pyarrow.parquet as pq
+	from ML_Ops_Pipeline import predictions_store
+	from ML_Ops_Pipeline.predictions_store import write_predictions, read_predictions, predictions_reader, predictions_csv
+	directory = tempfile.mkdtemp()
+	predictions = pd.DataFrame({
+		'image': ['c.png', 'a.png', 'c.png', 'b.png', 'd.png'],
+		'confidence': [0.1, 0.2, 0.3, 0.4, 0.5],
+		'name': ['c', 'a', 'c', 'b', 'd'],
+	}, index=[10, 11, 12, 13, 14])
+
+	images_per_group = predictions_store.PREDICTIONS_IMAGES_PER_GROUP
+	predictions_store.PREDICTIONS_IMAGES_PER_GROUP = 2
+	try:
+		assert write_predictions(directory, predictions).endswith("predictions.parquet")
+	finally:
+		predictions_store.PREDICTIONS_IMAGES_PER_GROUP = images_per_group
+	assert not os.path.exists(os.path.join(directory, "predictions.csv"))
+	pd.testing.assert_frame_equal(read_predictions(directory), predictions)
+	# Two images per row group
+	assert pq.ParquetFile(os.path.join(directory, "predictions.parquet")).metadata.num_row_groups == 2
+
+	reader = predictions_reader(directory)
+	assert reader.columns == ['image', 'confidence', 'name']
+	assert reader.images() == ['c.png', 'a.png', 'b.png', 'd.png']
+	subset = reader.read(columns=['confidence'], images=['c.png'])
+	assert list(subset.columns) == ['confidence']
+	assert list(subset['confidence']) == [0.1, 0.3]
+	assert list(subset.index) == [10, 12]
+	assert len(reader) == 5
+
+	csv_path = predictions_csv(directory)
+	assert len(pd.read_csv(csv_path)) == 5
+
+def test_predictions_pickle_fallback():
+	from ML_Ops_Pipeline.predictions_store import write_predictions, read_predictions
+	directory = tempfile.mkdtemp()
+	predictions = pd.DataFrame({'image_2': ['a.png', 'b.png'], 'boxes': [box(1), box(2)]})
+	assert write_predictions(directory, predictions).endswith("predictions.pkl")
+	assert [b.x for b in read_predictions(directory, images=['b.png'])['boxes']] == [2]
+
+	# Runs written before the Parquet store
+	legacy_directory = tempfile.mkdtemp()
+	with open(os.path.join(legacy_directory, "predictions.pkl"), 'wb') as predictions_handle:
+		pickle.dump([1, 2, 3], predictions_handle)
+	assert read_predictions(legacy_directory) == [1, 2, 3]
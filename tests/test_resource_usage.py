@@ -0,0 +1,45 @@
+import os
+import json
+import tempfile
+
+def test_resource_usage_measures_cpu_and_memory():
+	import numpy as np
+	from ML_Ops_Pipeline.resource_usage import resource_usage, proc_status
+	with resource_usage(tracemalloc_top=3) as usage:
+		sum(i * i for i in range(200000))
+		allocated = np.ones(8 * 1024**2, dtype=np.uint8)
+		allocated[::4096] = 2
+	assert usage.usage['cpu_user'] + usage.usage['cpu_system'] > 0
+	assert usage.usage['wall_time'] > 0
+	if 'VmHWM' in proc_status():
+		assert usage.usage['peak_rss'] >= usage.usage['rss_start']
+	assert usage.usage['tracemalloc_peak'] >= 8 * 1024**2
+	assert len(usage.usage['top_allocations']) == 3
+	assert 'top_allocations' not in usage.metrics() and 'peak_rss_reset' not in usage.metrics()
+
+	path = usage.write(os.path.join(tempfile.mkdtemp(), "resources.json"))
+	with open(path) as usage_handle:
+		assert json.load(usage_handle)['peak_rss'] == usage.usage['peak_rss']
+
+def test_tracked_run_records_resources():
+	from ML_Ops_Pipeline import tracking
+	output_dir = tempfile.mkdtemp()
+	resources_json = os.path.join(output_dir, "resources.json")
+	with tracking.tracked_run(tracking.null_tracker(), "resources_test", "train_a", resources_json=resources_json) as run:
+		pass
+	assert {"resources.cpu_user", "resources.peak_rss", "resources.wall_time"} <= set(run.metrics)
+	with open(resources_json) as usage_handle:
+		assert 'children_cpu_user' in json.load(usage_handle)
+
+	# The closing upload of the output directory already holds resources.json
+	class listing_tracker(tracking.null_tracker):
+		def log_artifacts(self, run, local_dir) -> None:
+			self.logged = sorted(os.listdir(local_dir))
+	backend = listing_tracker()
+	output_dir = tempfile.mkdtemp()
+	with tracking.tracked_run(backend, "resources_test", "train_b", resources_json=os.path.join(output_dir, "resources.json")) as run:
+		run.log_artifacts(tempfile.mkdtemp())
+		assert not run.usage_recorded
+		run.log_artifacts(output_dir)
+	assert backend.logged == ["resources.json"]
+	assert "resources.cpu_user" in run.metrics
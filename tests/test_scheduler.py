@@ -0,0 +1,166 @@
+import multiprocessing
+
+def stage_ok(name):
+	return (True, name)
+
+def stage_failed(name):
+	return (False, name)
+
+def stage_raises(name):
+	raise Exception("stage failed: " + name)
+
+def build_graph(train_func):
+	from ML_Ops_Pipeline.scheduler import task_graph
+	finished = []
+	def on_done(node, result):
+		finished.append(node.node_id)
+	graph = task_graph()
+	graph.add_task('train', train_func, ('train',), on_done=on_done)
+	graph.add_task('analyze', stage_ok, ('analyze',), deps=['train'], on_done=on_done)
+	graph.add_task('visualize_train', stage_ok, ('visualize_train',), deps=['train'], on_done=on_done)
+	graph.add_task('visualize_test', stage_ok, ('visualize_test',), deps=['analyze'], after=['visualize_train'], on_done=on_done)
+	graph.add_task('other', stage_ok, ('other',), on_done=on_done)
+	return graph, finished
+
+def test_task_graph_serial():
+	from ML_Ops_Pipeline.scheduler import SUCCESS
+	graph, finished = build_graph(stage_ok)
+	states = graph.run(workers=0)
+	assert all(state == SUCCESS for state in states.values())
+	assert finished.index('train') < finished.index('analyze')
+	assert finished.index('visualize_train') < finished.index('visualize_test')
+
+def test_task_graph_failure_skips_dependents():
+	from ML_Ops_Pipeline.scheduler import SUCCESS, FAILED, SKIPPED
+	for train_func in (stage_failed, stage_raises):
+		graph, finished = build_graph(train_func)
+		states = graph.run(workers=0)
+		assert states['train'] == FAILED
+		assert states['analyze'] == SKIPPED
+		assert states['visualize_test'] == SKIPPED
+		assert states['other'] == SUCCESS
+
+def test_task_graph_pool():
+	from ML_Ops_Pipeline.scheduler import SUCCESS
+	graph, finished = build_graph(stage_ok)
+	states = graph.run(workers=2, mp_context=multiprocessing.get_context('spawn'))
+	assert all(state == SUCCESS for state in states.values())
+	assert len(finished) == len(graph)
+	assert graph.nodes['analyze'].result == (True, 'analyze')
+
+def test_task_graph_cycle():
+	from ML_Ops_Pipeline.scheduler import task_graph
+	graph = task_graph()
+	graph.add_task('a', stage_ok, ('a',), deps=['b'])
+	graph.add_task('b', stage_ok, ('b',), deps=['a'])
+	try:
+		graph.run(workers=0)
+		assert False, "Cycle not detected"
+	except AssertionError as ex:
+		assert "cycle" in str(ex)
+
+def stage_pid(name):
+	import os
+	return (True, name, os.getpid())
+
+def test_task_graph_affinity():
+	from ML_Ops_Pipeline.scheduler import task_graph
+	graph = task_graph()
+	for model_name in ('a', 'b'):
+		graph.add_task(('train', model_name), stage_pid, ('train',), affinity=model_name)
+		graph.add_task(('analyze', model_name), stage_pid, ('analyze',), deps=[('train', model_name)], affinity=model_name)
+	graph.run(workers=2, mp_context=multiprocessing.get_context('spawn'))
+	for model_name in ('a', 'b'):
+		assert graph.nodes[('train', model_name)].result[2] == graph.nodes[('analyze', model_name)].result[2]
+
+def stage_group(train_name, analyze_name):
+	import os
+	return (False, train_name, os.getpid()), (True, analyze_name, os.getpid())
+
+def test_task_graph_group():
+	from ML_Ops_Pipeline.scheduler import task_graph, SUCCESS, FAILED, SKIPPED
+	for workers in (0, 2):
+		graph, finished = build_graph(stage_ok)
+		graph.add_task('upstream', stage_ok, ('upstream',))
+		graph.nodes['train'].deps.append('upstream')
+		graph.nodes['analyze'].deps.remove('train')
+		graph.add_group('train_test', stage_group, ('train', 'analyze'), members=['train', 'analyze'])
+		assert graph.nodes['train_test'].deps == ['upstream']
+		states = graph.run(workers=workers, mp_context=multiprocessing.get_context('spawn'))
+		assert 'train_test' not in states
+		assert len(graph) == 6
+		# The failed member only skips its own dependents
+		assert states['train'] == FAILED
+		assert states['visualize_train'] == SKIPPED
+		assert states['analyze'] == SUCCESS
+		assert graph.nodes['analyze'].result[1] == 'analyze'
+		assert states['visualize_test'] == SUCCESS
+		assert graph.summary() == {SUCCESS: 4, FAILED: 1, SKIPPED: 1}
+
+	# A member depending on the failed one is skipped with its dependents
+	graph, finished = build_graph(stage_ok)
+	graph.add_group('train_test', stage_group, ('train', 'analyze'), members=['train', 'analyze'])
+	states = graph.run(workers=0)
+	assert states['train'] == FAILED
+	assert states['analyze'] == SKIPPED and states['visualize_test'] == SKIPPED
+
+	graph = task_graph()
+	graph.add_task('dataset', stage_failed, ('dataset',))
+	graph.add_task('train', stage_ok, ('train',), deps=['dataset'])
+	graph.add_task('analyze', stage_ok, ('analyze',))
+	graph.add_task('visualize', stage_ok, ('visualize',), deps=['analyze'])
+	graph.add_group('train_test', stage_group, ('train', 'analyze'), members=['train', 'analyze'])
+	states = graph.run(workers=0)
+	assert states == {'dataset': FAILED, 'train': SKIPPED, 'analyze': SKIPPED, 'visualize': SKIPPED}
+
+def write_shutdown_marker(marker_dir):
+	import os
+	open(os.path.join(marker_dir, str(os.getpid())), 'w').close()
+
+def test_task_graph_on_shutdown():
+	import os
+	import tempfile
+	import functools
+	for workers in (0, 2):
+		marker_dir = tempfile.mkdtemp()
+		graph, finished = build_graph(stage_ok)
+		graph.run(workers=workers, mp_context=multiprocessing.get_context('spawn'), on_shutdown=functools.partial(write_shutdown_marker, marker_dir))
+		# Called once in every worker, or once in this process when running serially
+		assert len(os.listdir(marker_dir)) == max(workers, 1)
+
+def stage_exit(name):
+	import os
+	os._exit(9)
+
+def test_task_graph_worker_dies():
+	from ML_Ops_Pipeline.scheduler import task_graph, SUCCESS, FAILED, SKIPPED
+	graph = task_graph()
+	graph.add_task('a', stage_exit, ('a',))
+	graph.add_task('a_child', stage_ok, ('a_child',), deps=['a'])
+	for i in range(3):
+		graph.add_task(('b', i), stage_ok, ('b' + str(i),), after=['a'])
+	states = graph.run(workers=1, mp_context=multiprocessing.get_context('spawn'))
+	# The dead worker is replaced and the remaining nodes still run on it
+	assert states == {'a': FAILED, 'a_child': SKIPPED, ('b', 0): SUCCESS, ('b', 1): SUCCESS, ('b', 2): SUCCESS}
+
+def stage_exit_later(name):
+	import os
+	import time
+	import threading
+	# The worker dies after the node returned, leaving its pool broken
+	threading.Thread(target=lambda: (time.sleep(0.2), os._exit(9))).start()
+	return (True, name)
+
+def test_task_graph_shutdown_with_dead_worker():
+	import os
+	import time
+	import tempfile
+	import functools
+	from ML_Ops_Pipeline.scheduler import task_graph, SUCCESS
+	marker_dir = tempfile.mkdtemp()
+	graph = task_graph()
+	graph.add_task('a', stage_exit_later, ('a',), on_done=lambda node, result: time.sleep(1))
+	states = graph.run(workers=2, mp_context=multiprocessing.get_context('spawn'), on_shutdown=functools.partial(write_shutdown_marker, marker_dir))
+	assert states == {'a': SUCCESS}
+	# The live worker still ran on_shutdown
+	assert len(os.listdir(marker_dir)) == 1
@@ -0,0 +1,33 @@
+import os
+import sys
+import tempfile
+import importlib
+
+def write_module(module_dir, body):
+	module_py = os.path.join(module_dir, "hashed_module.py")
+	with open(module_py, "w") as module_handle:
+		module_handle.write("from ML_Ops_Pipeline.pipeline_input import pipeline_model\n\nclass hashed_model(pipeline_model):\n" + body)
+	return module_py
+
+def test_source_hash_memo_invalidation():
+	from ML_Ops_Pipeline import pipeline_input
+	from ML_Ops_Pipeline.pipeline_input import source_hash, clear_source_hashes
+	module_dir = tempfile.mkdtemp()
+	module_py = write_module(module_dir, "\tpass\n")
+	sys.path.append(module_dir)
+	try:
+		hashed_model = importlib.import_module("hashed_module").hashed_model
+		first_hash = source_hash(hashed_model)
+		assert source_hash(hashed_model) == first_hash
+		assert any(key[:2] == ("hashed_module", "hashed_model") for key in pipeline_input.source_hashes)
+
+		# Editing the module file changes its mtime, which misses the memo
+		write_module(module_dir, "\tdef predict(self, x):\n\t\treturn x\n")
+		os.utime(module_py, ns=(0, os.stat(module_py).st_mtime_ns + 10**9))
+		assert source_hash(hashed_model) != first_hash
+
+		clear_source_hashes("hashed_module")
+		assert not any(key[0] == "hashed_module" for key in pipeline_input.source_hashes)
+	finally:
+		sys.path.remove(module_dir)
+		sys.modules.pop("hashed_module", None)
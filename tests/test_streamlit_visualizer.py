@@ -0,0 +1,57 @@
+import os
+import pickle
+
+import pandas as pd
+
+from ML_Ops_Pipeline.pipeline_input import pipeline_dataset_interpreter, pipeline_model, pipeline_data_visualizer, pipeline_input, pipeline_streamlit_visualizer
+
+class streamlit_interp(pipeline_dataset_interpreter):
+	def load(self) -> None:
+		self.dataset = {
+			'train': {'x': pd.DataFrame({'image': []}), 'y': pd.DataFrame({'label': []})},
+			'test': {'x': pd.DataFrame({'image': ['a.png']}), 'y': pd.DataFrame({'label': [1]})},
+		}
+
+class streamlit_frozen_model(pipeline_model):
+	frozen = True
+
+class streamlit_session:
+	pipeline = "streamlit_frozen"
+
+class fake_streamlit:
+	# Picks the first option of every selectbox and keeps what was written
+	def __init__(self) -> None:
+		self.session_state = streamlit_session()
+		self.sidebar = self
+		self.written = []
+
+	def selectbox(self, label, options, key=None):
+		return list(options)[0]
+
+	def markdown(self, text, **kwargs):
+		self.written.append(text)
+
+	def write(self, value):
+		self.written.append(value)
+
+def test_load_data_of_frozen_model_without_train_split():
+	from ML_Ops_Pipeline.constants import DATASET_DIR, MODEL_TESTING
+	from ML_Ops_Pipeline.predictions_store import write_predictions
+	pipeline_name = "streamlit_frozen"
+	os.makedirs(os.path.join(DATASET_DIR.format(pipeline_name=pipeline_name), "streamlit_interp", "dataset_1"), exist_ok=True)
+	# Only the analysis ran, as for a frozen model with FROZEN_TRAIN_SAMPLE=0
+	testing_dir = MODEL_TESTING.format(pipeline_name=pipeline_name, interpreter_name="streamlit_interp", model_name="streamlit_frozen_model", commit_id="0" * 40)
+	os.makedirs(testing_dir)
+	with open(os.path.join(testing_dir, "results.pkl"), 'wb') as results_handle:
+		pickle.dump({'accuracy': 1.0}, results_handle)
+	write_predictions(testing_dir, pd.DataFrame({'image': ['a.png'], 'score': [0.5]}))
+
+	pipeline = pipeline_input(pipeline_name, {'streamlit_interp': streamlit_interp}, {'streamlit_frozen_model': streamlit_frozen_model}, {}, {'streamlit_visualizer': pipeline_data_visualizer})
+	streamlit = fake_streamlit()
+	visualizer = pipeline_streamlit_visualizer(pipeline, streamlit)
+	visualizer.visualize()
+	assert visualizer.testing_results == {'accuracy': 1.0}
+	assert list(visualizer.testing_predictions['score']) == [0.5]
+	assert visualizer.training_results is None and visualizer.training_predictions is None
+	headings = [text for text in streamlit.written if isinstance(text, str)]
+	assert "# Testing Results" in headings and "# Training Results" not in headings
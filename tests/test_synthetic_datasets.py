@@ -0,0 +1,70 @@
+import os
+import glob
+import tempfile
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import pandas as pd
+import cv2
+
+def test_voc_layout():
+	from ML_Ops_Pipeline.synthetic_datasets import write_dataset
+	output_dir = tempfile.mkdtemp()
+	counts = write_dataset('obj_det_interp_1', output_dir, frames=20, boxes_per_frame=3, test_fraction=0.25)
+	assert counts['frames'] == 20 and counts['boxes'] >= 20
+	annotations = sorted(glob.glob(os.path.join(output_dir, 'Train/Train/Annotations/*.xml')))
+	assert len(annotations) == 15
+	assert len(glob.glob(os.path.join(output_dir, 'Test/Test/Annotations/*.xml'))) == 5
+	# Parsed the way obj_det_interp_1.generate_data does
+	boxes = 0
+	for annotation in annotations + sorted(glob.glob(os.path.join(output_dir, 'Test/Test/Annotations/*.xml'))):
+		image_path = annotation.replace('Annotations', 'JPEGImages')[:-4] + '.jpg'
+		image = cv2.imread(image_path)
+		assert image.shape == (120, 160, 3)
+		for element in ET.parse(annotation).iter():
+			if element.tag == 'object':
+				bbox = {dim.tag: int(dim.text) for dim in element.find('bndbox')}
+				assert 0 <= bbox['xmin'] < bbox['xmax'] <= 160 and 0 <= bbox['ymin'] < bbox['ymax'] <= 120
+				boxes += 1
+	assert boxes == counts['boxes']
+	# Every frame has its own image contents
+	first, second = sorted(glob.glob(os.path.join(output_dir, 'Train/Train/JPEGImages/*.jpg')))[:2]
+	assert open(first, 'rb').read() != open(second, 'rb').read()
+
+def test_kitti_layouts():
+	from ML_Ops_Pipeline.synthetic_datasets import write_dataset
+	output_dir = tempfile.mkdtemp()
+	counts = write_dataset('KITTI_lemenko_interp', output_dir, frames=10, boxes_per_frame=2, test_fraction=0.2)
+	training = sorted(glob.glob(os.path.join(output_dir, "data_object_image_2", "training", "image_2", "*.png")))
+	assert len(training) == 8
+	assert len(glob.glob(os.path.join(output_dir, "data_object_image_3", "testing", "image_3", "*.png"))) == 2
+	labels = pd.concat([
+		pd.read_csv(path, sep=" ", header=None)
+		for path in sorted(glob.glob(os.path.join(output_dir, "data_object_label_2", "training", "label_2", "*.txt")))
+	])
+	assert labels.shape == (counts['boxes'], 15)
+	with open(os.path.join(output_dir, "data_object_calib", "testing", "calib", "000008.txt")) as calib:
+		calib_lines = [line.split(":") for line in calib if line.strip()]
+	assert all(len(np.array(value.strip().split(" "), dtype=float)) in (9, 12) for key, value in calib_lines)
+
+	output_dir = tempfile.mkdtemp()
+	write_dataset('seg_kitti', output_dir, frames=10, test_fraction=0.2)
+	for name in ('image_2', 'instance', 'semantic', 'semantic_rgb'):
+		assert len(glob.glob(os.path.join(output_dir, "training", name, "*.png"))) == 8
+	assert os.listdir(os.path.join(output_dir, "testing")) == ['image_2']
+	semantic_rgb = cv2.imread(sorted(glob.glob(os.path.join(output_dir, "training", "semantic_rgb", "*.png")))[0])
+	assert (semantic_rgb == (142, 0, 0)).all(axis=2).any()
+	instance = cv2.imread(sorted(glob.glob(os.path.join(output_dir, "training", "instance", "*.png")))[0], cv2.IMREAD_UNCHANGED)
+	assert instance.dtype == np.uint16
+
+def test_airsim_layout():
+	from ML_Ops_Pipeline.synthetic_datasets import write_dataset, AIRSIM_IMAGE_TYPES
+	output_dir = tempfile.mkdtemp()
+	write_dataset('depth_interp_airsim', output_dir, frames=6, cameras=3)
+	df = pd.read_csv(os.path.join(output_dir, 'airsim_rec.txt'), sep='\t')
+	assert len(df) == 6 and 'TimeStamp' in df.columns
+	files = df["ImageFile"].iloc[0].split(";")
+	assert len(files) == 3 * len(AIRSIM_IMAGE_TYPES)
+	# The interpreters take the camera and image type from the file name
+	assert sorted(set(tuple(f.split("_")[2:4]) for f in files)) == sorted((str(cam), str(image_type)) for cam in range(3) for image_type in AIRSIM_IMAGE_TYPES)
+	assert all(os.path.exists(os.path.join(output_dir, 'images', f)) for f in files)
@@ -0,0 +1,50 @@
+import os
+import json
+import time
+import tempfile
+
+def test_spans_nest_into_active_traces():
+	from ML_Ops_Pipeline import tracing
+	# Nothing is recording
+	with tracing.span("predict"):
+		pass
+	outer = tracing.start_trace("train_test_a")
+	inner = tracing.start_trace("train_a")
+	with tracing.span("model_load", model="a"):
+		time.sleep(0.01)
+	with tracing.span("predict"):
+		with tracing.span("predict"):
+			pass
+	tracing.stop_trace(inner)
+	with tracing.span("dataset_load"):
+		pass
+	tracing.stop_trace(outer)
+	assert tracing.active_traces == []
+
+	assert set(inner.durations()) == {"model_load", "predict"}
+	assert inner.durations()["model_load"] >= 0.01
+	assert set(outer.durations()) == {"model_load", "predict", "dataset_load"}
+	# Each trace holds a block of its own, the inner one also shows up in the outer one
+	assert [event['name'] for event in outer.events if event['cat'] == "run"] == ["train_a", "train_test_a"]
+
+	path = outer.write(os.path.join(tempfile.mkdtemp(), "main", "trace.json"))
+	with open(path) as trace_handle:
+		chrome_trace = json.load(trace_handle)
+	events = chrome_trace['traceEvents']
+	assert events[0]['ph'] == 'M' and events[0]['args']['name'] == "train_test_a"
+	assert all(event['ph'] == 'X' and event['dur'] >= 0 for event in events[1:])
+	assert [event for event in events if event['name'] == "model_load"][0]['args'] == {'model': "a"}
+
+def test_tracked_run_logs_stage_durations():
+	from ML_Ops_Pipeline import tracking, tracing
+	from ML_Ops_Pipeline.constants import TRACE_DIR
+	tracking_dir = tempfile.mkdtemp()
+	with tracking.tracked_run(tracking.jsonl_tracker(tracking_dir), "tracing_test", "train_a") as run:
+		with tracing.span("train"):
+			pass
+		run.log_artifacts(tracking_dir)
+	with open(os.path.join(tracking_dir, "tracing_test.jsonl")) as jsonl_handle:
+		metrics = json.loads(jsonl_handle.readline())['metrics']
+	assert {"time.train", "time.log_artifacts", "time.total"} <= set(metrics)
+	assert metrics["time.total"] >= metrics["time.train"]
+	assert os.path.exists(os.path.join(TRACE_DIR, "tracing_test", "train_a." + run.run_id + ".json"))
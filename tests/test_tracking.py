@@ -0,0 +1,57 @@
+import os
+import json
+import tempfile
+
+def test_jsonl_tracker_writes_one_line_per_run():
+	from ML_Ops_Pipeline import tracking
+	tracking_dir = tempfile.mkdtemp()
+	backend = tracking.jsonl_tracker(tracking_dir)
+	with tracking.tracked_run(backend, "toy", "train_a", description="/tmp/train_a") as run:
+		run.set_tag("COMMIT", "abc")
+		run.log_metrics({'loss': 0.5, 'confusion': {'tp': 3, 'fp': 1}})
+		# Code running inside the stage reaches the same run
+		tracking.set_tag("LOG_STATUS", "SUCCESS")
+		tracking.log_metrics({'prec': 0.75})
+	assert tracking.active_run() is None
+	try:
+		with tracking.tracked_run(backend, "toy", "test_a") as run:
+			raise ValueError("stage failed")
+	except ValueError:
+		pass
+
+	with open(os.path.join(tracking_dir, "toy.jsonl")) as jsonl_handle:
+		records = [json.loads(line) for line in jsonl_handle]
+	assert [record['run_name'] for record in records] == ['train_a', 'test_a']
+	assert records[0]['tags'] == {'COMMIT': 'abc', 'LOG_STATUS': 'SUCCESS'}
+	metrics = {key: value for key, value in records[0]['metrics'].items() if not key.startswith(("time.", "resources."))}
+	assert metrics == {'loss': 0.5, 'confusion.tp': 3.0, 'confusion.fp': 1.0, 'prec': 0.75}
+	assert records[0]['status'] == 'FINISHED' and records[1]['status'] == 'FAILED'
+	assert records[0]['description'] == "/tmp/train_a"
+
+def test_null_tracker_and_models_opt_in():
+	from ML_Ops_Pipeline import tracking
+	with tracking.tracked_run(tracking.null_tracker(), "toy", "train_a") as run:
+		run.log_metric("loss", 1)
+		tracking.log_model(object(), "model")
+	assert run.run_id is not None
+	# TRACKING_LOG_MODELS is off by default
+	assert run.models == []
+	# Outside of a run the module level calls do nothing
+	tracking.set_tag("LOG_STATUS", "SUCCESS")
+
+def test_mlflow_tracker_logs_one_batch():
+	from ML_Ops_Pipeline import tracking
+	from mlflow.tracking import MlflowClient
+	backend = tracking.mlflow_tracker()
+	experiment_id = backend.experiment_id("tracking_test")
+	assert backend.experiment_id("tracking_test") == experiment_id
+	with tracking.tracked_run(backend, "tracking_test", "train_a", description="/tmp/train_a") as run:
+		run.set_tag("COMMIT", "abc")
+		run.log_metrics({'metric_' + str(i): i for i in range(1500)})
+	mlflow_run = MlflowClient().get_run(run.run_id)
+	assert mlflow_run.info.status == "FINISHED"
+	assert mlflow_run.info.run_name == "train_a"
+	assert mlflow_run.data.tags["COMMIT"] == "abc"
+	assert mlflow_run.data.tags["mlflow.note.content"] == "/tmp/train_a"
+	assert len([key for key in mlflow_run.data.metrics if key.startswith("metric_")]) == 1500
+	assert mlflow_run.data.metrics["metric_1499"] == 1499